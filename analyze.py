@@ -0,0 +1,253 @@
+#!/usr/bin/env python
+#-*- coding:utf-8 -*-
+
+from __future__ import print_function
+
+__docs__ = """Flock statistics of a recorded trajectory.
+
+Reads a trajectory file (see boids.py --record) one chunk at a time and
+computes for every analysed tick:
+
+  polarization   length of the mean heading, 1 when all fly the same way
+  mean_nn        mean distance to the nearest neighbor
+  clusters       groups of boids linked by distances within --radius
+  speed          mean, min and max speed, plus a histogram over the run
+
+Distances are toroidal, like in the simulation (Vec2d). Chunks are spread
+over a pool of processes that each map the file themselves, so memory use
+depends on the chunk size and not on the length of the recording.
+
+Usage:
+  analyze.py <file> [--output=<file>] [--processes=<int>] [--every=<int>]
+                    [--radius=<float>] [--bins=<int>] [--max-speed=<float>]
+  analyze.py --help
+
+Options:
+  --help                Show this screen.
+  -o --output=<file>    Write the statistics of every tick as CSV to this file
+  -p --processes=<int>  Processes in the pool, 0 for one per CPU [default: 0]
+  -e --every=<int>      Only analyse every n:th tick [default: 1]
+  -r --radius=<float>   Link distance of the clusters, default is the
+                        neighborhood radius of the simulation
+  -b --bins=<int>       Bins in the speed histogram [default: 10]
+  --max-speed=<float>   Top of the speed histogram, default is the largest
+                        speed of the simulation
+
+"""
+
+import sys, math, multiprocessing
+
+from docopt.docopt import docopt
+
+from vec2d import Vec2d
+from boid import Boid
+from neighborhood import Neighborhood
+from union_find import UnionFind
+from trajectory import TrajectoryReader
+
+COLUMNS = ('tick', 'polarization', 'mean_nn', 'clusters',
+           'mean_speed', 'min_speed', 'max_speed') # const
+
+_readers = {} # path -> TrajectoryReader, one per process
+
+
+class Grid(object):
+    """ Buckets points into toroidal cells at least cell wide. """
+    
+    def __init__(self, points, width, height, cell):
+        """
+        :param points: the points
+        :type points: list of Vec2d
+        :param cell: smallest width and height of a cell
+        :type cell: float
+        """
+        self.nx = max(1, int(width // cell))
+        self.ny = max(1, int(height // cell))
+        self.cw = width / float(self.nx)
+        self.ch = height / float(self.ny)
+        self.cells = {}
+        for (i, p) in enumerate(points):
+            self.cells.setdefault(self.cell(p), []).append(i)
+    
+    
+    def cell(self, p):
+        """ The cell holding a point. """
+        return (int(p.x / self.cw) % self.nx, int(p.y / self.ch) % self.ny)
+    
+    
+    def ring(self, key, r):
+        """ Cells at Chebyshev distance r from a cell, wrapped and unique. """
+        (cx, cy) = key
+        keys = set()
+        for dx in range(-r, r + 1):
+            for dy in range(-r, r + 1):
+                if max(abs(dx), abs(dy)) == r:
+                    keys.add(((cx + dx) % self.nx, (cy + dy) % self.ny))
+        return keys
+
+
+def nearest_distances(points, width, height, cell):
+    """ Toroidal distance from every point to its nearest neighbor.
+    
+    :rtype: list of float
+    """
+    grid = Grid(points, width, height, cell)
+    step = min(grid.cw, grid.ch)
+    rings = max(grid.nx, grid.ny)
+    result = []
+    for (i, p) in enumerate(points):
+        key = grid.cell(p)
+        seen = set()
+        best = None
+        for r in range(rings + 1):
+            # Nothing in ring r or further can be closer than (r - 1) cells
+            if best is not None and ((r - 1) * step) ** 2 >= best:
+                break
+            for k in grid.ring(key, r) - seen:
+                seen.add(k)
+                for j in grid.cells.get(k, ()):
+                    if j != i:
+                        d = p.get_dist_sqrd_toroidal(points[j], width, height)
+                        if best is None or d < best:
+                            best = d
+        if best is not None:
+            result.append(math.sqrt(best))
+    return result
+
+
+def count_clusters(points, width, height, radius):
+    """ Amount of groups of points linked by distances within radius. """
+    grid = Grid(points, width, height, radius)
+    sets = UnionFind(len(points))
+    limit = radius ** 2
+    for (key, members) in grid.cells.items():
+        near = [j for k in grid.ring(key, 1) | set([key]) for j in grid.cells.get(k, ())]
+        for i in members:
+            p = points[i]
+            for j in near:
+                if j > i and p.get_dist_sqrd_toroidal(points[j], width, height) <= limit:
+                    sets.union(i, j)
+    return sets.sets
+
+
+def analyze_tick(state, width, height, radius, bins, max_speed, histogram):
+    """ Statistics of one tick, the speeds are added to the histogram.
+    
+    :param state: x, y, vx, vy of every boid
+    :type state: list of float
+    :rtype: tuple in the order of COLUMNS, without the tick
+    """
+    count = len(state) // 4
+    if count == 0:
+        return (0.0, 0.0, 0, 0.0, 0.0, 0.0)
+    points = [Vec2d(state[j], state[j + 1]) for j in range(0, len(state), 4)]
+    
+    heading = [0.0, 0.0]
+    speeds = []
+    for j in range(0, len(state), 4):
+        (vx, vy) = (state[j + 2], state[j + 3])
+        speed = math.sqrt(vx * vx + vy * vy)
+        speeds.append(speed)
+        if speed > 0:
+            heading[0] += vx / speed
+            heading[1] += vy / speed
+        histogram[min(bins - 1, int(speed / max_speed * bins))] += 1
+    
+    nn = nearest_distances(points, width, height, radius)
+    return (math.sqrt(heading[0] ** 2 + heading[1] ** 2) / count,
+            sum(nn) / len(nn) if nn else 0.0,
+            count_clusters(points, width, height, radius),
+            sum(speeds) / count, min(speeds), max(speeds))
+
+
+def analyze_chunk(job):
+    """ Statistics of the analysed ticks of one chunk, run in the pool.
+    
+    :param job: (path, first tick, ticks, every, radius, bins, max_speed)
+    :type job: tuple
+    :returns: rows in the order of COLUMNS and the speed histogram
+    :rtype: (list of tuple, list of int)
+    """
+    (path, first, ticks, every, radius, bins, max_speed) = job
+    reader = _readers.get(path)
+    if reader is None:
+        reader = _readers[path] = TrajectoryReader(path)
+    
+    rows = []
+    histogram = [0] * bins
+    start = first + (-first % every)
+    for tick in range(start, first + ticks, every):
+        (state, width, height) = reader.frame(tick)
+        rows.append((tick,) + analyze_tick(state, width, height, radius,
+                                           bins, max_speed, histogram))
+    return (rows, histogram)
+
+
+if __name__ == '__main__':
+    args = docopt(__docs__)
+    
+    path = args['<file>']
+    every = int(args['--every'])
+    bins = int(args['--bins'])
+    radius = math.sqrt(Neighborhood.max_distance)
+    if args['--radius']:
+        radius = float(args['--radius'])
+    max_speed = Boid.cap_max_speed
+    if args['--max-speed']:
+        max_speed = float(args['--max-speed'])
+    
+    reader = TrajectoryReader(path)
+    jobs = [(path, first, ticks, every, radius, bins, max_speed)
+            for (first, _, ticks) in reader.chunks]
+    print("{0}: {1} boids, ticks {2} to {3} in {4} chunks".format(
+        path, reader.count, reader.first(), reader.last(), len(jobs)))
+    reader.close()
+    
+    processes = int(args['--processes']) or None
+    pool = None
+    if processes == 1:
+        results = map(analyze_chunk, jobs)
+    else:
+        pool = multiprocessing.Pool(processes)
+        results = pool.imap(analyze_chunk, jobs)
+    
+    output = None
+    if args['--output']:
+        output = open(args['--output'], 'w')
+        output.write(','.join(COLUMNS) + '\n')
+    
+    # Chunks come back in order, only the totals are kept
+    totals = [0.0] * (len(COLUMNS) - 1)
+    analysed = 0
+    histogram = [0] * bins
+    for (rows, counts) in results:
+        for row in rows:
+            analysed += 1
+            for (i, value) in enumerate(row[1:]):
+                totals[i] += value
+            if output is not None:
+                output.write('%d,%.6f,%.6f,%d,%.6f,%.6f,%.6f\n' % row)
+        histogram = [a + b for (a, b) in zip(histogram, counts)]
+    
+    if pool is not None:
+        pool.close()
+        pool.join()
+    if output is not None:
+        output.close()
+    
+    if analysed == 0:
+        print("No ticks analysed")
+        sys.exit(1)
+    
+    print("Averages over {0} ticks:".format(analysed))
+    for (name, total) in zip(COLUMNS[1:], totals):
+        print("  {0:14s} {1:10.4f}".format(name, total / analysed))
+    print("Speed histogram:")
+    samples = float(sum(histogram)) or 1.0
+    for (i, n) in enumerate(histogram):
+        low = max_speed * i / bins
+        high = max_speed * (i + 1) / bins
+        print("  {0:6.2f} - {1:6.2f} {2:7.2%}".format(low, high, n / samples))
+
+# EOF
+
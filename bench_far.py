@@ -0,0 +1,120 @@
+#!/usr/bin/env python
+#-*- coding:utf-8 -*-
+
+from __future__ import print_function
+
+__docs__ = """Benchmark of the far-field backends against the reference at big radii.
+
+For every radius, steps a seeded swarm a few ticks with the reference and
+then, from that same state, times one tick of the reference, of barnes-hut
+at every theta and of summed-grid, the best out of a few repeats taking
+turns, and how many times faster than the reference that is. Also
+reports the mean error of their neighborhood averages on that state,
+against Simulation.neighborhood(): of the average position relative to
+the radius and of the average velocity relative to Boid.max_speed. These
+are the tables in the docstrings of BarnesHutSimulation and
+SummedGridSimulation.
+
+Usage:
+  bench_far.py [--radii=<list>] [--thetas=<list>] [--amount=<int>]
+               [(--width=<int> --height=<int>)] [--warmup=<int>]
+               [--repeat=<int>] [--seed=<int>]
+  bench_far.py --help
+
+Options:
+  --help               Show this screen.
+  --radii=<list>       Comma separated neighborhood radii [default: 400,150]
+  --thetas=<list>      Comma separated opening angles of barnes-hut [default: 0,0.25,0.5,1]
+  -a --amount=<int>    Amount of boids [default: 1000]
+  -w --width=<int>     World width [default: 700]
+  -h --height=<int>    World height [default: 500]
+  --warmup=<int>       Ticks of the reference before measuring [default: 5]
+  -r --repeat=<int>    Repeats of the timed tick, the best one counts [default: 3]
+  --seed=<int>         Seed of the swarm [default: 1]
+
+"""
+
+from timeit import default_timer as clock
+
+from docopt.docopt import docopt
+
+import checkpoint
+from boid import Boid
+from neighborhood import Neighborhood
+from simulation import BarnesHutSimulation, BACKENDS
+from check_equivalence import neighborhood_errors
+
+
+def time_ticks(sims, state, repeat):
+    """ Best time of one tick of every simulation from a checkpointed state.
+    
+    The repeats take turns over the simulations, so a slow spell of the
+    machine does not fall on one of them only.
+    
+    :param sims: the simulations, with the theta of barnes-hut, if any
+    :type sims: list of (Simulation, float)
+    :returns: seconds per simulation
+    :rtype: list of float
+    """
+    best = [None] * len(sims)
+    for _ in range(repeat):
+        for (i, (sim, theta)) in enumerate(sims):
+            if theta is not None:
+                BarnesHutSimulation.theta = theta
+            checkpoint.restore_from(state, sim)
+            t0 = clock()
+            sim.step()
+            took = clock() - t0
+            if best[i] is None or took < best[i]:
+                best[i] = took
+    return best
+
+
+def mean_errors(sim, state, radius):
+    """ Mean error of the neighborhood averages on a checkpointed state.
+    
+    :returns: of the position relative to the radius and of the velocity
+              relative to Boid.max_speed
+    :rtype: (float, float)
+    """
+    checkpoint.restore_from(state, sim)
+    (positions, velocities, _) = neighborhood_errors(sim)
+    count = max(1, len(positions))
+    return (sum(positions) / count / radius, sum(velocities) / count / Boid.max_speed)
+
+
+if __name__ == '__main__':
+    args = docopt(__docs__)
+    amount = int(args['--amount'])
+    (width, height) = (int(args['--width']), int(args['--height']))
+    seed = int(args['--seed'])
+    repeat = int(args['--repeat'])
+    
+    print("{0} boids, {1}x{2}, seconds per tick, mean error of the averages".format(
+        amount, width, height))
+    for radius in [float(r) for r in args['--radii'].split(',')]:
+        Neighborhood.max_distance = radius**2
+        reference = BACKENDS['reference'](boid_count=amount, width=width, height=height, seed=seed)
+        for _ in range(int(args['--warmup'])):
+            reference.step()
+        state = checkpoint.snapshot(reference)
+        
+        print("\nradius {0:g}".format(radius))
+        print("{0:<20s} {1:>8s} {2:>8s} {3:>10s} {4:>10s}".format(
+            "backend", "tick", "speedup", "position", "velocity"))
+        runs = [('reference', None)]
+        runs += [('barnes-hut', float(theta)) for theta in args['--thetas'].split(',')]
+        runs += [('summed-grid', None)]
+        sims = [(BACKENDS[name](boid_count=0, width=width, height=height, seed=seed), theta)
+                for (name, theta) in runs]
+        times = time_ticks(sims, state, repeat)
+        for ((name, theta), (sim, _), took) in zip(runs, sims, times):
+            if theta is not None:
+                BarnesHutSimulation.theta = theta
+            (position, velocity) = mean_errors(sim, state, radius)
+            label = name if theta is None else "{0} {1:g}".format(name, theta)
+            print("{0:<20s} {1:8.2f} {2:7.2f}x {3:9.2f}% {4:9.2f}%".format(
+                label, took, times[0] / took, 100 * position, 100 * velocity))
+
+# EOF
+
@@ -0,0 +1,177 @@
+#!/usr/bin/env python
+#-*- coding:utf-8 -*-
+
+from __future__ import print_function
+
+__docs__ = """Microbenchmarks for the hot primitives of the simulation.
+
+Times each primitive in isolation and reports the best time per call out of
+a few repeats. Results can be written as JSON and compared against an
+earlier run, so that speedups and regressions show up per primitive.
+
+Usage:
+  bench_micro.py [--output=<file>] [--baseline=<file>] [--threshold=<pct>]
+                 [--repeat=<int>] [--number=<int>] [--filter=<str>]
+  bench_micro.py --help
+
+Options:
+  --help                Show this screen.
+  -o --output=<file>    Write the results as JSON to this file
+  -b --baseline=<file>  Compare against results written earlier with --output
+  --threshold=<pct>     Slowdown in percent counted as a regression [default: 10]
+  -r --repeat=<int>     Repeats per primitive, the best one counts [default: 5]
+  -n --number=<int>     Calls per repeat [default: 2000]
+  -f --filter=<str>     Only run primitives whose name contains this
+
+"""
+
+import sys, json, random, platform, timeit
+
+from docopt.docopt import docopt
+
+from vec2d import Vec2d
+from neighborhood import Neighborhood
+from boid import Boid
+from simulation import Simulation
+
+NEIGHBOR_COUNTS = (0, 5, 20, 80)  # const, neighborhood sizes to time
+WIDTH = 700                       # const
+HEIGHT = 500                      # const
+
+
+def primitives():
+    """ Build the primitives to time.
+    
+    :returns: list of (name, callable) pairs
+    :rtype: list of tuple
+    """
+    rand = random.Random(0)
+    
+    def rand_boid():
+        return Boid(Vec2d(rand.uniform(0, WIDTH), rand.uniform(0, HEIGHT)),
+                    Vec2d(rand.uniform(-2, 2), rand.uniform(-2, 2)))
+    
+    a = Vec2d(3.5, -1.25)
+    b = Vec2d(690.0, 12.0)
+    f = Vec2d(1.5, 2.5)
+    benches = [
+        # By the operator, / is __div__ on Python 2 and __truediv__ on 3
+        ('Vec2d + Vec2d', lambda: a + b),
+        ('Vec2d - Vec2d', lambda: a - b),
+        ('-Vec2d', lambda: -a),
+        ('Vec2d * scalar', lambda: a * 1.5),
+        ('Vec2d / scalar', lambda: a / 1.5),
+        ('Vec2d.__iadd__', lambda: f.__iadd__(a)),
+        ('Vec2d.length', lambda: a.length),
+        ('Vec2d.normalized', lambda: a.normalized()),
+        ('Vec2d.get_angle', lambda: a.get_angle()),
+        ('Vec2d.get_angle_between', lambda: a.get_angle_between(b)),
+        ('Vec2d.get_dist_sqrd_toroidal', lambda: a.get_dist_sqrd_toroidal(b, WIDTH, HEIGHT)),
+        ('Vec2d.toroidal_sub', lambda: a.toroidal_sub(b, WIDTH, HEIGHT)),
+    ]
+    
+    # Rules are timed against the same kind of neighborhood as in a tick
+    sim = Simulation(boid_count=0, width=WIDTH, height=HEIGHT)
+    rules = sim.rules
+    
+    for count in NEIGHBOR_COUNTS:
+        whose = rand_boid()
+        hood = Neighborhood(whose, WIDTH, HEIGHT, rules=rules)
+        for i in range(count):
+            hood.add(rand_boid())
+        
+        def calculate(hood=hood):
+            hood.updated = True
+            hood._calculate()
+        benches.append(('Neighborhood._calculate[%d]' % count, calculate))
+        
+        # The averages are calculated again on every call, as in a tick,
+        # otherwise every size would time the cached ones
+        def consult(rule, whose=whose, hood=hood):
+            hood.updated = True
+            return rule.consult(whose, hood, WIDTH, HEIGHT)
+        for rule in rules:
+            benches.append(('%s.consult[%d]' % (type(rule).__name__, count),
+                            lambda rule=rule, consult=consult: consult(rule)))
+    
+    whose = rand_boid()
+    other = rand_boid()
+    for rule in rules:
+        if getattr(rule.inject, '__isabstractmethod__', False):
+            continue
+        state = rule.inject_default_state()
+        benches.append(('%s.inject' % type(rule).__name__,
+                        lambda rule=rule, state=state:
+                            rule.inject(state, whose, other, WIDTH, HEIGHT)))
+    
+    boid = rand_boid()
+    force = Vec2d(0.3, -0.2)
+    benches.append(('Boid.apply_force', lambda: boid.apply_force(Vec2d(force))))
+    benches.append(('Boid.move', lambda: boid.move(Vec2d(force), WIDTH, HEIGHT)))
+    
+    return benches
+
+
+def run(benches, repeat, number):
+    """ Time the primitives.
+    
+    :returns: best time per call in nanoseconds, by name
+    :rtype: dict
+    """
+    results = {}
+    for (name, fun) in benches:
+        best = min(timeit.Timer(fun).repeat(repeat=repeat, number=number))
+        results[name] = best / number * 1e9
+        print("{0:40s} {1:12.1f} ns".format(name, results[name]))
+    return results
+
+
+def compare(results, baseline, threshold):
+    """ Print the results next to the baseline.
+    
+    :returns: names of the primitives that got slower than the threshold
+    :rtype: list of str
+    """
+    regressions = []
+    print()
+    print("{0:40s} {1:>12s} {2:>12s} {3:>8s}".format(
+        "primitive", "baseline ns", "now ns", "change"))
+    for name in sorted(results):
+        if name not in baseline:
+            continue
+        change = (results[name] / baseline[name] - 1.0) * 100
+        mark = ""
+        if change > threshold:
+            mark = "  SLOWER"
+            regressions.append(name)
+        elif change < -threshold:
+            mark = "  faster"
+        print("{0:40s} {1:12.1f} {2:12.1f} {3:+7.1f}%{4}".format(
+            name, baseline[name], results[name], change, mark))
+    return regressions
+
+
+if __name__ == '__main__':
+    args = docopt(__docs__)
+    
+    benches = primitives()
+    if args['--filter']:
+        benches = [b for b in benches if args['--filter'] in b[0]]
+    
+    results = run(benches, int(args['--repeat']), int(args['--number']))
+    
+    if args['--output']:
+        with open(args['--output'], 'w') as f:
+            json.dump({'python': platform.python_version(),
+                       'machine': platform.machine(),
+                       'results': results}, f, indent=2, sort_keys=True)
+    
+    if args['--baseline']:
+        with open(args['--baseline']) as f:
+            baseline = json.load(f)['results']
+        regressions = compare(results, baseline, float(args['--threshold']))
+        if regressions:
+            sys.exit(1)
+
+# EOF
+
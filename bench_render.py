@@ -0,0 +1,94 @@
+#!/usr/bin/env python
+#-*- coding:utf-8 -*-
+
+from __future__ import print_function
+
+__docs__ = """Benchmark for drawing the swarm, shapes against pre-rendered sprites.
+
+Paints the batched SwarmItem of a seeded simulation into an offscreen
+image, in every level of detail with and without the sprite cache, and
+reports the best time per frame out of a few repeats. Points are always
+drawn as dots, so that tier has no sprite time. The simulation is not
+stepped, so only the painting is timed. Needs PySide.
+
+Usage:
+  bench_render.py [--amount=<int>] [(--width=<int> --height=<int>)]
+                  [--frames=<int>] [--repeat=<int>] [--seed=<int>]
+  bench_render.py --help
+
+Options:
+  --help               Show this screen.
+  -a --amount=<int>    Amount of boids [default: 5000]
+  -w --width=<int>     World width [default: 700]
+  -h --height=<int>    World height [default: 500]
+  -f --frames=<int>    Frames per repeat [default: 20]
+  -r --repeat=<int>    Repeats, the best one counts [default: 3]
+  --seed=<int>         Seed of the simulation [default: 0]
+
+"""
+
+import sys
+from timeit import default_timer as clock
+
+from docopt.docopt import docopt
+from PySide import QtGui
+
+import gui_lod
+from gui_swarm import SwarmItem
+from gui_sprites import SpriteCache
+from simulation import Simulation
+
+
+def time_frames(item, image, frames, repeat):
+    """ Best time per frame of painting an item into an image, in seconds. """
+    best = None
+    for _ in range(repeat):
+        t0 = clock()
+        for _ in range(frames):
+            image.fill(0xffffffff)
+            painter = QtGui.QPainter(image)
+            item.paint(painter, None, None)
+            painter.end()
+        took = (clock() - t0) / frames
+        if best is None or took < best:
+            best = took
+    return best
+
+
+if __name__ == '__main__':
+    args = docopt(__docs__)
+    
+    # Pixmaps need an application
+    app = QtGui.QApplication(sys.argv)
+    
+    sim = Simulation(boid_count=int(args['--amount']),
+                     width=int(args['--width']), height=int(args['--height']),
+                     seed=int(args['--seed']))
+    image = QtGui.QImage(sim.width, sim.height, QtGui.QImage.Format_ARGB32_Premultiplied)
+    frames = int(args['--frames'])
+    repeat = int(args['--repeat'])
+    
+    sprites = SpriteCache()
+    items = (('shapes', SwarmItem(sim)), ('sprites', SwarmItem(sim, sprites)))
+    
+    print("{0} boids, {1}x{2}".format(len(sim.boids), sim.width, sim.height))
+    print("{0:<10s} {1:>12s} {2:>12s} {3:>9s}".format("tier", "shapes ms", "sprites ms", "speedup"))
+    for tier in gui_lod.TIERS:
+        times = []
+        for (_, item) in items:
+            item.tier = tier
+            times.append(time_frames(item, image, frames, repeat) * 1000)
+            if tier == gui_lod.POINT:
+                # paintPoints() does not use the sprite cache
+                break
+        if len(times) == 1:
+            print("{0:<10s} {1:12.2f} {2:>12s} {3:>9s}".format(tier, times[0], "n/a", "n/a"))
+        else:
+            print("{0:<10s} {1:12.2f} {2:12.2f} {3:8.2f}x".format(
+                tier, times[0], times[1], times[0] / times[1]))
+    
+    print("{0} atlases cached, {1} hits, {2} misses".format(
+        len(sprites.atlases), sprites.hits, sprites.misses))
+
+# EOF
+
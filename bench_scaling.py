@@ -0,0 +1,190 @@
+#!/usr/bin/env python
+#-*- coding:utf-8 -*-
+
+from __future__ import print_function
+
+__docs__ = """End-to-end scaling benchmark of the full tick.
+
+Runs every engine backend at several swarm sizes against a fixed set of
+scenarios and reports ticks per second, p50/p99 tick latency and peak RSS
+for each configuration. Every configuration runs in a process of its own,
+so the peak RSS is its own and presets do not leak into the next one.
+
+Scenarios:
+  uniform   default parameters in the default world, denser as it grows
+  <preset>  normal, wonky, wacky, racers and testing, with the world grown
+            so that the density of the preset stays the same
+  cluster   default parameters, all boids in one dense Gaussian blob
+  blobs     default parameters, boids in a few Gaussian blobs (placement.py)
+  poisson   default parameters, boids spread evenly by Poisson-disk placement
+
+Configurations that would not fit in the time budget, judging by the
+previous size, are skipped; that is where the backend stops scaling.
+
+Usage:
+  bench_scaling.py [--sizes=<list>] [--scenarios=<list>] [--backends=<list>]
+                   [--ticks=<int>] [--warmup=<int>] [--budget=<secs>]
+                   [--seed=<int>] [--output=<file>]
+  bench_scaling.py config --backend=<name> --scenario=<name> --size=<int>
+                   [--ticks=<int>] [--warmup=<int>] [--budget=<secs>]
+                   [--seed=<int>]
+  bench_scaling.py --help
+
+Options:
+  --help                Show this screen.
+  --sizes=<list>        Comma separated swarm sizes [default: 100,1000,10000,100000]
+  --scenarios=<list>    Comma separated scenarios [default: uniform,normal,wonky,wacky,racers,testing,cluster,blobs,poisson]
+  --backends=<list>     Comma separated backends, default is all of them
+  -t --ticks=<int>      Ticks to measure per configuration [default: 20]
+  --warmup=<int>        Ticks to run before measuring [default: 2]
+  --budget=<secs>       Time budget per configuration [default: 60]
+  --seed=<int>          Seed of every configuration [default: 0]
+  -o --output=<file>    Write the results as JSON to this file
+
+"""
+
+import sys, os, json, time, subprocess, math
+
+from docopt.docopt import docopt
+
+PRESETS = ('normal', 'wonky', 'wacky', 'racers', 'testing') # const
+
+
+def percentile(values, p):
+    """ Nearest-rank percentile of a list of values. """
+    ordered = sorted(values)
+    return ordered[int(round(p / 100.0 * (len(ordered) - 1)))]
+
+
+def peak_rss():
+    """ Peak resident set size of this process in bytes. """
+    import resource
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == 'darwin':
+        return rss # bytes on macOS
+    return rss * 1024 # kilobytes elsewhere
+
+
+def build(backend, scenario, size, seed):
+    """ Build the simulation of one configuration.
+    
+    :rtype: Simulation
+    """
+    import options
+    from vec2d import Vec2d
+    from neighborhood import Neighborhood
+    from simulation import Simulation, BACKENDS
+    from placement import PLACEMENTS
+    
+    width = Simulation.world_width
+    height = Simulation.world_height
+    
+    if scenario in PRESETS:
+        options.parse(['preset', scenario])
+        # Keep the density of the preset
+        scale = math.sqrt(size / float(Simulation.boid_count))
+        width = int(Simulation.world_width * scale)
+        height = int(Simulation.world_height * scale)
+    
+    placement = None
+    if scenario in PLACEMENTS:
+        placement = scenario
+    sim = BACKENDS[backend](boid_count=size, width=width, height=height, seed=seed,
+                            placement=placement)
+    
+    if scenario == 'cluster':
+        rand = sim.rng.placement
+        sigma = math.sqrt(Neighborhood.max_distance)
+        for b in sim.boids:
+            b.position = Vec2d(rand.gauss(width / 2.0, sigma) % width,
+                               rand.gauss(height / 2.0, sigma) % height)
+    
+    return sim
+
+
+def run_config(backend, scenario, size, ticks, warmup, budget, seed):
+    """ Run one configuration in this process.
+    
+    Stops early, after at least one measured tick, if over the budget.
+    
+    :rtype: dict
+    """
+    started = time.time()
+    sim = build(backend, scenario, size, seed)
+    init = time.time() - started
+    
+    latencies = []
+    for t in range(warmup + ticks):
+        tick_started = time.time()
+        sim.step()
+        if t >= warmup:
+            latencies.append(time.time() - tick_started)
+        if latencies and time.time() - started > budget:
+            break
+    
+    return {'backend': backend, 'scenario': scenario, 'size': size,
+            'init': init, 'ticks': len(latencies),
+            'ticks_per_sec': len(latencies) / sum(latencies),
+            'p50': percentile(latencies, 50), 'p99': percentile(latencies, 99),
+            'peak_rss': peak_rss()}
+
+
+def run_all(args):
+    """ Run every configuration in a child process and print a table. """
+    from simulation import BACKENDS
+    
+    sizes = [int(s) for s in args['--sizes'].split(',')]
+    scenarios = args['--scenarios'].split(',')
+    backends = sorted(BACKENDS)
+    if args['--backends']:
+        backends = args['--backends'].split(',')
+    budget = float(args['--budget'])
+    
+    print("{0:10s} {1:8s} {2:>7s} {3:>9s} {4:>10s} {5:>10s} {6:>9s}".format(
+        "backend", "scenario", "boids", "ticks/s", "p50 ms", "p99 ms", "RSS MB"))
+    
+    results = []
+    for backend in backends:
+        for scenario in scenarios:
+            last = None # (size, p50) of the previous size that ran
+            for size in sizes:
+                if last is not None:
+                    estimate = last[1] * (size / float(last[0]))**2
+                    if estimate > budget:
+                        print("{0:10s} {1:8s} {2:7d}   skipped, ~{3:.0f} s per tick".format(
+                            backend, scenario, size, estimate))
+                        continue
+                
+                out = subprocess.check_output([
+                    sys.executable, os.path.abspath(__file__), 'config',
+                    '--backend=' + backend, '--scenario=' + scenario,
+                    '--size=%d' % size, '--ticks=' + args['--ticks'],
+                    '--warmup=' + args['--warmup'], '--budget=' + args['--budget'],
+                    '--seed=' + args['--seed']])
+                result = json.loads(out.decode('utf-8').strip().split('\n')[-1])
+                results.append(result)
+                last = (size, result['p50'])
+                
+                print("{0:10s} {1:8s} {2:7d} {3:9.2f} {4:10.1f} {5:10.1f} {6:9.1f}".format(
+                    backend, scenario, size, result['ticks_per_sec'],
+                    result['p50'] * 1000, result['p99'] * 1000,
+                    result['peak_rss'] / 1048576.0))
+    
+    if args['--output']:
+        with open(args['--output'], 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+
+
+if __name__ == '__main__':
+    args = docopt(__docs__)
+    if args['config']:
+        result = run_config(args['--backend'], args['--scenario'],
+                            int(args['--size']), int(args['--ticks']),
+                            int(args['--warmup']), float(args['--budget']),
+                            int(args['--seed']))
+        print(json.dumps(result))
+    else:
+        run_all(args)
+
+# EOF
+
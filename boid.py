@@ -1,7 +1,6 @@
 #!/usr/bin/env python
 #-*- coding:utf-8 -*-
 
-import engine
 from orientation import Orientation
 
 class Boid(object):
@@ -9,6 +8,8 @@ class Boid(object):
     
     CAP_MIN_SPEED_MULTIPLIER = 0.01 # const
     CAP_MAX_SPEED_MULTIPLIER = 1.5  # const
+    RADIUS = 4.0                    # const, boid radius
+    DIAMETER = 2*RADIUS             # const
     
     mass = 10.5             # static
     max_force = 5.0         # static
@@ -18,29 +19,29 @@ class Boid(object):
     cap_max_speed = max_speed*CAP_MAX_SPEED_MULTIPLIER      # static
     view_angle = 120 # static, on both sides, 180 = full circle
     
-    def __init__(self, position = None, velocity = None, orientation = None):
+    def __init__(self, position, velocity, orientation = None, color = None):
         """ Initializes the boid.
         
-        :param position: Position, random if not given
+        :param position: Position
         :type position: Vec2d
-        :param velocity: Velocity, random if not given
+        :param velocity: Velocity
         :type velocity: Vec2d
-        :param orientation: Orientation, random if not given
+        :param orientation: Orientation, default if not given
         :type orientation: Orientation
+        :param color: Color as (r, g, b), white if not given
+        :type color: tuple of int
         """
         
-        if position == None:
-            position = engine.Engine.randPosition()
-        
-        if velocity == None:
-            velocity = engine.Engine.randForce()
-        
         if orientation == None:
             orientation = Orientation.new()
         
+        if color == None:
+            color = (255, 255, 255)
+        
         self.position = position
         self.velocity = velocity
         self.orientation = orientation
+        self.color = color
     
     
     def move(self, force, window_width, window_height):
@@ -1,14 +1,159 @@
 #!/usr/bin/env python
 #-*- coding:utf-8 -*-
 
-""" See engine.py """
+""" See engine.py and simulation.py """
 
-import sys
-from PySide import QtGui
-from engine import Engine
+from __future__ import print_function
+
+import sys, time
+
+import options
+
+def headless(args):
+    """ Run the simulation without the GUI for the given amount of ticks.
+    
+    The modules of the optional features are only imported when used.
+    """
+    from boid import Boid
+    from simulation import new_simulation
+    
+    simulation = new_simulation()
+    if args['--restore'] or args['--checkpoint']:
+        import checkpoint
+    if args['--restore']:
+        checkpoint.restore(args['--restore'], simulation)
+        print("!!! Restored", len(simulation.boids), "boids at tick", simulation.tick,
+              "from", args['--restore'], "!!!")
+    checkpoints = None
+    every = 0
+    if args['--checkpoint']:
+        checkpoints = checkpoint.CheckpointWriter()
+        if args['--checkpoint-every']:
+            every = int(args['--checkpoint-every'])
+    server = None
+    if args['--serve']:
+        from stream_server import StreamServer
+        server = StreamServer(int(args['--serve']))
+    profiler = None
+    if args['--profile'] or args['--profile-csv']:
+        from profiler import TickProfiler
+        profiler = TickProfiler(args['--profile-csv'], window=int(args['--ticks']))
+        simulation.profiler = profiler
+    exporter = None
+    if args['--export']:
+        import gui_export, writer
+        if args['--export-format'] not in gui_export.FORMATS:
+            sys.exit("Unknown export format " + args['--export-format'])
+        if args['--export-policy'] not in writer.POLICIES:
+            sys.exit("Unknown export policy " + args['--export-policy'])
+        # Painting needs an application, one without a GUI is enough
+        from PySide import QtGui
+        app = QtGui.QApplication([], False)
+        from gui_export import FrameExporter
+        exporter = FrameExporter(simulation, args['--export'], args['--export-format'],
+                                 args['--export-policy'])
+    
+    metrics = None
+    if args['--metrics'] or args['--flocks']:
+        from metrics import FlockMetrics
+        metrics = FlockMetrics(int(args['--metrics'] or 1), flocks=args['--flocks'])
+        simulation.metrics = metrics
+        header = "{0:>8s} {1:>12s} {2:>10s} {3:>10s}".format(
+            "tick", "polarization", "neighbors", "separation")
+        if metrics.tracker is not None:
+            header += " {0:>6s} {1:>6s} {2:>6s}".format("flocks", "splits", "merges")
+        print(header)
+    
+    recorder = None
+    recording = 0.0
+    if args['--record']:
+        from trajectory import TrajectoryRecorder
+        recorder = TrajectoryRecorder(args['--record'], simulation.boids,
+                                      delta=args['--record-delta'])
+    
+    policy = None
+    if args['--gc'] or args['--gc-freeze']:
+        from gc_policy import GcPolicy
+        policy = GcPolicy(args['--gc'] or 'auto', args['--gc-freeze'], profiler)
+        policy.settle()
+    
+    ticks = int(args['--ticks'])
+    started = time.time()
+    for i in range(ticks):
+        if profiler is not None:
+            profiler.begin_tick()
+        if policy is not None:
+            policy.begin_tick()
+        simulation.step()
+        if metrics is not None and metrics.due(simulation.tick):
+            line = "{0:8d} {1:12.4f} {2:10.2f} {3:10.2f}".format(*metrics.latest)
+            tracker = metrics.tracker
+            if tracker is not None:
+                line += " {0:6d} {1:6d} {2:6d}".format(tracker.count, tracker.splits,
+                                                      tracker.merges)
+            print(line)
+        if server is not None:
+            server.publish(simulation.boids, simulation.width,
+                           simulation.height, Boid.cap_max_speed)
+        if exporter is not None:
+            exporter.export()
+        if recorder is not None:
+            t0 = time.time()
+            recorder.record(simulation)
+            recording += time.time() - t0
+        if every and simulation.tick % every == 0:
+            checkpoints.save(simulation, args['--checkpoint'])
+        if policy is not None:
+            policy.idle()
+    elapsed = time.time() - started
+    
+    print("Ran {0} ticks of {1} boids in {2:.3f} s, {3:.2f} ticks/s".format(
+        ticks, len(simulation.boids), elapsed, ticks / elapsed))
+    
+    if metrics is not None and metrics.samples:
+        averages = metrics.averages()
+        print("Averages of {0} samples: polarization {1:.4f}, neighbors {2:.2f}, "
+              "separation {3:.2f}".format(*averages))
+        if averages.flocks is not None:
+            print("Flocks on average: {0:.2f}".format(averages.flocks))
+    
+    if policy is not None:
+        policy.close()
+        print("Garbage collection: {0} collections, {1:.1f} ms in ticks, "
+              "{2:.1f} ms between".format(policy.collections, policy.tick_seconds * 1000,
+                                          policy.idle_seconds * 1000))
+    
+    if exporter is not None:
+        exporter.close()
+    
+    if recorder is not None:
+        recorder.close()
+        print("Recorded {0} ticks to {1}, {2:.1f} % of the run time".format(
+            recorder.tick, args['--record'], 100 * recording / elapsed))
+    
+    if checkpoints is not None:
+        checkpoints.save(simulation, args['--checkpoint'])
+        checkpoints.close()
+        print("!!! Saved checkpoint at tick", simulation.tick, "to", args['--checkpoint'], "!!!")
+    
+    if profiler is not None:
+        profiler.close()
+        for (phase, ms) in profiler.averages():
+            print("{0:10s} {1:8.2f} ms per tick".format(phase, ms))
 
 if __name__ == '__main__':
+    args = options.parse(sys.argv[1:])
+    options.greet()
+    
+    if args['headless']:
+        headless(args)
+        sys.exit(0)
+    
+    # Only the GUI needs Qt
+    from PySide import QtGui
+    from engine import Engine
+    
     app = QtGui.QApplication(sys.argv)
-    gui = Engine()
+    gui = Engine(args)
     sys.exit(app.exec_())
 
@@ -0,0 +1,247 @@
+#!/usr/bin/env python
+#-*- coding:utf-8 -*-
+
+from __future__ import print_function
+
+__docs__ = """Checks that an engine backend simulates the same flock as the reference.
+
+Runs the reference and the candidate backend from the same seeded state
+and reports, for every tick, how far apart the boids are (toroidal
+distance for positions) and for how many boids the neighbor sets differ.
+Exits with status 1 if the candidate diverges beyond the tolerance, so it
+can gate an optimization.
+
+Neighbor sets are recorded through Simulation.neighborhood(); backends
+that do not find the neighborhoods through it are compared on positions
+and velocities only.
+
+With a --radius beyond Neighborhood.near_distance, the far-field backends
+(barnes-hut, summed-grid) leave the far part of a neighborhood out of
+separation and take it from sums made at the start of the tick, so their
+runs drift apart from the reference even when every sum is exact. Then the candidate is judged on
+its own state, before every tick: the averages of its neighborhoods
+against the exact ones, within the tolerance, and its near neighbor sets.
+The drift of the runs is only reported.
+
+Usage:
+  check_equivalence.py [--candidate=<name>] [--reference=<name>]
+                       [--ticks=<int>] [--amount=<int>] [(--width=<int> --height=<int>)]
+                       [--seed=<int>] [--tolerance=<float>] [--max-mismatches=<int>]
+                       [--radius=<float>] [--theta=<float>] [--quiet]
+  check_equivalence.py --help
+
+Options:
+  --help                  Show this screen.
+  --candidate=<name>      Backend to check, default is every other backend
+  --reference=<name>      Backend to compare against [default: reference]
+  -t --ticks=<int>        Ticks to run [default: 100]
+  -a --amount=<int>       Amount of boids [default: 100]
+  -w --width=<int>        World width [default: 700]
+  -h --height=<int>       World height [default: 500]
+  --seed=<int>            Seed of both runs [default: 0]
+  --tolerance=<float>     Largest allowed position or velocity difference [default: 1e-6]
+  --max-mismatches=<int>  Largest allowed amount of differing neighbor sets [default: 0]
+  --radius=<float>        Radius of a neighborhood, default is the usual one
+  --theta=<float>         Opening angle of barnes-hut, default is its usual one
+  -q --quiet              Only print the summary
+
+"""
+
+import sys
+
+from docopt.docopt import docopt
+
+from neighborhood import Neighborhood, FarNeighborhood
+from simulation import Simulation, BarnesHutSimulation, BACKENDS
+
+
+def record_neighbors(sim):
+    """ Make the simulation record the neighbor set of every boid per tick.
+    
+    :returns: dict filled with boid index -> set of neighbor indices
+    :rtype: dict
+    """
+    index = dict((id(b), i) for (i, b) in enumerate(sim.boids))
+    record = {}
+    find = sim.neighborhood
+    
+    def neighborhood(b1):
+        hood = find(b1)
+        record[index[id(b1)]] = set(index[id(b)] for b in hood.boids)
+        return hood
+    
+    sim.neighborhood = neighborhood
+    return record
+
+
+def divergence(ref, cand):
+    """ Compare the boids of two simulations.
+    
+    :returns: max and mean position difference, max velocity difference
+    :rtype: tuple of float
+    """
+    w = ref.width
+    h = ref.height
+    pos = [a.position.get_dist_sqrd_toroidal(b.position, w, h) ** 0.5
+           for (a, b) in zip(ref.boids, cand.boids)]
+    vel = [(a.velocity - b.velocity).length for (a, b) in zip(ref.boids, cand.boids)]
+    if not pos:
+        return (0.0, 0.0, 0.0)
+    return (max(pos), sum(pos) / len(pos), max(vel))
+
+
+def neighborhood_errors(sim):
+    """ Compare the neighborhoods of a backend to the exact ones, on its state.
+    
+    Builds what the backend needs for the coming tick, then finds the
+    neighborhood of every boid both with the backend and with
+    Simulation.neighborhood(). A FarNeighborhood only lists the boids within
+    Neighborhood.near_distance, so the exact neighbor set is cut to those.
+    
+    :returns: the difference of the average position (toroidal) and of the
+              average velocity of every boid, and the amount of differing
+              neighbor sets
+    :rtype: (list of float, list of float, int)
+    """
+    w = sim.width
+    h = sim.height
+    sim.prepare()
+    positions = []
+    velocities = []
+    mismatches = 0
+    for b1 in sim.boids:
+        exact = Simulation.neighborhood(sim, b1)
+        hood = sim.neighborhood(b1)
+        positions.append(exact.avg_position.get_dist_sqrd_toroidal(hood.avg_position, w, h) ** 0.5)
+        velocities.append((exact.avg_velocity - hood.avg_velocity).length)
+        near = exact.boids
+        if isinstance(hood, FarNeighborhood):
+            near = [b for b in near if b1.position.get_dist_sqrd_toroidal(b.position, w, h)
+                    <= Neighborhood.near_distance]
+        if set(map(id, near)) != set(map(id, hood.boids)):
+            mismatches += 1
+    return (positions, velocities, mismatches)
+
+
+def compare(ref, cand, ticks, tolerance, max_mismatches, report = None):
+    """ Run two simulations side by side and compare them every tick.
+    
+    :param ref: the reference simulation
+    :type ref: Simulation
+    :param cand: the candidate simulation, same seed and size as ref
+    :type cand: Simulation
+    :param report: called with the result of every tick, if given
+    :type report: function
+    :returns: results per tick and the first tick beyond the tolerance
+    :rtype: (list of dict, int or None)
+    """
+    if len(ref.boids) != len(cand.boids):
+        raise ValueError("Simulations have different amounts of boids")
+    
+    # Far-field backends are judged by their neighborhoods, see __docs__
+    far = Neighborhood.max_distance > Neighborhood.near_distance
+    if not far:
+        ref_hoods = record_neighbors(ref)
+        cand_hoods = record_neighbors(cand)
+    
+    results = []
+    first = None
+    for tick in range(1, ticks + 1):
+        avg_pos = None
+        avg_vel = None
+        if far:
+            (positions, velocities, mismatches) = neighborhood_errors(cand)
+            avg_pos = max(positions or [0.0])
+            avg_vel = max(velocities or [0.0])
+        else:
+            ref_hoods.clear()
+            cand_hoods.clear()
+        ref.step()
+        cand.step()
+        
+        (pos_max, pos_mean, vel_max) = divergence(ref, cand)
+        if not far:
+            mismatches = None
+            if cand_hoods:
+                mismatches = sum(1 for i in ref_hoods if ref_hoods[i] != cand_hoods.get(i))
+        
+        result = {'tick': tick, 'pos_max': pos_max, 'pos_mean': pos_mean,
+                  'vel_max': vel_max, 'avg_pos': avg_pos, 'avg_vel': avg_vel,
+                  'mismatches': mismatches}
+        results.append(result)
+        if report is not None:
+            report(result)
+        
+        if far:
+            beyond = avg_pos > tolerance or avg_vel > tolerance
+        else:
+            beyond = pos_max > tolerance or vel_max > tolerance
+        if mismatches is not None and mismatches > max_mismatches:
+            beyond = True
+        if beyond and first is None:
+            first = tick
+    
+    return (results, first)
+
+
+def print_tick(result):
+    mismatches = result['mismatches']
+    if mismatches is None:
+        mismatches = 'n/a'
+    line = "{0:6d} {1:14.3e} {2:14.3e} {3:14.3e}".format(
+        result['tick'], result['pos_max'], result['pos_mean'], result['vel_max'])
+    if result['avg_pos'] is not None:
+        line += " {0:14.3e} {1:14.3e}".format(result['avg_pos'], result['avg_vel'])
+    print(line + " {0:>11}".format(mismatches))
+
+
+if __name__ == '__main__':
+    args = docopt(__docs__)
+    
+    reference = args['--reference']
+    candidates = [name for name in sorted(BACKENDS) if name != reference]
+    if args['--candidate']:
+        candidates = [args['--candidate']]
+    if not candidates:
+        print("No backends besides", reference, "to check")
+        sys.exit(0)
+    
+    if args['--radius']:
+        Neighborhood.max_distance = float(args['--radius'])**2
+    if args['--theta']:
+        BarnesHutSimulation.theta = float(args['--theta'])
+    far = Neighborhood.max_distance > Neighborhood.near_distance
+    
+    failed = False
+    for candidate in candidates:
+        sims = [BACKENDS[name](boid_count=int(args['--amount']),
+                               width=int(args['--width']), height=int(args['--height']),
+                               seed=int(args['--seed']))
+                for name in (reference, candidate)]
+        
+        report = None
+        if not args['--quiet']:
+            print("\n{0} against {1}".format(candidate, reference))
+            header = "{0:>6s} {1:>14s} {2:>14s} {3:>14s}".format(
+                "tick", "max pos diff", "mean pos diff", "max vel diff")
+            if far:
+                header += " {0:>14s} {1:>14s}".format("max avg pos", "max avg vel")
+            print(header + " {0:>11s}".format("mismatches"))
+            report = print_tick
+        
+        (results, first) = compare(sims[0], sims[1], int(args['--ticks']),
+                                   float(args['--tolerance']),
+                                   int(args['--max-mismatches']), report)
+        
+        if first is None:
+            print("{0}: equivalent to {1} for {2} ticks".format(
+                candidate, reference, len(results)))
+        else:
+            failed = True
+            print("{0}: diverges from {1} beyond the tolerance at tick {2}".format(
+                candidate, reference, first))
+    
+    sys.exit(1 if failed else 0)
+
+# EOF
+
@@ -0,0 +1,235 @@
+#!/usr/bin/env python
+#-*- coding:utf-8 -*-
+
+""" Saving and restoring the full state of a Simulation.
+
+A checkpoint is a binary file with a fixed layout, all little-endian:
+
+  header        magic 'BOIDCKPT', version, boid count, tick, seed,
+                world width and height
+  boid params   the Boid class parameters, in BOID_PARAMS order
+  rules         MAX_RULES slots of (name, weight), unused slots are empty
+  rng           the state of every stream of RandomStreams, in NAMES order
+  arrays        positions, velocities, forward and side vectors as float64
+                pairs, then colors as uint8 triples, starting at an
+                offset divisible by 8
+
+The size of everything before the arrays does not depend on the boids, so
+the offset of each array follows from the boid count alone. Restoring
+maps the file into memory and unpacks each array in one go, instead of
+reading and parsing the file piece by piece.
+
+Saving packs the state into bytes during the tick; writing them to disk
+can be left to a CheckpointWriter thread.
+"""
+
+import os, mmap, struct
+
+from vec2d import Vec2d
+from orientation import Orientation
+from boid import Boid
+from rng import RandomStreams
+from writer import BackgroundWriter, BLOCK
+
+MAGIC = b'BOIDCKPT'     # const
+VERSION = 2             # const
+MAX_RULES = 8           # const, rule slots in the file
+BOID_PARAMS = ('mass', 'max_force', 'normal_speed', 'max_speed',
+               'cap_min_speed', 'cap_max_speed', 'view_angle') # const
+
+HEADER = struct.Struct('<8sHHIQqII')   # magic, version, unused, count, tick, seed, width, height
+PARAMS = struct.Struct('<%dd' % len(BOID_PARAMS))
+RULE = struct.Struct('<16sd')           # name, weight
+RNG = struct.Struct('<i625IBd')         # version, internal state, has gauss, gauss
+
+ARRAYS_OFFSET = HEADER.size + PARAMS.size + MAX_RULES * RULE.size \
+              + len(RandomStreams.NAMES) * RNG.size
+ARRAYS_OFFSET += -ARRAYS_OFFSET % 8    # const, where the arrays begin
+
+
+class CheckpointError(Exception):
+    """ The file is not a checkpoint this version can read. """
+
+
+def snapshot(sim):
+    """ Packs the full state of a simulation.
+    
+    :param sim: the simulation
+    :type sim: Simulation
+    :returns: contents of the checkpoint file
+    :rtype: bytes
+    """
+    if len(sim.rules) > MAX_RULES:
+        raise CheckpointError("More than %d rules" % MAX_RULES)
+    boids = sim.boids
+    count = len(boids)
+    
+    parts = [HEADER.pack(MAGIC, VERSION, 0, count, sim.tick, sim.rng.seed,
+                         int(sim.width), int(sim.height)),
+             PARAMS.pack(*[getattr(Boid, name) for name in BOID_PARAMS])]
+    
+    for i in range(MAX_RULES):
+        if i < len(sim.rules):
+            rule = sim.rules[i]
+            parts.append(RULE.pack(rule.name.encode('utf-8'), type(rule).weight))
+        else:
+            parts.append(RULE.pack(b'', 0.0))
+    
+    state = sim.rng.getstate()
+    for name in RandomStreams.NAMES:
+        (version, internal, gauss) = state[name]
+        parts.append(RNG.pack(version, *(internal + (gauss is not None, gauss or 0.0))))
+    
+    parts.append(b'\0' * (ARRAYS_OFFSET - sum(len(p) for p in parts)))
+    
+    vectors = struct.Struct('<%dd' % (2 * count))
+    for get in (lambda b: b.position, lambda b: b.velocity,
+                lambda b: b.orientation.forward, lambda b: b.orientation.side):
+        flat = []
+        for b in boids:
+            v = get(b)
+            flat.append(v.x)
+            flat.append(v.y)
+        parts.append(vectors.pack(*flat))
+    
+    colors = bytearray()
+    for b in boids:
+        colors.extend(b.color)
+    parts.append(bytes(colors))
+    
+    return b''.join(parts)
+
+
+def save(sim, path):
+    """ Writes a checkpoint of a simulation.
+    
+    The file is written under a temporary name first, so that a crash
+    never leaves a half written checkpoint behind.
+    """
+    write((path, snapshot(sim)))
+
+
+def write(item):
+    """ Writes (path, data) from snapshot() to disk. """
+    (path, data) = item
+    tmp = path + '.tmp'
+    with open(tmp, 'wb') as f:
+        f.write(data)
+    if os.name == 'nt' and os.path.exists(path):
+        os.remove(path)
+    os.rename(tmp, path)
+
+
+def restore(path, sim):
+    """ Restores a checkpoint into a simulation, replacing its boids.
+    
+    Also sets the Boid class parameters and the weights of the rules, and
+    continues the random streams where they were.
+    
+    :param path: the checkpoint file
+    :type path: str
+    :param sim: the simulation to restore into
+    :type sim: Simulation
+    """
+    with open(path, 'rb') as f:
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    try:
+        restore_from(mm, sim)
+    finally:
+        mm.close()
+
+
+def restore_from(buf, sim):
+    """ Restores a checkpoint from a buffer, see restore(). """
+    if len(buf) < ARRAYS_OFFSET:
+        raise CheckpointError("Truncated checkpoint")
+    (magic, version, _, count, tick, seed, width, height) = HEADER.unpack_from(buf, 0)
+    if magic != MAGIC:
+        raise CheckpointError("Not a checkpoint")
+    if version != VERSION:
+        raise CheckpointError("Checkpoint version %d, can read %d" % (version, VERSION))
+    if len(buf) < ARRAYS_OFFSET + count * (4 * 2 * 8 + 3):
+        raise CheckpointError("Truncated checkpoint")
+    offset = HEADER.size
+    
+    for (name, value) in zip(BOID_PARAMS, PARAMS.unpack_from(buf, offset)):
+        setattr(Boid, name, value)
+    offset += PARAMS.size
+    
+    weights = {}
+    for i in range(MAX_RULES):
+        (name, weight) = RULE.unpack_from(buf, offset)
+        offset += RULE.size
+        name = name.rstrip(b'\0').decode('utf-8')
+        if name:
+            weights[name] = weight
+    for rule in sim.rules:
+        if rule.name in weights:
+            type(rule).weight = weights[rule.name]
+    
+    rng = RandomStreams(seed)
+    state = {}
+    for name in RandomStreams.NAMES:
+        values = RNG.unpack_from(buf, offset)
+        offset += RNG.size
+        gauss = values[-1] if values[-2] else None
+        state[name] = (values[0], tuple(values[1:-2]), gauss)
+    rng.setstate(state)
+    
+    # Arrays, each unpacked in one go
+    offset = ARRAYS_OFFSET
+    vectors = struct.Struct('<%dd' % (2 * count))
+    arrays = []
+    for i in range(4):
+        arrays.append(vectors.unpack_from(buf, offset))
+        offset += vectors.size
+    colors = bytearray(buf[offset:offset + 3 * count])
+    (pos, vel, fwd, side) = arrays
+    
+    boids = []
+    for i in range(count):
+        j = 2 * i
+        boids.append(Boid(Vec2d(pos[j], pos[j + 1]), Vec2d(vel[j], vel[j + 1]),
+                          Orientation(Vec2d(fwd[j], fwd[j + 1]), Vec2d(side[j], side[j + 1])),
+                          color=tuple(colors[3 * i:3 * i + 3])))
+    
+    sim.boids = boids
+    sim.boid_count = count
+    sim.width = width
+    sim.height = height
+    sim.tick = tick
+    sim.rng = rng
+
+
+class CheckpointWriter(object):
+    """ Writes checkpoints in the background.
+    
+    The state is packed during the tick, so the checkpoint is consistent,
+    and the thread only writes the bytes to disk.
+    """
+    
+    def __init__(self, max_queue = 2, policy = BLOCK):
+        """
+        :param max_queue: amount of checkpoints allowed to wait
+        :type max_queue: int
+        :param policy: writer.DROP or writer.BLOCK, when the disk falls behind
+        :type policy: str
+        """
+        self.writer = BackgroundWriter(write, max_queue, policy)
+    
+    
+    def save(self, sim, path):
+        """ Packs the state now and writes it to path in the background.
+        
+        :returns: False if the checkpoint was dropped
+        :rtype: bool
+        """
+        return self.writer.submit((path, snapshot(sim)))
+    
+    
+    def close(self):
+        """ Writes the checkpoints still waiting. """
+        self.writer.close()
+
+# EOF
+
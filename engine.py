@@ -3,150 +3,288 @@
 
 from __future__ import print_function
 
-__docs__ = """Boids.
-
-Usage:
-  boids.py run [--amount=<int>] [(--width=<int> --height=<int>)]
-               [--numviews=<int>]
-               [--separation=<float>] [--alignment=<float>] [--cohesion=<float>]
-               [--boid-view-angle=<int>]
-               [--boid-mass=<float>] [--boid-max-force=<float>]
-               [--boid-normal-speed=<float>] [--boid-max-speed=<float>]
-  boids.py preset (normal|wonky|wacky|racers|testing)
-  boids.py --help
-  boids.py --version
-
-Options:
-  --help                        Show this screen.
-  --version                     Show version.
-  -a --amount=<int>             Amount of boids
-  -w --width=<int>              Window width
-  -h --height=<int>             Window height
-  -n --numviews=<int>           Number of views (gives n x n grid)
-  -s --separation=<float>       Weight for the separation rule
-  -l --alignment=<float>        Weight for the alignment rule
-  -c --cohesion=<float>         Weight for the cohesion rule
-  --boid-view-angle=<int>       Boid's view angle on both sides, 180 is full circle
-  --boid-mass=<float>           Mass of the boid
-  --boid-max-force=<float>      Force when applying rules
-  --boid-normal-speed=<float>   Boids' target normal speed
-  --boid-max-speed=<float>      Boids' target max speed
-
-"""
-
-__greeting__ = """
-     **               **      **        
-    /**              //      /**        
-    /**       ******  **     /**  ******
-    /******  **////**/**  ****** **//// 
-    /**///**/**   /**/** **///**//***** 
-    /**  /**/**   /**/**/**  /** /////**
-    /****** //****** /**//****** ****** 
-    /////    //////  //  ////// //////  
-"""
-
-from docopt.docopt import docopt
-
-import sys, random, gc, itertools
+import sys, itertools
+from timeit import default_timer as clock
 
 from PySide import QtCore, QtGui
 
-from vec2d import Vec2d
-from neighborhood import Neighborhood
+from stream_server import StreamServer
 from boid import Boid
 from gui_boid import GuiBoid
+from gui_swarm import SwarmItem
+from gui_sprites import SpriteCache
+import gui_lod
+from governor import Governor
+from gui_export import FrameExporter
+import gui_export
+import writer
+import checkpoint
+from trajectory import TrajectoryRecorder
+from replay import Replay
+from metrics import FlockMetrics
+from flocks import flock_color
+from gui_view import ProfiledView, SharedRenderer, SharedImageView
+from profiler import TickProfiler
+from gc_policy import GcPolicy
+import gc_policy
+from simulation import new_simulation
+from options import VERSION
 
-from rule_separation import RuleSeparation
-from rule_cohesion import RuleCohesion
-from rule_alignment import RuleAlignment
-
-VERSION = '0x03'
 UPDATE_RATE = 30 # msecs
 
 class Engine(QtGui.QMainWindow):
-    """ Engine for the boids simulation. """
+    """ GUI for the boids simulation, shows and drives a Simulation. """
     
-    boid_count = 100        # static
-    window_width = 700      # static
-    window_height = 500     # static
-    num_views = 1           # static
+    RENDER_MODES = ('items', 'batched') # const
     
-    def __init__(self):
-        """ Initializes the Engine. """
+    num_views = 1           # static
+    serve_port = None       # static, TCP port for streaming, None = off
+    profile = False         # static, show the profiler overlay
+    profile_csv = None      # static, CSV file for the profiler, None = off
+    render_mode = 'items'   # static, one of RENDER_MODES
+    shared_render = False   # static, render once for all the views
+    lod = 'auto'            # static, one of gui_lod.TIERS or 'auto'
+    sprites = False         # static, draw pre-rendered glyphs
+    governed = False        # static, adapt the quality to keep the frame rate
+    export_path = None      # static, where to export the frames, None = off
+    export_format = 'png'   # static, one of gui_export.FORMATS
+    export_policy = 'drop'  # static, one of writer.POLICIES
+    restore_path = None     # static, checkpoint to start from, None = new boids
+    checkpoint_path = 'boids.ckpt' # static, where Save writes the checkpoint
+    record_path = None      # static, trajectory file to record to, None = off
+    record_delta = False    # static, record quantized deltas
+    metrics_every = None    # static, gather metrics every n ticks, None = off
+    color_flocks = False    # static, follow the flocks and color the boids by flock
+    gc_mode = 'auto'        # static, one of gc_policy.MODES
+    gc_freeze = False       # static, freeze the objects alive after startup
+    
+    def __init__(self, args):
+        """ Initializes the Engine.
+        
+        :param args: command line arguments parsed by options.parse()
+        :type args: dict
+        """
         super(Engine, self).__init__()
         
         # CLI stuff
-        self.initCli()
+        self.initCli(args)
         
         # Init stuff
-        self.boids = None # list for boids
-        self.rules = None # list for rules
+        self.replay = None # Replay, if replaying a recording instead of simulating
+        if args['replay']:
+            self.replay = Replay(args['<file>'], float(args['--speed']))
+            self.simulation = self.replay
+        else:
+            self.simulation = new_simulation() # the simulation itself
+        self.guiBoids = [] # list of GuiBoids (or the SwarmItem) showing the boids
         
         self.view = None # QGraphicsView
         self.grid = None # Qt layout grid
         self.guiAreas = [] # list holding the gui area elements
         self.layoutEdit = None # Qt editing layout
+        self.server = None # StreamServer, if streaming
+        self.profiler = None # TickProfiler, if profiling
+        self.renderer = None # SharedRenderer, if rendering once for all views
+        self.sprites = None # SpriteCache, if drawing pre-rendered glyphs
+        self.governor = None # Governor, if adapting the quality
+        self.frameStart = None # when the running frame started, for the governor
+        self.frameWork = None # seconds of the last frame outside the views, for the governor
+        self.painted = 0.0 # seconds the views painted since the last frame was reported
+        self.exporter = None # FrameExporter, if exporting frames
+        self.checkpoints = checkpoint.CheckpointWriter() # writes checkpoints in the background
+        self.recorder = None # TrajectoryRecorder, if recording
+        self.slider = None # QSlider for seeking in a replay
+        self.replayLabel = None # QLabel showing the tick and speed of a replay
+        self.metricsLabel = None # QLabel showing the latest flock metrics
+        self.gcPolicy = None # GcPolicy, keeps the garbage collector out of the ticks
         
         self.setWindowTitle('Boids ' + VERSION)
         
-        # Seed pseudorandomnumgen with current time in seconds
-        random.seed(QtCore.QTime(0,0,0).secsTo(QtCore.QTime.currentTime()))
+        if Engine.restore_path is not None:
+            checkpoint.restore(Engine.restore_path, self.simulation)
+        
+        # Kept over resets, the glyphs do not change
+        if Engine.sprites:
+            self.sprites = SpriteCache()
+        
+        if Engine.profile or Engine.profile_csv is not None:
+            self.profiler = TickProfiler(Engine.profile_csv)
+            self.simulation.profiler = self.profiler
+        
+        self.gcPolicy = GcPolicy(Engine.gc_mode, Engine.gc_freeze, self.profiler)
+        
+        if Engine.metrics_every is not None and self.replay is None:
+            self.simulation.metrics = FlockMetrics(Engine.metrics_every,
+                                                   flocks=Engine.color_flocks)
+        
+        if Engine.governed:
+            self.governor = Governor(UPDATE_RATE / 1000.0, log=self.logGovernor)
         
         # Init bunch of stuff
         self.initGraphicsScene()
-        self.initOrReloadBoidsAndRules()
+        self.initGuiBoids()
         self.initGraphicsViewGrid(Engine.num_views)
         
         # Show the main window on the screen
         self.show()
         
+        # Start streaming before the first tick
+        if Engine.serve_port is not None:
+            self.server = StreamServer(Engine.serve_port)
+        
+        # Export from the first tick on
+        if Engine.export_path is not None:
+            self.exporter = FrameExporter(self.simulation, Engine.export_path,
+                                          Engine.export_format, Engine.export_policy)
+        
+        if Engine.record_path is not None:
+            self.recorder = TrajectoryRecorder(Engine.record_path, self.simulation.boids,
+                                               delta=Engine.record_delta)
+        
+        # Leave what survived the startup out of the collections, if freezing
+        self.gcPolicy.settle()
+        
         # Initialize timer after bringing up the main window
         self.initTimer()
     
     
-    def initCli(self):
-        """ Apply CLI arguments and print the greeting. """
-        # Get CLI options
-        argv = QtCore.QCoreApplication.instance().arguments()
-        argv = map( str , argv)
-        del(argv[0])
-        args = docopt(__docs__, argv=argv, version='Boids ' + VERSION)
-        
-        # CLI options
-        if args['run']:
-            self.cliArgsApply(args)
-        
-        # Presets
-        if args['preset']:
-            if args['wonky']:
-                self.preset_wonky()
-            if args['wacky']:
-                self.preset_wacky()
-            if args['racers']:
-                self.preset_racers()
-            if args['testing']:
-                self.preset_testing()
-            elif args['normal']:
-                pass
-        
-        # Print the greeting
-        print(__greeting__)
-        print("                          Version " + VERSION + "\n")
-    
-    
-    def initOrReloadBoidsAndRules(self):
-        """ Initializes (or reloads) the boids and rules.
-        
-        Initializes the boids and rules by clearing the old boids and
-        the graphicsscene.
+    def initCli(self, args):
+        """ Apply the GUI specific CLI arguments. """
+        if args['--numviews']:
+            Engine.num_views = int(args['--numviews'])
+        
+        if args['--serve']:
+            Engine.serve_port = int(args['--serve'])
+        
+        if args['--profile']:
+            Engine.profile = True
+        if args['--profile-csv']:
+            Engine.profile_csv = args['--profile-csv']
+        
+        if args['--render']:
+            if args['--render'] not in Engine.RENDER_MODES:
+                sys.exit("Unknown render mode " + args['--render'])
+            Engine.render_mode = args['--render']
+        
+        if args['--shared-render']:
+            Engine.shared_render = True
+        
+        if args['--lod']:
+            if args['--lod'] not in gui_lod.TIERS + ('auto',):
+                sys.exit("Unknown level of detail " + args['--lod'])
+            Engine.lod = args['--lod']
+        
+        if args['--sprites']:
+            if Engine.render_mode != 'batched':
+                sys.exit("Sprites need the batched render mode, --render=batched")
+            Engine.sprites = True
+        
+        if args['--governor']:
+            Engine.governed = True
+        
+        if args['--gc']:
+            if args['--gc'] not in gc_policy.MODES:
+                sys.exit("Unknown gc mode " + args['--gc'])
+            Engine.gc_mode = args['--gc']
+        if args['--gc-freeze']:
+            Engine.gc_freeze = True
+        
+        if args['--export']:
+            if args['--export-format'] not in gui_export.FORMATS:
+                sys.exit("Unknown export format " + args['--export-format'])
+            if args['--export-policy'] not in writer.POLICIES:
+                sys.exit("Unknown export policy " + args['--export-policy'])
+            Engine.export_path = args['--export']
+            Engine.export_format = args['--export-format']
+            Engine.export_policy = args['--export-policy']
+        
+        if args['--restore']:
+            Engine.restore_path = args['--restore']
+        if args['--checkpoint']:
+            Engine.checkpoint_path = args['--checkpoint']
+        
+        if args['--record']:
+            Engine.record_path = args['--record']
+            Engine.record_delta = args['--record-delta']
+        
+        if args['--metrics']:
+            Engine.metrics_every = int(args['--metrics'])
+        
+        if args['--flocks']:
+            Engine.color_flocks = True
+            if Engine.metrics_every is None:
+                Engine.metrics_every = 1
+    
+    
+    def initGuiBoids(self):
+        """ Add a GuiBoid to the graphicsscene for each boid.
+        
+        In the batched render mode a single SwarmItem draws all the boids.
         """
-        self.scene.clear()
-        del(self.boids)
-        del(self.rules)
-        self.boids = []
-        self.rules = []
-        self.initBoids(self.boid_count)
-        self.initRules()
+        self.guiBoids = []
+        if Engine.render_mode == 'batched':
+            swarmItem = SwarmItem(self.simulation, self.sprites)
+            self.guiBoids.append(swarmItem)
+            self.scene.addItem(swarmItem)
+            return
+        
+        for boid in self.simulation.boids:
+            guiBoid = GuiBoid(boid)
+            self.guiBoids.append(guiBoid)
+            self.scene.addItem(guiBoid)
+    
+    
+    def updateTier(self):
+        """ Pick the level of detail for drawing the boids in this frame.
+        
+        :returns: the tier, one of gui_lod.TIERS
+        :rtype: str
+        """
+        tier = Engine.lod
+        if tier == 'auto':
+            # Shared views scale the rendered image, other views the scene
+            if self.renderer is not None:
+                scale = float(self.view.width()) / max(1, self.renderer.image.width())
+            else:
+                scale = self.view.transform().m11()
+            tier = gui_lod.choose_tier(len(self.simulation.boids), scale)
+        
+        # Go down in detail when the governor says so
+        if self.governor is not None:
+            index = gui_lod.TIERS.index(tier) + self.governor.lod_drop()
+            tier = gui_lod.TIERS[min(index, len(gui_lod.TIERS) - 1)]
+        
+        if Engine.render_mode == 'batched':
+            self.guiBoids[0].tier = tier
+        else:
+            GuiBoid.tier = tier
+        return tier
+    
+    
+    def logGovernor(self, message):
+        """ Logs a decision of the governor. """
+        print("!!! Governor:", message, "!!!")
+        if self.profiler is not None:
+            self.profiler.note("governor: " + message)
+    
+    
+    def addPaint(self, seconds):
+        """ Adds the time of a paint event of a view to the running frame. """
+        self.painted += seconds
+    
+    
+    def frameDone(self):
+        """ Tells the governor how long the last frame took, painting included.
+        
+        Called when the next frame starts. The views time their own paint
+        events, so the painting counts whenever Qt delivers it, merged with
+        other updates or not. The steering part of the level is applied
+        here, not in the log, so it works whether the decisions are logged
+        or not.
+        """
+        self.governor.update(self.frameWork + self.painted)
+        self.painted = 0.0
+        self.simulation.steer_stride = self.governor.steer_stride()
     
     
     def initTimer(self):
@@ -169,14 +307,34 @@ class Engine(QtGui.QMainWindow):
         grid = QtGui.QGridLayout()
         self.grid = grid
         
+        # The governor needs the time of painting
+        painted = None
+        if self.governor is not None:
+            painted = self.addPaint
+        
         # VIEWS
         
         combs = itertools.product(xrange(numViews), xrange(numViews))
         
+        # Render the scene only once per frame, the views just draw the image
+        if Engine.shared_render:
+            self.renderer = SharedRenderer(self.scene)
+        
         for c in combs:
             (x, y) = c
             
-            view = QtGui.QGraphicsView(self.scene)
+            if self.renderer is not None:
+                view = SharedImageView(self.renderer, self.profiler, overlay=Engine.profile,
+                                       painted=painted)
+                self.view = view
+                grid.addWidget(view, x, y)
+                continue
+            
+            if self.profiler is not None or painted is not None:
+                view = ProfiledView(self.scene, self.profiler, overlay=Engine.profile,
+                                    painted=painted)
+            else:
+                view = QtGui.QGraphicsView(self.scene)
             view.setSceneRect(QtCore.QRectF(self.scene.sceneRect()))
             view.setRenderHint(QtGui.QPainter.Antialiasing)
             #view.setViewportUpdateMode(QtGui.QGraphicsView.BoundingRectViewportUpdate)
@@ -200,21 +358,15 @@ class Engine(QtGui.QMainWindow):
         buttonReset.clicked.connect(self.resetScene)
         layoutEdit.addWidget(buttonReset)
         
-        # Create areas to edit the rule weights
-        for rule in self.rules:
-            label   = QtGui.QLabel(rule.name + ":")
-            area    = QtGui.QLineEdit(str(rule.weight), parent=None)
-            #                  double bottom, double top, int decimals
-            area.setValidator( QtGui.QDoubleValidator(0.0, 1000.0, 4) )
-            layoutEdit.addWidget(label)
-            layoutEdit.addWidget(area)
-            self.guiAreas.append( (area, rule) )
+        if self.replay is not None:
+            self.initReplayControls(layoutEdit)
+        else:
+            self.initEditControls(layoutEdit)
         
-        # The Update button
-        buttonUpdate = QtGui.QPushButton("Update")
-        buttonUpdate.setDefault(True)
-        buttonUpdate.clicked.connect(self.updateFromUserInput)
-        layoutEdit.addWidget(buttonUpdate)
+        # Latest flock metrics, if gathered
+        if self.replay is None and self.simulation.metrics is not None:
+            self.metricsLabel = QtGui.QLabel()
+            layoutEdit.addWidget(self.metricsLabel)
         
         # Some spacing between the buttons and areas
         layoutEdit.setSpacing(10)
@@ -238,12 +390,139 @@ class Engine(QtGui.QMainWindow):
         QtCore.QTimer.singleShot(0, self.updateWindowSize)
     
     
+    def initEditControls(self, layoutEdit):
+        """ Add the checkpoint buttons and the areas to edit the rule weights. """
+        # Save and Load buttons for checkpoints
+        buttonSave = QtGui.QPushButton("Save")
+        buttonSave.clicked.connect(self.saveCheckpoint)
+        layoutEdit.addWidget(buttonSave)
+        buttonLoad = QtGui.QPushButton("Load")
+        buttonLoad.clicked.connect(self.loadCheckpoint)
+        layoutEdit.addWidget(buttonLoad)
+        
+        # Create areas to edit the rule weights
+        for rule in self.simulation.rules:
+            label   = QtGui.QLabel(rule.name + ":")
+            area    = QtGui.QLineEdit(str(rule.weight), parent=None)
+            #                  double bottom, double top, int decimals
+            area.setValidator( QtGui.QDoubleValidator(0.0, 1000.0, 4) )
+            layoutEdit.addWidget(label)
+            layoutEdit.addWidget(area)
+            self.guiAreas.append( (area, rule) )
+        
+        # The Update button
+        buttonUpdate = QtGui.QPushButton("Update")
+        buttonUpdate.setDefault(True)
+        buttonUpdate.clicked.connect(self.updateFromUserInput)
+        layoutEdit.addWidget(buttonUpdate)
+    
+    
+    def initReplayControls(self, layoutEdit):
+        """ Add the buttons and the slider to control a replay. """
+        buttonRewind = QtGui.QPushButton("<<")
+        buttonRewind.clicked.connect(self.replayRewind)
+        layoutEdit.addWidget(buttonRewind)
+        buttonPause = QtGui.QPushButton("Pause")
+        buttonPause.setCheckable(True)
+        buttonPause.toggled.connect(self.replayPause)
+        layoutEdit.addWidget(buttonPause)
+        buttonForward = QtGui.QPushButton(">>")
+        buttonForward.clicked.connect(self.replayForward)
+        layoutEdit.addWidget(buttonForward)
+        
+        # Slider for seeking to any recorded tick
+        slider = QtGui.QSlider(QtCore.Qt.Horizontal)
+        slider.setRange(self.replay.first(), self.replay.last())
+        slider.valueChanged.connect(self.replaySeek)
+        layoutEdit.addWidget(slider)
+        self.slider = slider
+        
+        self.replayLabel = QtGui.QLabel()
+        layoutEdit.addWidget(self.replayLabel)
+        self.updateReplayControls()
+    
+    
+    def updateReplayControls(self):
+        """ Show the tick and speed of the replay. """
+        self.slider.blockSignals(True)
+        self.slider.setValue(self.replay.tick)
+        self.slider.blockSignals(False)
+        self.replayLabel.setText("tick %d, speed %gx" % (self.replay.tick, self.replay.speed))
+    
+    
+    def updateMetricsLabel(self):
+        """ Show the latest flock metrics, when there are new ones. """
+        sample = self.simulation.metrics.latest
+        if sample is None or sample.tick != self.simulation.tick:
+            return
+        text = "polarization %.3f  neighbors %.1f  separation %.1f" % sample[1:4]
+        if sample.flocks is not None:
+            text += "  flocks %d" % sample.flocks
+        self.metricsLabel.setText(text)
+    
+    
+    def updateFlockColors(self):
+        """ Colors the boids by flock, when the flocks were labelled this tick.
+        
+        Boids outside the flocks keep their own color.
+        """
+        metrics = self.simulation.metrics
+        sample = metrics.latest
+        if sample is None or sample.tick != self.simulation.tick:
+            return
+        colors = []
+        for (boid, flock) in zip(self.simulation.boids, metrics.tracker.ids):
+            if flock is None:
+                colors.append(boid.color)
+            else:
+                colors.append(flock_color(flock))
+        if Engine.render_mode == 'batched':
+            self.guiBoids[0].setColors(colors)
+        else:
+            for (guiBoid, color) in zip(self.guiBoids, colors):
+                guiBoid.setColor(color)
+    
+    
+    @QtCore.Slot()
+    def replayRewind(self):
+        """ Play backwards, faster every time. """
+        if self.replay.speed > 0:
+            self.replay.speed = -1.0
+        else:
+            self.replay.speed *= 2
+        self.updateReplayControls()
+    
+    
+    @QtCore.Slot()
+    def replayForward(self):
+        """ Play forwards, faster every time. """
+        if self.replay.speed < 0:
+            self.replay.speed = 1.0
+        else:
+            self.replay.speed *= 2
+        self.updateReplayControls()
+    
+    
+    @QtCore.Slot(bool)
+    def replayPause(self, paused):
+        """ Pause or continue the replay. """
+        self.replay.paused = paused
+    
+    
+    @QtCore.Slot(int)
+    def replaySeek(self, tick):
+        """ Jump to a tick chosen with the slider. """
+        self.replay.seek(tick)
+        self.updateReplayControls()
+    
+    
     def updateWindowSize(self):
         """ Set window so everything fits. """
         self.resize(self.sizeHint())
         # Fix width if necessary, some Qt weirdness
-        if self.geometry().width() >= Engine.window_width * Engine.num_views + 20:
-            self.resize(Engine.window_width * Engine.num_views + 4, self.geometry().height())
+        width = self.simulation.width
+        if self.geometry().width() >= width * Engine.num_views + 20:
+            self.resize(width * Engine.num_views + 4, self.geometry().height())
     
     
     #@QtCore.Slot()
@@ -263,10 +542,15 @@ class Engine(QtGui.QMainWindow):
             return
         
         qrect = self.view.geometry()
-        Engine.window_width = qrect.width()
-        Engine.window_height = qrect.height()
-        print("!!! Resizing window to", Engine.window_width, Engine.window_height, "!!!")
-        self.scene.setSceneRect(0, 0, Engine.window_width, Engine.window_height)
+        self.simulation.width = qrect.width()
+        self.simulation.height = qrect.height()
+        print("!!! Resizing window to", self.simulation.width, self.simulation.height, "!!!")
+        self.scene.setSceneRect(0, 0, self.simulation.width, self.simulation.height)
+        if Engine.render_mode == 'batched':
+            self.guiBoids[0].resize()
+        if self.renderer is not None:
+            self.renderer.resize()
+            return
         self.view.setAlignment(QtCore.Qt.AlignLeft | QtCore.Qt.AlignTop)
     
     
@@ -283,217 +567,149 @@ class Engine(QtGui.QMainWindow):
             type(rule).weight = float(area.text())
         
         # Print the new weights
-        for rule in self.rules:
+        for rule in self.simulation.rules:
             print("Rule", rule.name, "now has weight\t", str(type(rule).weight))
     
     
+    def closeEvent(self, event):
+        """ Close window event handler. """
+        if self.profiler is not None:
+            self.profiler.close()
+            for (tier, ms, ticks) in self.profiler.tag_averages():
+                print("Level of detail", tier, "took %.2f ms per tick over %d ticks" % (ms, ticks))
+        if self.exporter is not None:
+            self.exporter.close()
+        self.checkpoints.close()
+        self.stopRecording()
+        if self.replay is not None:
+            self.replay.close()
+        self.gcPolicy.close()
+        print("Garbage collection: %d collections, %.1f ms in ticks, %.1f ms between"
+              % (self.gcPolicy.collections, self.gcPolicy.tick_seconds * 1000,
+                 self.gcPolicy.idle_seconds * 1000))
+        event.accept()
+    
+    
     @QtCore.Slot()
     def resetScene(self):
         """ Reset the whole graphicsscene ie. clear it and add new boids. """
         print("!!! Resetting scene !!!")
-        self.initOrReloadBoidsAndRules()
-        gc.collect()
+        self.scene.clear()
+        self.simulation.reset()
+        self.initGuiBoids()
+        if self.exporter is not None:
+            self.exporter.renderer.reset()
+        self.gcPolicy.settle()
     
     
-    def initGraphicsScene(self):
-        """ Initialize the graphicsscene. """
-        self.scene = QtGui.QGraphicsScene()
-        self.scene.setSceneRect(0, 0, Engine.window_width, Engine.window_height)
+    @QtCore.Slot()
+    def saveCheckpoint(self):
+        """ Save the state of the simulation, written in the background. """
+        print("!!! Saving checkpoint at tick", self.simulation.tick,
+              "to", Engine.checkpoint_path, "!!!")
+        self.checkpoints.save(self.simulation, Engine.checkpoint_path)
     
     
-    def initRules(self):
-        """ Initialize the rules. """
-        self.rules.append(RuleSeparation())
-        self.rules.append(RuleAlignment())
-        self.rules.append(RuleCohesion())
+    @QtCore.Slot()
+    def loadCheckpoint(self):
+        """ Replace the simulation with the state saved in the checkpoint. """
+        print("!!! Loading checkpoint", Engine.checkpoint_path, "!!!")
+        try:
+            checkpoint.restore(Engine.checkpoint_path, self.simulation)
+        except (IOError, OSError, ValueError, checkpoint.CheckpointError) as e:
+            print("!!! Could not load checkpoint:", e, "!!!")
+            return
         
-        for rule in self.rules:
-            print("Rule {0} has weight \t{1}".format(rule.name, type(rule).weight))
+        self.scene.clear()
+        self.scene.setSceneRect(0, 0, self.simulation.width, self.simulation.height)
+        self.initGuiBoids()
+        if self.renderer is not None:
+            self.renderer.resize()
+        if self.exporter is not None:
+            self.exporter.renderer.reset()
+        for (area, rule) in self.guiAreas:
+            area.setText(str(type(rule).weight))
+        if self.recorder is not None and self.recorder.count != len(self.simulation.boids):
+            self.stopRecording()
+        self.gcPolicy.settle()
     
     
-    def initBoids(self, amount):
-        """ Initialize boids with random parameters.
-        
-        :param amount: number of boids to initialize
-        :type amount: int
-        """
-        for i in xrange(amount):
-            boid = GuiBoid()
-            self.boids.append(boid)
-            self.scene.addItem(boid)
+    def stopRecording(self):
+        """ Writes the rest of the trajectory and stops recording. """
+        if self.recorder is None:
+            return
+        self.recorder.close()
+        print("!!! Recorded", self.recorder.tick, "ticks to", Engine.record_path, "!!!")
+        self.recorder = None
     
     
-    def loop(self): # modify, this is called with a timer?
-        """ Main loop of the engine, moves things forward.
-        
-        Calculates the neighborhoods for each boid, then calculates the force to
-        apply given by the rules and applies it.
-        Lastly moves the boids forward on the screen.
-        """
-        
-        w = Engine.window_width
-        h = Engine.window_height
-        
-        # n²
-        for b1 in self.boids:
-            
-            # Initialize neighborhood
-            hood = Neighborhood(b1, Engine.window_width, Engine.window_height, rules=self.rules)
-            
-            # Loop all boids, add to neighborhood if distance is short enough
-            for b2 in self.boids:
-                if b2 == b1:
-                    continue # skip adding the boid itself to its neighborhood
-                
-                dist_sqrd = b1.position.get_dist_sqrd_toroidal(
-                    b2.position, Engine.window_width, Engine.window_height
-                    )
-                
-                # OK to compare squared distances
-                if dist_sqrd <= Neighborhood.max_distance:
-                    # Check view angle condition
-                    # angle is now between -180 and 180
-                    vect_ab = (- b1.position + b2.position)
-                    angle = b1.orientation.forward.get_angle_between(vect_ab)
-                    if angle >= -b1.view_angle and angle <= b1.view_angle:
-                        hood.add(b2)
-            
-            # Calculate weighted force
-            force = Vec2d(0, 0)
-            for rule in self.rules:
-                w = Engine.window_width
-                h = Engine.window_height
-                # Normalize all vectors returned by rules and add them to total
-                force += (type(rule).weight * rule.consult(b1, hood, w, h).normalized())
-            
-            # Apply weighted force
-            b1.move(force, w, h)
-        
-        # endloop b1
+    def initGraphicsScene(self):
+        """ Initialize the graphicsscene. """
+        self.scene = QtGui.QGraphicsScene()
+        self.scene.setSceneRect(0, 0, self.simulation.width, self.simulation.height)
         
-        # Step all boids forward on the screen
-        for b1 in self.boids:
-            b1.step()
+        # A single item covering the whole scene gains nothing from the index
+        if Engine.render_mode == 'batched':
+            self.scene.setItemIndexMethod(QtGui.QGraphicsScene.NoIndex)
     
     
-    def cliArgsApply(self, args):
-        # Apply CLI options
-        if args['--amount']:
-            Engine.boid_count = int(args['--amount'])
-        
-        if args['--width'] and args['--height']:
-            Engine.window_width = int(args['--width'])
-            Engine.window_height = int(args['--height'])
-        
-        if args['--numviews']:
-            Engine.num_views = int(args['--numviews'])
+    def loop(self):
+        """ Main loop of the engine, moves things forward.
         
-        if args['--separation']:
-            RuleSeparation.weight = float(args['--separation'])
-        if args['--alignment']:
-            RuleAlignment.weight = float(args['--alignment'])
-        if args['--cohesion']:
-            RuleCohesion.weight = float(args['--cohesion'])
-        
-        if args['--boid-view-angle']:
-            Boid.view_angle = int(args['--boid-view-angle'])
-        if args['--boid-mass']:
-            Boid.mass = float(args['--boid-mass'])
-        if args['--boid-max-force']:
-            Boid.max_force = float(args['--boid-max-force'])
-        if args['--boid-normal-speed']:
-            Boid.normal_speed = float(args['--boid-normal-speed'])
-            Boid.cap_min_speed = Boid.normal_speed*Boid.CAP_MIN_SPEED_MULTIPLIER
-        if args['--boid-max-speed']:
-            Boid.max_speed = float(args['--boid-max-speed'])
-            Boid.cap_max_speed = Boid.max_speed*Boid.CAP_MAX_SPEED_MULTIPLIER
-    
-    
-    def preset_wonky(self):
-        # Apply preset
-        Engine.boid_count = 90
-        Engine.window_width = 1000
-        Engine.window_height = 800
-        Engine.num_views = 1
-        RuleSeparation.weight = 0.4
-        RuleAlignment.weight = 0.4
-        RuleCohesion.weight = 0.4
-        Boid.view_angle = 180
-        Boid.mass = 2.0
-        Boid.max_force = 10.0
-        Boid.normal_speed = 4.0
-        Boid.max_speed = 12.0
-    
-    def preset_wacky(self):
-        # Apply preset
-        Engine.boid_count = 90
-        Engine.window_width = 1000
-        Engine.window_height = 800
-        Engine.num_views = 1
-        RuleSeparation.weight = 0.8
-        RuleAlignment.weight = 0.4
-        RuleCohesion.weight = 0.8
-        Boid.view_angle = 120
-        Boid.mass = 2.5
-        Boid.max_force = 10.0
-        Boid.normal_speed = 6.0
-        Boid.max_speed = 10.0
-    
-    def preset_racers(self):
-        # Apply preset
-        Engine.boid_count = 90
-        Engine.window_width = 1000
-        Engine.window_height = 800
-        Engine.num_views = 1
-        RuleSeparation.weight = 1.6
-        RuleAlignment.weight = 3.2
-        RuleCohesion.weight = 3.2
-        Boid.view_angle = 60
-        Boid.mass = 5.0
-        Boid.max_force = 10.0
-        Boid.normal_speed = 7.2
-        Boid.max_speed = 16.0
-    
-    def preset_testing(self):
-        # Apply preset
-        Engine.boid_count = 80
-        Engine.window_width = 1000
-        Engine.window_height = 800
-        Engine.num_views = 1
-        RuleSeparation.weight = 4.6
-        RuleAlignment.weight = 2.0
-        RuleCohesion.weight = 4.88
-        Boid.view_angle = 90
-        Boid.mass = 3.0
-        Boid.max_force = 5.0
-        Boid.normal_speed = 4.2
-        Boid.max_speed = 4.0
-    
-    
-    @staticmethod
-    def randPosition():
-        """ Return a random position.
-        :rtype: Vec2d
+        Steps the simulation and then moves the boids on the screen.
         """
-        x = random.randint(20, Engine.window_width - 20)
-        y = random.randint(20, Engine.window_height - 20)
-        
-        return Vec2d(x, y)
-    
-    
-    @staticmethod
-    def randForce():
-        """ Returns a random force.
-        :rtype: Vec2d
-        """
-        x = random.uniform(-GuiBoid.normal_speed, GuiBoid.normal_speed)
-        y = random.uniform(-GuiBoid.normal_speed, GuiBoid.normal_speed)
-        
-        # For divbyzero in vector calcs
-        if x == 0 and y == 0:
-            return randForce()
+        if self.governor is not None and self.frameWork is not None:
+            self.frameDone()
+        self.frameStart = clock()
+        if self.profiler is not None:
+            self.profiler.begin_tick()
+        
+        # Collect when idle, after the posted paint events of this frame
+        self.gcPolicy.begin_tick()
+        QtCore.QTimer.singleShot(0, self.gcPolicy.idle)
+        
+        self.simulation.step()
+        if self.replay is not None:
+            self.updateReplayControls()
+        if self.metricsLabel is not None:
+            self.updateMetricsLabel()
+        if Engine.color_flocks and self.simulation.metrics is not None:
+            self.updateFlockColors()
+        
+        # Stream the new state to the viewers, if any
+        if self.server is not None:
+            self.server.publish(self.simulation.boids, self.simulation.width,
+                                self.simulation.height, Boid.cap_max_speed)
+        
+        # Export and record every tick, whether it is shown or not
+        if self.exporter is not None:
+            self.exporter.export()
+        if self.recorder is not None:
+            self.recorder.record(self.simulation)
+        
+        if self.governor is not None and not self.governor.should_render():
+            self.frameWork = clock() - self.frameStart
+            return
         
-        return Vec2d(x, y)
+        # Move all boids on the screen
+        t0 = clock()
+        tier = self.updateTier()
+        if self.profiler is not None:
+            self.profiler.tag(tier)
+        for guiBoid in self.guiBoids:
+            guiBoid.updateOnGui()
+        if self.profiler is not None:
+            self.profiler.add('gui', clock() - t0)
+        
+        # Render once for all the views
+        if self.renderer is not None:
+            t0 = clock()
+            self.renderer.render()
+            if self.profiler is not None:
+                self.profiler.add('paint', clock() - t0)
+        
+        if self.governor is not None:
+            self.frameWork = clock() - self.frameStart
 
 # EOF
 
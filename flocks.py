@@ -0,0 +1,127 @@
+#!/usr/bin/env python
+#-*- coding:utf-8 -*-
+
+""" Telling the flocks apart and following them from tick to tick.
+
+During the tick every steered boid is joined with its neighbors in a
+UnionFind, so the connected components of the neighbor graph come out of
+the pairs the neighbor search already found. A component of at least
+MIN_SIZE boids is a flock.
+
+To keep the identity of a flock over time, the new components are matched
+to the flocks of the previous tick by the amount of boids they share,
+biggest overlaps first. When a flock splits, the biggest part keeps its
+id; when flocks merge, the merged flock keeps the id of the biggest part.
+The other parts get new ids.
+"""
+
+import colorsys
+from collections import Counter
+
+from union_find import UnionFind
+
+MIN_SIZE = 3 # const, smallest group of boids counted as a flock
+
+
+def flock_color(flock):
+    """ A color for a flock id, far from the colors of nearby ids.
+    
+    :param flock: the flock id
+    :type flock: int
+    :rtype: tuple of int (r, g, b)
+    """
+    hue = (flock * 0.618033988749895) % 1.0
+    return tuple(int(c * 255) for c in colorsys.hsv_to_rgb(hue, 0.8, 0.9))
+
+
+class FlockTracker(object):
+    """ Labels the flocks of every tick with ids that stay the same. """
+    
+    def __init__(self, min_size = MIN_SIZE):
+        """
+        :param min_size: smallest group of boids counted as a flock
+        :type min_size: int
+        """
+        self.min_size = min_size
+        self.ids = [] # flock id of every boid, None if not in a flock
+        self.count = 0 # flocks in the latest tick
+        self.splits = 0 # flocks that split in the latest tick
+        self.merges = 0 # flocks formed by merging in the latest tick
+        self.next_id = 0
+        self.boids = None # the boids of the previous tick
+        self.index = None # id(boid) -> index of the boid
+        self.sets = None # UnionFind of the running tick
+    
+    
+    def begin(self, boids):
+        """ Starts labelling a tick.
+        
+        :param boids: all the boids of the simulation
+        :type boids: list of Boid
+        """
+        if boids is not self.boids or len(boids) != len(self.ids):
+            # New boids, nothing to follow
+            self.ids = [None] * len(boids)
+            self.boids = boids
+        self.index = dict((id(b), i) for (i, b) in enumerate(boids))
+        self.sets = UnionFind(len(boids))
+    
+    
+    def add(self, boid, hood):
+        """ Joins a boid with the boids in its neighborhood. """
+        index = self.index
+        i = index[id(boid)]
+        for b in hood.boids:
+            self.sets.union(i, index[id(b)])
+    
+    
+    def end(self):
+        """ Finishes the tick, labels the flocks and matches them to the old ones.
+        
+        :returns: amount of flocks
+        :rtype: int
+        """
+        labels = self.sets.labels()
+        sizes = Counter(labels)
+        old = self.ids
+        
+        # Boids each new flock shares with each old flock
+        overlap = Counter()
+        for (i, root) in enumerate(labels):
+            if sizes[root] >= self.min_size and old[i] is not None:
+                overlap[(root, old[i])] += 1
+        
+        # Biggest overlaps first keep their ids
+        kept = {}
+        used = set()
+        for ((root, flock), _) in sorted(overlap.items(), key=lambda item: -item[1]):
+            if root not in kept and flock not in used:
+                kept[root] = flock
+                used.add(flock)
+        
+        flocks = {}
+        ids = []
+        for root in labels:
+            if sizes[root] < self.min_size:
+                ids.append(None)
+                continue
+            if root not in flocks:
+                if root in kept:
+                    flocks[root] = kept[root]
+                else:
+                    flocks[root] = self.next_id
+                    self.next_id += 1
+            ids.append(flocks[root])
+        
+        parts = Counter(flock for (_, flock) in overlap)
+        merged = Counter(root for (root, _) in overlap)
+        self.splits = sum(1 for n in parts.values() if n > 1)
+        self.merges = sum(1 for n in merged.values() if n > 1)
+        self.ids = ids
+        self.count = len(flocks)
+        self.sets = None
+        self.index = None
+        return self.count
+
+# EOF
+
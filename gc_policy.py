@@ -0,0 +1,136 @@
+#!/usr/bin/env python
+#-*- coding:utf-8 -*-
+
+""" Keeping the cyclic garbage collector out of the ticks.
+
+A tick allocates lots of short lived Vec2d, Neighborhood and Orientation
+objects, which keeps triggering collections of the youngest generation in
+the middle of the tick. The boids make no reference cycles, so those
+collections find next to nothing, but each one pauses the tick. The modes:
+
+  auto    Python collects whenever it wants, the pauses are only measured
+  limit   during a tick only after LIMIT_THRESHOLD allocations, not 700
+  off     never during a tick
+
+With limit and off the collections Python would have done are done in
+idle() instead, between the ticks, by the usual thresholds. Objects that
+live for the whole run, like the boids and the GUI, can be frozen out of
+the collections altogether (Python 3.7 and later).
+"""
+
+import gc
+from timeit import default_timer as clock
+
+AUTO = 'auto'   # const
+LIMIT = 'limit' # const
+OFF = 'off'     # const
+MODES = (AUTO, LIMIT, OFF) # const
+
+LIMIT_THRESHOLD = 100000 # const, allocations before a collection in a tick, in limit mode
+
+
+class GcPolicy(object):
+    """ Applies a mode around the ticks and measures the collections. """
+    
+    def __init__(self, mode = AUTO, freeze = False, profiler = None):
+        """
+        :param mode: one of MODES
+        :type mode: str
+        :param freeze: freeze the objects alive after settle()
+        :type freeze: bool
+        :param profiler: profiler to add the pauses in ticks to, as 'gc'
+        :type profiler: TickProfiler
+        """
+        if mode not in MODES:
+            raise ValueError("Unknown gc mode " + str(mode))
+        self.mode = mode
+        self.freeze = freeze and hasattr(gc, 'freeze')
+        self.profiler = profiler
+        self.thresholds = gc.get_threshold() # the usual ones, kept for idle()
+        self.ticking = False # between begin_tick() and idle()
+        self.started = None # when the running collection started
+        self.tick_seconds = 0.0 # collecting during ticks
+        self.idle_seconds = 0.0 # collecting between ticks
+        self.collections = 0
+        
+        # Python 2 has no callbacks, only idle() is measured there
+        self.measured = hasattr(gc, 'callbacks')
+        if self.measured:
+            gc.callbacks.append(self.measure)
+    
+    
+    def measure(self, phase, info):
+        """ Times every collection, called by the gc module. """
+        if phase == 'start':
+            self.started = clock()
+            return
+        if self.started is None:
+            return
+        seconds = clock() - self.started
+        self.started = None
+        self.collections += 1
+        if self.ticking:
+            self.tick_seconds += seconds
+            if self.profiler is not None:
+                self.profiler.add('gc', seconds)
+        else:
+            self.idle_seconds += seconds
+    
+    
+    def begin_tick(self):
+        """ Puts off the collections, as the mode says, until idle(). """
+        self.ticking = True
+        if self.mode == OFF:
+            gc.disable()
+        elif self.mode == LIMIT:
+            gc.set_threshold(LIMIT_THRESHOLD, *self.thresholds[1:])
+    
+    
+    def idle(self):
+        """ Does the collections put off during the tick.
+        
+        Collects the oldest generation over its usual threshold, like
+        Python itself would have, and lets Python collect as usual until
+        the next tick.
+        """
+        self.ticking = False
+        if self.mode == AUTO:
+            return
+        counts = gc.get_count()
+        generation = None
+        for g in range(len(counts)):
+            if counts[g] > self.thresholds[g]:
+                generation = g
+        if generation is not None:
+            t0 = clock()
+            gc.collect(generation)
+            if not self.measured:
+                self.collections += 1
+                self.idle_seconds += clock() - t0
+        gc.set_threshold(*self.thresholds)
+        gc.enable()
+    
+    
+    def settle(self):
+        """ Collects everything after a big change, like new boids.
+        
+        When freezing, what is left is frozen: it will not be looked at by
+        any collection from now on.
+        """
+        if self.freeze:
+            gc.unfreeze()
+        gc.collect()
+        if self.freeze:
+            gc.freeze()
+    
+    
+    def close(self):
+        """ Stops measuring and lets Python collect as usual. """
+        if self.measured:
+            gc.callbacks.remove(self.measure)
+            self.measured = False
+        gc.set_threshold(*self.thresholds)
+        gc.enable()
+
+# EOF
+
@@ -0,0 +1,107 @@
+#!/usr/bin/env python
+#-*- coding:utf-8 -*-
+
+""" Keeps the frame time within a budget by trading quality for speed.
+
+The governor is told how long each frame took. When the moving average
+stays over the budget it degrades one level at a time, and when there is
+enough headroom it restores one level at a time:
+  
+  level 1-2  draw the boids in a lower level of detail
+  level 3    also render only every other frame
+  level 4-5  also steer only every 2nd / 3rd boid per tick
+
+The engine asks the governor what to do; the governor itself knows nothing
+about Qt or the simulation.
+"""
+
+class Governor(object):
+    """ Picks a quality level from the measured frame times. """
+    
+    MAX_LEVEL = 5       # const
+    OVER = 1.0          # const, average over this fraction of the budget degrades
+    HEADROOM = 0.6      # const, average under this fraction of the budget restores
+    PATIENCE = 15       # const, frames over or under before changing the level
+    SMOOTHING = 0.1     # const, weight of the newest frame in the moving average
+    
+    def __init__(self, budget, log = None):
+        """
+        :param budget: time available for a frame, in seconds
+        :type budget: float
+        :param log: called with a message whenever the level changes
+        :type log: function
+        """
+        self.budget = budget
+        self.log = log
+        self.level = 0
+        self.average = None # moving average of the frame time
+        self.over = 0 # frames in a row over the budget
+        self.under = 0 # frames in a row with headroom
+        self.frame = 0
+    
+    
+    def update(self, seconds):
+        """ Tells the governor how long a frame took.
+        
+        :param seconds: time of the frame
+        :type seconds: float
+        :returns: whether the level changed
+        :rtype: bool
+        """
+        self.frame += 1
+        if self.average is None:
+            self.average = seconds
+        else:
+            self.average += Governor.SMOOTHING * (seconds - self.average)
+        
+        if self.average > self.budget * Governor.OVER:
+            self.over += 1
+            self.under = 0
+        elif self.average < self.budget * Governor.HEADROOM:
+            self.under += 1
+            self.over = 0
+        else:
+            self.over = 0
+            self.under = 0
+        
+        if self.over >= Governor.PATIENCE and self.level < Governor.MAX_LEVEL:
+            return self.change(+1, "over")
+        if self.under >= Governor.PATIENCE and self.level > 0:
+            return self.change(-1, "under")
+        return False
+    
+    
+    def change(self, step, why):
+        """ Moves the level by step and logs the decision. """
+        self.level += step
+        self.over = 0
+        self.under = 0
+        if self.log is not None:
+            self.log("frame %.1f ms %s budget %.1f ms, level %d: "
+                     "lod -%d, render every %d, steer 1/%d" % (
+                         self.average * 1000, why, self.budget * 1000, self.level,
+                         self.lod_drop(), self.render_every(), self.steer_stride()))
+        return True
+    
+    
+    def lod_drop(self):
+        """ How many tiers to draw below the chosen level of detail. """
+        return min(self.level, 2)
+    
+    
+    def render_every(self):
+        """ Render only every n:th frame. """
+        return 2 if self.level >= 3 else 1
+    
+    
+    def steer_stride(self):
+        """ Steer only every n:th boid per tick. """
+        return 1 + max(0, self.level - 3)
+    
+    
+    def should_render(self):
+        """ Whether the coming frame is rendered. """
+        return self.frame % self.render_every() == 0
+
+# EOF
+
@@ -1,68 +1,87 @@
 #!/usr/bin/env python
 #-*- coding:utf-8 -*-
 
-import random
 from PySide import QtCore, QtGui
 
 from boid import Boid
+import gui_lod
 
-class GuiBoid(QtGui.QGraphicsItem, Boid):
-    """ Wrap Boid into something that handles graphics too. """
+class GuiBoid(QtGui.QGraphicsItem):
+    """ Graphical representation of a Boid of the simulation. """
     
-    RADIUS = 4.0                # const, boid radius on screen
-    DIAMETER = 2*RADIUS         # const
     PENWIDTH = 1.0              # const, penwidth for Qt
     SPEED_INDICATOR_MULT = 4.5  # const, how much to multiply the speed indicator on screen
+    TRIANGLE = QtGui.QPolygonF([QtCore.QPointF(0, -1.5 * Boid.RADIUS),
+                                QtCore.QPointF(-Boid.RADIUS, Boid.RADIUS),
+                                QtCore.QPointF(Boid.RADIUS, Boid.RADIUS)]) # const, pointing forward
     
-    def __init__(self, position=None, velocity=None, orientation=None):
-        """ Initialize the GuiBoid graphical representation of the Boid. """
+    tier = gui_lod.FULL         # static, level of detail, one of gui_lod.TIERS
+    
+    def __init__(self, boid):
+        """ Initialize the GuiBoid graphical representation of the Boid.
+        
+        :param boid: the boid to show
+        :type boid: Boid
+        """
         QtGui.QGraphicsItem.__init__(self)
-        Boid.__init__(self, position, velocity, orientation)
-        self.color = self.randomColor()
+        self.boid = boid
+        self.color = QtGui.QColor(*boid.color)
+        self.pen = QtGui.QPen(self.color, Boid.RADIUS)
         self.updateOnGui()
     
     
-    def randomColor(self):
-        """ Creates and returns a random QColor.
-        :rtype: QColor
+    def setColor(self, rgb):
+        """ Draws the boid in another color from now on.
+        
+        :param rgb: the color
+        :type rgb: tuple of int (r, g, b)
         """
-        r = random.randint(0, 255)
-        g = random.randint(0, 255)
-        b = random.randint(0, 255)
-        return QtGui.QColor(r, g, b)
+        if self.color.getRgb()[:3] == tuple(rgb):
+            return
+        self.color = QtGui.QColor(*rgb)
+        self.pen = QtGui.QPen(self.color, Boid.RADIUS)
+        self.update()
     
     
     def updateOnGui(self):
         """ Updates the boid on the GUI. """
-        self.setRotation(self.orientation.forward.get_angle() + 90)
-        self.setPos(self.position.x, self.position.y)
+        self.setRotation(self.boid.orientation.forward.get_angle() + 90)
+        self.setPos(self.boid.position.x, self.boid.position.y)
     
     
     def boundingRect(self):
         """ Specifies the bounding rectangle for Qt. """
         # Choose bounding rectangle from
         # max( size of boid, size of line showing direction )
-        total = max(GuiBoid.DIAMETER + GuiBoid.PENWIDTH,
-                    (GuiBoid.max_speed * GuiBoid.SPEED_INDICATOR_MULT) + GuiBoid.PENWIDTH )
+        total = max(Boid.DIAMETER + GuiBoid.PENWIDTH,
+                    (Boid.max_speed * GuiBoid.SPEED_INDICATOR_MULT) + GuiBoid.PENWIDTH )
         return QtCore.QRectF(-total, -total, total, total);
     
     
     def paint(self, painter, option, widget):
-        """ Specifies the painter method for Qt. """
+        """ Specifies the painter method for Qt, in the detail of the tier. """
+        tier = GuiBoid.tier
+        painter.setRenderHint(QtGui.QPainter.Antialiasing, tier == gui_lod.FULL)
+        
+        if tier == gui_lod.POINT:
+            painter.setPen(self.pen)
+            painter.drawPoint(0, 0)
+            return
+        
+        if tier == gui_lod.TRIANGLE:
+            painter.setPen(QtCore.Qt.NoPen)
+            painter.setBrush(self.color)
+            painter.drawPolygon(GuiBoid.TRIANGLE)
+            return
+        
         # Circle
         painter.setBrush(self.color)
-        painter.drawEllipse(-GuiBoid.RADIUS, -GuiBoid.RADIUS,
-                            GuiBoid.DIAMETER, GuiBoid.DIAMETER)
+        painter.drawEllipse(-Boid.RADIUS, -Boid.RADIUS,
+                            Boid.DIAMETER, Boid.DIAMETER)
         
         # Line showing direction
         painter.setBrush(QtCore.Qt.black)
-        painter.drawLine(0, 0, 0, -self.velocity.length * GuiBoid.SPEED_INDICATOR_MULT)
-    
-    
-    def step(self):
-        """ Wraps Boid.step() so the GUI is updated after it. """
-        Boid.step(self)
-        self.updateOnGui()
+        painter.drawLine(0, 0, 0, -self.boid.velocity.length * GuiBoid.SPEED_INDICATOR_MULT)
 
 # EOF
 
@@ -0,0 +1,152 @@
+#!/usr/bin/env python
+#-*- coding:utf-8 -*-
+
+""" Exporting frames of the simulation to disk.
+
+Frames are rendered offscreen into a QImage, no window is needed, and
+written by a BackgroundWriter so that encoding and disk I/O stay out of
+the tick. Frames go either into a directory as a PNG sequence or into one
+file as a raw stream of 8-bit RGB pixels, which for example ffmpeg reads:
+  
+  ffmpeg -f rawvideo -pix_fmt rgb24 -s 700x500 -r 30 -i frames.rgb out.mp4
+"""
+
+from __future__ import print_function
+
+import os
+
+from PySide import QtGui
+
+import gui_lod
+from gui_swarm import SwarmItem
+from writer import BackgroundWriter, DROP
+
+PNG = 'png'     # const
+RAW = 'raw'     # const
+FORMATS = (PNG, RAW) # const
+
+
+class OffscreenRenderer(object):
+    """ Draws the swarm of a simulation into new images. """
+    
+    def __init__(self, simulation, tier = gui_lod.FULL):
+        """
+        :param simulation: the simulation to draw, its size is fixed here
+        :type simulation: Simulation
+        :param tier: level of detail, one of gui_lod.TIERS
+        :type tier: str
+        """
+        self.simulation = simulation
+        self.width = int(simulation.width)
+        self.height = int(simulation.height)
+        self.item = None
+        self.reset(tier)
+    
+    
+    def reset(self, tier = None):
+        """ Picks up new boids after the simulation was reset. """
+        if tier is None:
+            tier = self.item.tier
+        self.item = SwarmItem(self.simulation)
+        self.item.tier = tier
+    
+    
+    def render(self):
+        """ Draws the current state of the swarm.
+        :rtype: QImage
+        """
+        image = QtGui.QImage(self.width, self.height, QtGui.QImage.Format_RGB32)
+        image.fill(0xffffffff)
+        painter = QtGui.QPainter(image)
+        self.item.paint(painter, None, None)
+        painter.end()
+        return image
+
+
+class FrameExporter(object):
+    """ Renders frames offscreen and writes them in the background. """
+    
+    def __init__(self, simulation, path, fmt = PNG, policy = DROP,
+                 max_queue = BackgroundWriter.QUEUE_SIZE, tier = gui_lod.FULL):
+        """
+        :param simulation: the simulation to export
+        :type simulation: Simulation
+        :param path: directory for PNG files or the file for the raw stream
+        :type path: str
+        :param fmt: PNG or RAW
+        :type fmt: str
+        :param policy: writer.DROP or writer.BLOCK, when the writer falls behind
+        :type policy: str
+        :param max_queue: amount of frames allowed to wait for the writer
+        :type max_queue: int
+        :param tier: level of detail, one of gui_lod.TIERS
+        :type tier: str
+        """
+        if fmt not in FORMATS:
+            raise ValueError("Unknown frame format " + str(fmt))
+        self.simulation = simulation
+        self.path = path
+        self.fmt = fmt
+        self.renderer = OffscreenRenderer(simulation, tier)
+        
+        self.stream = None
+        if fmt == RAW:
+            self.stream = open(path, 'wb')
+            write = self.writeRaw
+        else:
+            if not os.path.isdir(path):
+                os.makedirs(path)
+            write = self.writePng
+        self.writer = BackgroundWriter(write, max_queue, policy)
+    
+    
+    def export(self):
+        """ Renders the current tick and queues it for writing.
+        
+        :returns: False if the frame was dropped
+        :rtype: bool
+        """
+        # Do not even render a frame that would be dropped
+        if self.writer.policy == DROP and self.writer.full():
+            self.writer.drop()
+            return False
+        return self.writer.submit((self.simulation.tick, self.renderer.render()))
+    
+    
+    def writePng(self, frame):
+        """ Writes a frame as a PNG file, in the writer thread. """
+        (tick, image) = frame
+        name = os.path.join(self.path, "frame%06d.png" % tick)
+        if not image.save(name, 'PNG'):
+            raise IOError("Could not write " + name)
+    
+    
+    def writeRaw(self, frame):
+        """ Appends a frame to the raw stream, in the writer thread. """
+        (tick, image) = frame
+        image = image.convertToFormat(QtGui.QImage.Format_RGB888)
+        data = bytes(image.constBits())
+        # Lines of the image may be padded
+        row = image.width() * 3
+        stride = image.bytesPerLine()
+        if stride == row:
+            self.stream.write(data[:row * image.height()])
+        else:
+            for y in range(image.height()):
+                self.stream.write(data[y * stride:y * stride + row])
+    
+    
+    def close(self):
+        """ Writes the frames still waiting and closes the output. """
+        try:
+            self.writer.close()
+        finally:
+            if self.stream is not None:
+                self.stream.close()
+        print("!!! Exported", self.writer.written, "frames,", self.writer.dropped, "dropped !!!")
+        if self.fmt == RAW:
+            print("!!! Raw rgb24 frames of %dx%d in %s !!!" % (
+                self.renderer.width, self.renderer.height, self.path))
+
+# EOF
+
@@ -0,0 +1,43 @@
+#!/usr/bin/env python
+#-*- coding:utf-8 -*-
+
+""" Level of detail for drawing the boids.
+
+FULL draws the antialiased circle and the line showing the speed, TRIANGLE
+an oriented triangle and POINT a single dot, both without antialiasing.
+The tier is picked once per frame from the amount of boids and the scale
+of the view, so a boid only a few pixels across is not drawn in detail.
+"""
+
+from boid import Boid
+
+FULL = 'full'           # const
+TRIANGLE = 'triangle'   # const
+POINT = 'point'         # const
+TIERS = (FULL, TRIANGLE, POINT) # const, from most to least detail
+
+TRIANGLE_COUNT = 2000   # const, more boids than this are drawn as triangles
+POINT_COUNT = 10000     # const, more boids than this are drawn as points
+TRIANGLE_PIXELS = 6.0   # const, boids smaller than this on screen are triangles
+POINT_PIXELS = 3.0      # const, boids smaller than this on screen are points
+
+
+def choose_tier(count, scale = 1.0):
+    """ Picks the tier for drawing a swarm.
+    
+    :param count: amount of boids drawn
+    :type count: int
+    :param scale: screen pixels per world unit
+    :type scale: float
+    :returns: one of TIERS
+    :rtype: str
+    """
+    pixels = Boid.DIAMETER * scale
+    if count > POINT_COUNT or pixels < POINT_PIXELS:
+        return POINT
+    if count > TRIANGLE_COUNT or pixels < TRIANGLE_PIXELS:
+        return TRIANGLE
+    return FULL
+
+# EOF
+
@@ -0,0 +1,128 @@
+#!/usr/bin/env python
+#-*- coding:utf-8 -*-
+
+""" Pre-rendered boid glyphs.
+
+Instead of rasterizing an antialiased ellipse or polygon for every boid in
+every frame, the glyphs are rendered once into pixmaps and then only
+copied to the screen. The oriented triangle is rendered at ANGLES
+quantized angles into one atlas (a strip of sprites) per color, the
+circle does not depend on the angle and gets a single sprite.
+
+Colors are quantized to COLOR_LEVELS levels per channel, so a swarm of
+random colors needs a bounded amount of atlases. At most MAX_ATLASES are
+kept, the least recently used one is dropped first.
+"""
+
+import math
+from collections import OrderedDict
+
+from PySide import QtCore, QtGui
+
+from boid import Boid
+
+CIRCLE = 'circle'       # const
+TRIANGLE = 'triangle'   # const
+
+ANGLES = 64             # const, angle buckets of the triangle atlas
+COLOR_LEVELS = 6        # const, levels per color channel
+MAX_ATLASES = 256       # const, atlases kept in the cache
+
+
+class SpriteCache(object):
+    """ Bounded cache of glyph atlases by glyph and quantized color. """
+    
+    TIP = 1.5               # const, how far the triangle tip is, in radii
+    MARGIN = 1              # const, pixels around each sprite for antialiasing
+    
+    def __init__(self, max_atlases = MAX_ATLASES):
+        """
+        :param max_atlases: amount of atlases to keep
+        :type max_atlases: int
+        """
+        self.max_atlases = max_atlases
+        self.atlases = OrderedDict() # (glyph, rgb) -> QPixmap, oldest first
+        self.size = int(math.ceil(2 * SpriteCache.TIP * Boid.RADIUS)) + 2 * SpriteCache.MARGIN
+        self.half = self.size / 2.0
+        self.sources = [QtCore.QRectF(i * self.size, 0, self.size, self.size)
+                        for i in range(ANGLES)]
+        self.hits = 0
+        self.misses = 0
+    
+    
+    def quantize(self, color):
+        """ Returns the color the sprites of a color are drawn in.
+        
+        :param color: the color of a boid
+        :type color: tuple of int (r, g, b)
+        :rtype: tuple of int (r, g, b)
+        """
+        step = 255.0 / (COLOR_LEVELS - 1)
+        return tuple(int(round(int(round(c / step)) * step)) for c in color)
+    
+    
+    def atlas(self, glyph, color):
+        """ Returns the atlas of a glyph in a color, rendering it if needed.
+        
+        :param glyph: CIRCLE or TRIANGLE
+        :type glyph: str
+        :param color: the color of a boid, as returned by quantize()
+        :type color: tuple of int (r, g, b)
+        :rtype: QPixmap
+        """
+        key = (glyph, color)
+        pixmap = self.atlases.pop(key, None)
+        if pixmap is None:
+            self.misses += 1
+            pixmap = self.render(glyph, key[1])
+            if len(self.atlases) >= self.max_atlases:
+                self.atlases.popitem(last=False)
+        else:
+            self.hits += 1
+        self.atlases[key] = pixmap # most recently used is last
+        return pixmap
+    
+    
+    def source(self, glyph, forward):
+        """ Returns the rectangle of the sprite in the atlas for a direction.
+        
+        :param glyph: CIRCLE or TRIANGLE
+        :type glyph: str
+        :param forward: the direction the boid is heading
+        :type forward: Vec2d
+        :rtype: QRectF
+        """
+        if glyph == CIRCLE:
+            return self.sources[0]
+        bucket = int(round(math.atan2(forward.y, forward.x) * ANGLES / (2 * math.pi)))
+        return self.sources[bucket % ANGLES]
+    
+    
+    def render(self, glyph, color):
+        """ Renders the atlas of a glyph in a color. """
+        count = 1 if glyph == CIRCLE else ANGLES
+        pixmap = QtGui.QPixmap(self.size * count, self.size)
+        pixmap.fill(QtCore.Qt.transparent)
+        
+        painter = QtGui.QPainter(pixmap)
+        painter.setRenderHint(QtGui.QPainter.Antialiasing)
+        painter.setBrush(QtGui.QColor(*color))
+        r = Boid.RADIUS
+        for i in range(count):
+            painter.save()
+            painter.translate(i * self.size + self.half, self.half)
+            if glyph == CIRCLE:
+                painter.drawEllipse(QtCore.QRectF(-r, -r, 2 * r, 2 * r))
+            else:
+                # Bucket i points at the angle i * 360 / ANGLES, like atan2
+                painter.rotate(i * 360.0 / ANGLES)
+                painter.setPen(QtCore.Qt.NoPen)
+                painter.drawPolygon(QtGui.QPolygonF([QtCore.QPointF(SpriteCache.TIP * r, 0),
+                                                     QtCore.QPointF(-r, -r),
+                                                     QtCore.QPointF(-r, r)]))
+            painter.restore()
+        painter.end()
+        return pixmap
+
+# EOF
+
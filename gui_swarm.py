@@ -0,0 +1,153 @@
+#!/usr/bin/env python
+#-*- coding:utf-8 -*-
+
+from PySide import QtCore, QtGui
+
+from boid import Boid
+from gui_boid import GuiBoid
+import gui_lod
+import gui_sprites
+
+class SwarmItem(QtGui.QGraphicsItem):
+    """ One graphics item that draws the whole swarm of a Simulation.
+    
+    Looks the same as one GuiBoid per boid, but Qt only has one item to
+    keep track of, and the direction lines are drawn in a single call.
+    """
+    
+    def __init__(self, simulation, sprites = None):
+        """
+        :param simulation: the simulation whose boids to draw
+        :type simulation: Simulation
+        :param sprites: cache of pre-rendered glyphs, None to draw the shapes
+        :type sprites: SpriteCache
+        """
+        QtGui.QGraphicsItem.__init__(self)
+        self.simulation = simulation
+        self.brushes = [QtGui.QBrush(QtGui.QColor(*b.color)) for b in simulation.boids]
+        self.pens = [QtGui.QPen(QtGui.QColor(*b.color), Boid.RADIUS) for b in simulation.boids]
+        self.tier = gui_lod.FULL # level of detail, one of gui_lod.TIERS
+        self.sprites = sprites
+        if sprites is not None:
+            self.spriteColors = [sprites.quantize(b.color) for b in simulation.boids]
+    
+    
+    def setColors(self, colors):
+        """ Draws the boids in other colors from now on.
+        
+        :param colors: color of every boid
+        :type colors: list of tuple of int (r, g, b)
+        """
+        made = {} # rgb -> (brush, pen), shared by the boids of one color
+        for (i, rgb) in enumerate(colors):
+            if rgb not in made:
+                color = QtGui.QColor(*rgb)
+                made[rgb] = (QtGui.QBrush(color), QtGui.QPen(color, Boid.RADIUS))
+            (self.brushes[i], self.pens[i]) = made[rgb]
+        if self.sprites is not None:
+            self.spriteColors = [self.sprites.quantize(rgb) for rgb in colors]
+    
+    
+    def updateOnGui(self):
+        """ Schedules a repaint with the current state of the boids. """
+        self.update()
+    
+    
+    def resize(self):
+        """ Tells Qt that the world, and so the bounding rectangle, changed. """
+        self.prepareGeometryChange()
+    
+    
+    def boundingRect(self):
+        """ Specifies the bounding rectangle for Qt, the world and some margin. """
+        margin = max(Boid.DIAMETER, Boid.max_speed * GuiBoid.SPEED_INDICATOR_MULT) + GuiBoid.PENWIDTH
+        return QtCore.QRectF(-margin, -margin,
+                             self.simulation.width + 2*margin,
+                             self.simulation.height + 2*margin)
+    
+    
+    def paint(self, painter, option, widget):
+        """ Draws every boid in the detail of the tier. """
+        painter.setRenderHint(QtGui.QPainter.Antialiasing, self.tier == gui_lod.FULL)
+        if self.tier == gui_lod.POINT:
+            self.paintPoints(painter)
+        elif self.tier == gui_lod.TRIANGLE:
+            self.paintTriangles(painter)
+        else:
+            self.paintFull(painter)
+    
+    
+    def paintFull(self, painter):
+        """ Draws every boid as a circle and a line showing its direction. """
+        r = Boid.RADIUS
+        d = Boid.DIAMETER
+        mult = GuiBoid.SPEED_INDICATOR_MULT
+        lines = []
+        
+        if self.sprites is not None:
+            self.paintSprites(painter, gui_sprites.CIRCLE)
+        
+        # Circles, unless drawn as sprites, and lines
+        for (boid, brush) in zip(self.simulation.boids, self.brushes):
+            x = boid.position.x
+            y = boid.position.y
+            if self.sprites is None:
+                painter.setBrush(brush)
+                painter.drawEllipse(QtCore.QRectF(x - r, y - r, d, d))
+            
+            length = boid.velocity.length * mult
+            forward = boid.orientation.forward
+            lines.append(QtCore.QLineF(x, y, x + forward.x * length, y + forward.y * length))
+        
+        # Lines showing direction, all at once
+        painter.drawLines(lines)
+    
+    
+    def paintTriangles(self, painter):
+        """ Draws every boid as a triangle pointing forward. """
+        if self.sprites is not None:
+            self.paintSprites(painter, gui_sprites.TRIANGLE)
+            return
+        
+        r = Boid.RADIUS
+        tip = 1.5 * Boid.RADIUS
+        QPointF = QtCore.QPointF
+        painter.setPen(QtCore.Qt.NoPen)
+        
+        for (boid, brush) in zip(self.simulation.boids, self.brushes):
+            x = boid.position.x
+            y = boid.position.y
+            (fx, fy) = (boid.orientation.forward.x, boid.orientation.forward.y)
+            # Back corners are r behind and r to both sides
+            (bx, by) = (x - fx * r, y - fy * r)
+            painter.setBrush(brush)
+            painter.drawPolygon(QtGui.QPolygonF([QPointF(x + fx * tip, y + fy * tip),
+                                                 QPointF(bx - fy * r, by + fx * r),
+                                                 QPointF(bx + fy * r, by - fx * r)]))
+    
+    
+    def paintSprites(self, painter, glyph):
+        """ Copies the pre-rendered glyph of every boid to the painter.
+        
+        :param glyph: gui_sprites.CIRCLE or gui_sprites.TRIANGLE
+        :type glyph: str
+        """
+        sprites = self.sprites
+        half = sprites.half
+        QPointF = QtCore.QPointF
+        
+        for (boid, color) in zip(self.simulation.boids, self.spriteColors):
+            atlas = sprites.atlas(glyph, color)
+            source = sprites.source(glyph, boid.orientation.forward)
+            painter.drawPixmap(QPointF(boid.position.x - half, boid.position.y - half),
+                               atlas, source)
+    
+    
+    def paintPoints(self, painter):
+        """ Draws every boid as a dot. """
+        for (boid, pen) in zip(self.simulation.boids, self.pens):
+            painter.setPen(pen)
+            painter.drawPoint(QtCore.QPointF(boid.position.x, boid.position.y))
+
+# EOF
+
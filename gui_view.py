@@ -0,0 +1,161 @@
+#!/usr/bin/env python
+#-*- coding:utf-8 -*-
+
+from timeit import default_timer as clock
+
+from PySide import QtCore, QtGui
+
+OVERLAY_LINE = 14 # const, line height of the profiler overlay in pixels
+
+class ProfiledView(QtGui.QGraphicsView):
+    """ QGraphicsView that times its painting for a TickProfiler or a governor.
+    
+    Optionally draws the rolling averages of the profiler on top of the
+    scene. Only used when profiling or governing, so plain runs pay nothing
+    for it.
+    """
+    
+    def __init__(self, scene, profiler, overlay = True, painted = None):
+        """
+        :param scene: the scene to show
+        :type scene: QGraphicsScene
+        :param profiler: profiler to add the painting time to, if any
+        :type profiler: TickProfiler
+        :param overlay: whether to show the averages on top of the scene
+        :type overlay: bool
+        :param painted: called with the seconds of every paint event, if given
+        :type painted: function
+        """
+        QtGui.QGraphicsView.__init__(self, scene)
+        self.profiler = profiler
+        self.overlay = overlay
+        self.painted = painted
+    
+    
+    def paintEvent(self, event):
+        """ Paints the view and reports the time taken. """
+        t0 = clock()
+        QtGui.QGraphicsView.paintEvent(self, event)
+        took = clock() - t0
+        if self.profiler is not None:
+            self.profiler.add('paint', took)
+        if self.painted is not None:
+            self.painted(took)
+    
+    
+    def drawForeground(self, painter, rect):
+        """ Draws the rolling averages of the profiler on the viewport. """
+        if not self.overlay or self.profiler is None:
+            return
+        
+        # Draw in viewport coordinates, whatever the scene transform is
+        painter.save()
+        painter.resetTransform()
+        drawProfilerOverlay(painter, self.profiler)
+        painter.restore()
+
+
+class SharedRenderer(object):
+    """ Renders the scene once per frame into an image shared by many views.
+    
+    With an N x N grid of views the scene is painted only once, and every
+    SharedImageView just draws the finished image.
+    """
+    
+    def __init__(self, scene):
+        """
+        :param scene: the scene to render
+        :type scene: QGraphicsScene
+        """
+        self.scene = scene
+        self.views = [] # SharedImageViews showing the image
+        self.image = None
+        self.resize()
+    
+    
+    def resize(self):
+        """ Makes the image match the size of the scene. """
+        rect = self.scene.sceneRect()
+        self.image = QtGui.QImage(int(rect.width()), int(rect.height()),
+                                  QtGui.QImage.Format_ARGB32_Premultiplied)
+        self.image.fill(0xffffffff)
+    
+    
+    def render(self):
+        """ Renders the scene into the image and asks the views to show it. """
+        self.image.fill(0xffffffff)
+        painter = QtGui.QPainter(self.image)
+        painter.setRenderHint(QtGui.QPainter.Antialiasing)
+        self.scene.render(painter, QtCore.QRectF(self.image.rect()), self.scene.sceneRect())
+        painter.end()
+        
+        for view in self.views:
+            view.update()
+
+
+class SharedImageView(QtGui.QWidget):
+    """ Shows the image of a SharedRenderer, scaled to the size of the view. """
+    
+    def __init__(self, renderer, profiler = None, overlay = False, painted = None):
+        """
+        :param renderer: the renderer whose image to show
+        :type renderer: SharedRenderer
+        :param profiler: profiler to add the painting time to, if any
+        :type profiler: TickProfiler
+        :param overlay: whether to show the averages of the profiler
+        :type overlay: bool
+        :param painted: called with the seconds of every paint event, if given
+        :type painted: function
+        """
+        QtGui.QWidget.__init__(self)
+        self.renderer = renderer
+        self.profiler = profiler
+        self.overlay = overlay
+        self.painted = painted
+        self.setAttribute(QtCore.Qt.WA_OpaquePaintEvent)
+        renderer.views.append(self)
+    
+    
+    def sizeHint(self):
+        return self.renderer.image.size()
+    
+    
+    def paintEvent(self, event):
+        """ Draws the shared image, plus the profiler overlay if wanted. """
+        t0 = clock()
+        painter = QtGui.QPainter(self)
+        painter.drawImage(self.rect(), self.renderer.image)
+        if self.overlay:
+            drawProfilerOverlay(painter, self.profiler)
+        painter.end()
+        
+        took = clock() - t0
+        if self.profiler is not None:
+            self.profiler.add('paint', took)
+        if self.painted is not None:
+            self.painted(took)
+
+
+def drawProfilerOverlay(painter, profiler):
+    """ Draws the rolling averages of a profiler at the top left corner.
+    
+    :param painter: painter in viewport coordinates
+    :type painter: QPainter
+    :param profiler: the profiler
+    :type profiler: TickProfiler
+    """
+    averages = profiler.averages()
+    lines = ["%-10s %7.2f ms" % (phase, ms) for (phase, ms) in averages]
+    lines.append("%-10s %7.2f ms" % ("total", profiler.average_total()))
+    for (label, ms, _) in profiler.tag_averages():
+        lines.append("%-10s %7.2f ms" % (label, ms))
+    if profiler.notes:
+        lines.append("%d: %s" % profiler.notes[-1])
+    
+    painter.setFont(QtGui.QFont("Monospace", 8))
+    painter.setPen(QtCore.Qt.black)
+    for (i, line) in enumerate(lines):
+        painter.drawText(6, (i + 1) * OVERLAY_LINE, line)
+
+# EOF
+
@@ -0,0 +1,128 @@
+#!/usr/bin/env python
+#-*- coding:utf-8 -*-
+
+""" Live order parameters of the flock, gathered during the tick.
+
+The simulation hands every steered boid and its neighborhood to
+FlockMetrics right after steering it. By then the neighborhood has already
+summed up its boids for the rules, so the metrics only add a few numbers
+per boid instead of making another pass over the pairs:
+
+  polarization  length of the mean heading, 1 when all fly the same way
+  neighbors     mean amount of boids in a neighborhood
+  separation    mean distance from a boid to the center of its neighbors,
+                over the boids that have neighbors
+  flocks        amount of flocks, when following them with a FlockTracker
+
+Gathering can be decimated to every n:th tick, the other ticks cost
+nothing.
+"""
+
+from collections import namedtuple, deque
+
+from flocks import FlockTracker
+
+Sample = namedtuple('Sample', 'tick polarization neighbors separation flocks')
+
+
+class FlockMetrics(object):
+    """ Gathers the metrics of every n:th tick. """
+    
+    HISTORY = 1000 # const, samples kept
+    
+    def __init__(self, every = 1, history = HISTORY, flocks = False):
+        """
+        :param every: gather on every n:th tick
+        :type every: int
+        :param history: amount of samples kept
+        :type history: int
+        :param flocks: also label and follow the flocks
+        :type flocks: bool
+        """
+        self.every = every
+        self.samples = deque(maxlen=history)
+        self.latest = None # the latest Sample
+        self.tracker = None # FlockTracker, if following the flocks
+        if flocks:
+            self.tracker = FlockTracker()
+        self.begin([])
+    
+    
+    def due(self, tick):
+        """ Whether to gather the metrics of a tick. """
+        return tick % self.every == 0
+    
+    
+    def begin(self, boids):
+        """ Starts gathering a tick.
+        
+        :param boids: all the boids of the simulation
+        :type boids: list of Boid
+        """
+        self.count = 0
+        self.heading_x = 0.0
+        self.heading_y = 0.0
+        self.neighbors = 0
+        self.grouped = 0 # boids with neighbors
+        self.separation = 0.0
+        if self.tracker is not None:
+            self.tracker.begin(boids)
+    
+    
+    def add(self, boid, hood, width, height):
+        """ Adds a boid after steering it.
+        
+        :param boid: the boid, already moved
+        :type boid: Boid
+        :param hood: its neighborhood, already calculated
+        :type hood: Neighborhood
+        """
+        self.count += 1
+        forward = boid.orientation.forward
+        self.heading_x += forward.x
+        self.heading_y += forward.y
+        length = len(hood.boids)
+        if length:
+            self.neighbors += length
+            self.grouped += 1
+            self.separation += boid.position.get_dist_sqrd_toroidal(
+                hood.avg_position, width, height) ** 0.5
+        if self.tracker is not None:
+            self.tracker.add(boid, hood)
+    
+    
+    def end(self, tick):
+        """ Finishes the tick and records its sample.
+        
+        :rtype: Sample
+        """
+        count = self.count or 1
+        flocks = None
+        if self.tracker is not None:
+            flocks = self.tracker.end()
+        sample = Sample(tick,
+                        (self.heading_x ** 2 + self.heading_y ** 2) ** 0.5 / count,
+                        self.neighbors / float(count),
+                        self.separation / (self.grouped or 1),
+                        flocks)
+        self.samples.append(sample)
+        self.latest = sample
+        return sample
+    
+    
+    def averages(self):
+        """ Averages of the kept samples.
+        
+        :rtype: Sample with the amount of samples as tick
+        """
+        count = len(self.samples)
+        if count == 0:
+            return Sample(0, 0.0, 0.0, 0.0, None)
+        values = [sum(s[i] for s in self.samples) / float(count) for i in range(1, 4)]
+        flocks = None
+        if self.tracker is not None:
+            flocks = sum(s.flocks for s in self.samples) / float(count)
+        return Sample(count, values[0], values[1], values[2], flocks)
+
+# EOF
+
@@ -1,16 +1,18 @@
 #!/usr/bin/env python
 #-*- coding:utf-8 -*-
 
-from inspect import isfunction
+from types import FunctionType
 
 from vec2d import Vec2d
-from gui_boid import GuiBoid
+from boid import Boid
 
 class Neighborhood(object):
     """ Represents a neighborhood for a boid. """
     
     RADIUS_MULTIPLIER = 5.0 # const
-    max_distance = (GuiBoid.DIAMETER * RADIUS_MULTIPLIER)**2 # static, squared!
+    max_distance = (Boid.DIAMETER * RADIUS_MULTIPLIER)**2 # static, squared!
+    NEAR_RADIUS_MULTIPLIER = 5.0 # const, the default radius, whatever the radius is set to
+    near_distance = (Boid.DIAMETER * NEAR_RADIUS_MULTIPLIER)**2 # static, squared! exact part of far-field backends
     
     @property
     def avg_velocity(self):
@@ -58,7 +60,7 @@ class Neighborhood(object):
             for rule in rules:
                 try:
                     # If the function exists
-                    if isfunction(rule.inject):
+                    if isinstance(rule.inject, FunctionType):
                         # Try to access the attribute that tells as if the
                         # method is abstract
                         rule.inject.__isabstractmethod__
@@ -119,5 +121,43 @@ class Neighborhood(object):
         
         self.updated = False
 
+
+class FarNeighborhood(Neighborhood):
+    """ A neighborhood that also averages boids it only knows the sums of.
+    
+    The boids of the neighborhood are the near ones, that every rule sees.
+    The far ones only count towards the average position and velocity,
+    given as sums, like a node of a QuadTree has them.
+    """
+    
+    def __init__(self, whose, window_width, window_height, rules, neighboring_boids = None, far = None):
+        """
+        :param far: the far boids as [count, sum x, sum y, sum vx, sum vy]
+        :type far: list
+        """
+        Neighborhood.__init__(self, whose, window_width, window_height, rules, neighboring_boids)
+        self.far = far
+    
+    
+    def _calculate(self):
+        """ Calculate like Neighborhood, then add the far boids to the averages. """
+        if self.updated == False:
+            return # No need to calculate
+        
+        Neighborhood._calculate(self)
+        if self.far is None or self.far[0] == 0:
+            return
+        
+        (count, sx, sy, svx, svy) = self.far
+        for b in self.boids:
+            sx += b.position.x
+            sy += b.position.y
+            svx += b.velocity.x
+            svy += b.velocity.y
+        count += len(self.boids)
+        self._avg_velocity = Vec2d(svx / count, svy / count)
+        self._avg_position = Vec2d((sx / count) % self.window_width,
+                                   (sy / count) % self.window_height)
+
 # EOF
 
@@ -0,0 +1,410 @@
+#!/usr/bin/env python
+#-*- coding:utf-8 -*-
+
+""" Command line options and presets, shared by the GUI and headless runs.
+
+Nothing here imports Qt, so the options can be parsed before deciding
+whether the GUI is needed at all. A plain headless command line does not
+even import docopt, see quickParse().
+"""
+
+from __future__ import print_function
+
+__docs__ = """Boids.
+
+Usage:
+  boids.py run [--amount=<int>] [(--width=<int> --height=<int>)]
+               [--numviews=<int>]
+               [--separation=<float>] [--alignment=<float>] [--cohesion=<float>]
+               [--boid-view-angle=<int>]
+               [--boid-mass=<float>] [--boid-max-force=<float>]
+               [--boid-normal-speed=<float>] [--boid-max-speed=<float>]
+               [--serve=<port>] [--profile] [--profile-csv=<file>]
+               [--seed=<int>] [--placement=<dist>]
+               [--backend=<name>] [--radius=<float>] [--theta=<float>]
+               [--render=<mode>] [--shared-render] [--lod=<tier>]
+               [--sprites] [--governor]
+               [--export=<path>] [--export-format=<fmt>] [--export-policy=<policy>]
+               [--restore=<file>] [--checkpoint=<file>]
+               [--record=<file>] [--record-delta] [--metrics=<every>] [--flocks]
+               [--gc=<mode>] [--gc-freeze]
+  boids.py headless [--ticks=<int>] [--amount=<int>] [(--width=<int> --height=<int>)]
+               [--separation=<float>] [--alignment=<float>] [--cohesion=<float>]
+               [--boid-view-angle=<int>]
+               [--boid-mass=<float>] [--boid-max-force=<float>]
+               [--boid-normal-speed=<float>] [--boid-max-speed=<float>]
+               [--serve=<port>] [--profile] [--profile-csv=<file>]
+               [--seed=<int>] [--placement=<dist>]
+               [--backend=<name>] [--radius=<float>] [--theta=<float>]
+               [--export=<path>] [--export-format=<fmt>] [--export-policy=<policy>]
+               [--restore=<file>] [--checkpoint=<file>] [--checkpoint-every=<int>]
+               [--record=<file>] [--record-delta] [--metrics=<every>] [--flocks]
+               [--gc=<mode>] [--gc-freeze]
+  boids.py replay <file> [--speed=<float>] [--numviews=<int>]
+               [--render=<mode>] [--shared-render] [--lod=<tier>] [--sprites]
+               [--profile] [--profile-csv=<file>]
+               [--export=<path>] [--export-format=<fmt>] [--export-policy=<policy>]
+  boids.py preset (normal|wonky|wacky|racers|testing)
+  boids.py --help
+  boids.py --version
+
+Options:
+  --help                        Show this screen.
+  --version                     Show version.
+  -a --amount=<int>             Amount of boids
+  -w --width=<int>              Window width
+  -h --height=<int>             Window height
+  -n --numviews=<int>           Number of views (gives n x n grid)
+  -s --separation=<float>       Weight for the separation rule
+  -l --alignment=<float>        Weight for the alignment rule
+  -c --cohesion=<float>         Weight for the cohesion rule
+  --boid-view-angle=<int>       Boid's view angle on both sides, 180 is full circle
+  --boid-mass=<float>           Mass of the boid
+  --boid-max-force=<float>      Force when applying rules
+  --boid-normal-speed=<float>   Boids' target normal speed
+  --boid-max-speed=<float>      Boids' target max speed
+  --serve=<port>                Stream the swarm state to viewers over TCP
+  -t --ticks=<int>              Ticks to run without the GUI [default: 100]
+  --profile                     Show the time spent in each phase of a tick
+  --profile-csv=<file>          Write the time of each phase per tick to a CSV file
+  --seed=<int>                  Seed for a reproducible run, 0 to 2147483647,
+                                random by default
+  --placement=<dist>            Where the boids start: uniform (default),
+                                blobs or poisson
+  --backend=<name>              How to find the neighborhoods: reference
+                                (default), barnes-hut or summed-grid, see
+                                simulation.py
+  --radius=<float>              Radius of a neighborhood in pixels, 40 by
+                                default; the far-field backends only pay
+                                off with a bigger one
+  --theta=<float>               Opening angle of barnes-hut, 0.5 by
+                                default, 0 visits every far boid
+  --render=<mode>               items: one Qt item per boid (default),
+                                batched: one item draws the whole swarm
+  --shared-render               Render the scene once per frame for all the views
+  --lod=<tier>                  Level of detail: full, triangle, point or auto,
+                                auto picks it from the amount and size of boids
+  --sprites                     Draw pre-rendered glyphs, needs --render=batched
+  --governor                    Lower the quality when frames take too long
+  --export=<path>               Write every frame to disk, needs PySide
+  --export-format=<fmt>         png: PNG files in the directory <path>,
+                                raw: 8-bit RGB frames into the file <path>
+                                [default: png]
+  --export-policy=<policy>      What to do when the disk falls behind,
+                                drop frames or block the tick [default: drop]
+  --restore=<file>              Start from a checkpoint instead of new boids
+  --checkpoint=<file>           Where to save checkpoints, headless runs save
+                                one at the end (GUI default: boids.ckpt)
+  --checkpoint-every=<int>      Also save a checkpoint every n ticks
+  --record=<file>               Record the trajectory of every boid to a file
+  --record-delta                Record quantized deltas instead of floats
+  --metrics=<every>             Gather polarization, neighbor count and
+                                separation every n ticks and show them
+  --flocks                      Also follow the flocks and count them, in the
+                                GUI color the boids by flock; gathers the
+                                metrics every tick unless --metrics is given
+  --gc=<mode>                   Garbage collection during the ticks: auto
+                                (default), limit or off, see gc_policy.py
+  --gc-freeze                   Leave the objects alive after startup out of
+                                the garbage collection (Python 3.7+)
+  --speed=<float>               Recorded ticks per frame in a replay,
+                                negative plays backwards [default: 1]
+
+"""
+
+__greeting__ = """
+     **               **      **        
+    /**              //      /**        
+    /**       ******  **     /**  ******
+    /******  **////**/**  ****** **//// 
+    /**///**/**   /**/** **///**//***** 
+    /**  /**/**   /**/**/**  /** /////**
+    /****** //****** /**//****** ****** 
+    /////    //////  //  ////// //////  
+"""
+
+import sys
+
+from boid import Boid
+from neighborhood import Neighborhood
+from simulation import Simulation, BarnesHutSimulation, BACKENDS
+from placement import PLACEMENTS
+from rng import MAX_SEED
+
+from rule_separation import RuleSeparation
+from rule_cohesion import RuleCohesion
+from rule_alignment import RuleAlignment
+
+VERSION = '0x03'
+COMMANDS = ('run', 'headless', 'replay', 'preset',
+            'normal', 'wonky', 'wacky', 'racers', 'testing') # const, words of the usage
+
+
+def parse(argv):
+    """ Parse the command line and apply the options and presets.
+    
+    :param argv: command line arguments, without the program name
+    :type argv: list of str
+    :returns: the parsed arguments
+    :rtype: dict
+    """
+    args = quickParse(argv)
+    if args is None:
+        from docopt.docopt import docopt
+        args = docopt(__docs__, argv=argv, version='Boids ' + VERSION)
+    
+    # CLI options
+    if args['run'] or args['headless']:
+        cliArgsApply(args)
+    
+    # Presets
+    if args['preset']:
+        if args['wonky']:
+            preset_wonky()
+        if args['wacky']:
+            preset_wacky()
+        if args['racers']:
+            preset_racers()
+        if args['testing']:
+            preset_testing()
+        elif args['normal']:
+            pass
+    
+    return args
+
+
+def quickParse(argv):
+    """ Parses a plain headless command line without docopt.
+    
+    Importing docopt, and re with it, takes longer than the rest of the
+    startup of a headless run. A command line of only 'headless' and
+    --name or --name=value options of its usage is simple enough to parse
+    by hand, anything else is left to docopt, which also prints the help
+    and the errors.
+    
+    :param argv: command line arguments, without the program name
+    :type argv: list of str
+    :returns: the arguments like docopt() returns them, None for docopt
+    :rtype: dict
+    """
+    if not argv or argv[0] != 'headless':
+        return None
+    (usage, _, table) = __docs__.partition('\nOptions:')
+    usage = usage[usage.index('boids.py headless'):usage.index('boids.py replay')]
+    
+    # Long name -> the lines describing it, the default can be on any of them
+    options = {}
+    name = None
+    for line in table.splitlines():
+        if line.startswith('  -'):
+            spec = [word for word in line.split()[:2] if word.startswith('--')][0]
+            name = spec.split('=')[0]
+            options[name] = [spec, line]
+        elif name is not None:
+            options[name].append(line)
+    
+    args = dict((command, False) for command in COMMANDS)
+    args['headless'] = True
+    args['<file>'] = None
+    for (name, lines) in options.items():
+        text = ' '.join(lines[1:])
+        if '=' not in lines[0]:
+            args[name] = False
+        elif '[default: ' in text:
+            args[name] = text.split('[default: ')[1].split(']')[0]
+        else:
+            args[name] = None
+    
+    given = set()
+    for arg in argv[1:]:
+        (name, eq, value) = arg.partition('=')
+        if name not in options or name in given:
+            return None
+        given.add(name)
+        takes = '=' in options[name][0]
+        if takes and eq and ('[' + name + '=') in usage:
+            args[name] = value
+        elif not takes and not eq and ('[' + name + ']') in usage:
+            args[name] = True
+        else:
+            return None
+    return args
+
+
+def greet():
+    """ Print the greeting. """
+    print(__greeting__)
+    print("                          Version " + VERSION + "\n")
+
+
+def cliArgsApply(args):
+    # Apply CLI options
+    if args['--amount']:
+        Simulation.boid_count = int(args['--amount'])
+    
+    if args['--width'] and args['--height']:
+        Simulation.world_width = int(args['--width'])
+        Simulation.world_height = int(args['--height'])
+    
+    if args['--seed']:
+        # The range of new seeds, which also fits in a checkpoint
+        seed = int(args['--seed'])
+        if not 0 <= seed <= MAX_SEED:
+            sys.exit("Seed %d out of range, use 0 to %d" % (seed, MAX_SEED))
+        Simulation.seed = seed
+    
+    if args['--placement']:
+        if args['--placement'] not in PLACEMENTS:
+            sys.exit("Unknown placement %s, use one of: %s"
+                     % (args['--placement'], ', '.join(sorted(PLACEMENTS))))
+        Simulation.placement = args['--placement']
+    
+    if args['--backend']:
+        if args['--backend'] not in BACKENDS:
+            sys.exit("Unknown backend %s, use one of: %s"
+                     % (args['--backend'], ', '.join(sorted(BACKENDS))))
+        Simulation.backend = args['--backend']
+    if args['--radius']:
+        if float(args['--radius']) <= 0:
+            sys.exit("The radius has to be positive")
+        Neighborhood.max_distance = float(args['--radius'])**2
+    if args['--theta']:
+        if float(args['--theta']) < 0:
+            sys.exit("Theta can not be negative")
+        BarnesHutSimulation.theta = float(args['--theta'])
+    
+    if args['--separation']:
+        RuleSeparation.weight = float(args['--separation'])
+    if args['--alignment']:
+        RuleAlignment.weight = float(args['--alignment'])
+    if args['--cohesion']:
+        RuleCohesion.weight = float(args['--cohesion'])
+    
+    if args['--boid-view-angle']:
+        Boid.view_angle = int(args['--boid-view-angle'])
+    if args['--boid-mass']:
+        Boid.mass = float(args['--boid-mass'])
+    if args['--boid-max-force']:
+        Boid.max_force = float(args['--boid-max-force'])
+    if args['--boid-normal-speed']:
+        Boid.normal_speed = float(args['--boid-normal-speed'])
+        Boid.cap_min_speed = Boid.normal_speed*Boid.CAP_MIN_SPEED_MULTIPLIER
+    if args['--boid-max-speed']:
+        Boid.max_speed = float(args['--boid-max-speed'])
+        Boid.cap_max_speed = Boid.max_speed*Boid.CAP_MAX_SPEED_MULTIPLIER
+
+
+def preset_wonky():
+    # Apply preset
+    Simulation.boid_count = 90
+    Simulation.world_width = 1000
+    Simulation.world_height = 800
+    RuleSeparation.weight = 0.4
+    RuleAlignment.weight = 0.4
+    RuleCohesion.weight = 0.4
+    Boid.view_angle = 180
+    Boid.mass = 2.0
+    Boid.max_force = 10.0
+    Boid.normal_speed = 4.0
+    Boid.max_speed = 12.0
+
+def preset_wacky():
+    # Apply preset
+    Simulation.boid_count = 90
+    Simulation.world_width = 1000
+    Simulation.world_height = 800
+    RuleSeparation.weight = 0.8
+    RuleAlignment.weight = 0.4
+    RuleCohesion.weight = 0.8
+    Boid.view_angle = 120
+    Boid.mass = 2.5
+    Boid.max_force = 10.0
+    Boid.normal_speed = 6.0
+    Boid.max_speed = 10.0
+
+def preset_racers():
+    # Apply preset
+    Simulation.boid_count = 90
+    Simulation.world_width = 1000
+    Simulation.world_height = 800
+    RuleSeparation.weight = 1.6
+    RuleAlignment.weight = 3.2
+    RuleCohesion.weight = 3.2
+    Boid.view_angle = 60
+    Boid.mass = 5.0
+    Boid.max_force = 10.0
+    Boid.normal_speed = 7.2
+    Boid.max_speed = 16.0
+
+def preset_testing():
+    # Apply preset
+    Simulation.boid_count = 80
+    Simulation.world_width = 1000
+    Simulation.world_height = 800
+    RuleSeparation.weight = 4.6
+    RuleAlignment.weight = 2.0
+    RuleCohesion.weight = 4.88
+    Boid.view_angle = 90
+    Boid.mass = 3.0
+    Boid.max_force = 5.0
+    Boid.normal_speed = 4.2
+    Boid.max_speed = 4.0
+
+########################################################################
+## Unit Testing                                                       ##
+########################################################################
+if __name__ == "__main__":
+    
+    import unittest
+    import subprocess
+    import os
+    
+    STARTUP_BUDGET = 0.5 # seconds to import and parse a headless command line
+    
+    ####################################################################
+    class UnitTestOptions(unittest.TestCase):
+        
+        def testSameAsDocopt(self):
+            from docopt.docopt import docopt
+            for argv in (['headless'],
+                         ['headless', '--ticks=5', '--amount=20'],
+                         ['headless', '--profile', '--seed=3', '--metrics=2', '--flocks'],
+                         ['headless', '--export=frames', '--export-format=raw'],
+                         ['headless', '--record=run.traj', '--record-delta'],
+                         ['headless', '--backend=barnes-hut', '--radius=150', '--theta=1']):
+                self.assertEqual(quickParse(argv), docopt(__docs__, argv=argv))
+        
+        def testLeftToDocopt(self):
+            for argv in (['run'],
+                         ['headless', '--help'],
+                         ['headless', '-t', '5'],
+                         ['headless', '--ticks', '5'],
+                         ['headless', '--tick=5'],
+                         ['headless', '--ticks=5', '--ticks=6'],
+                         ['headless', '--width=100', '--height=100'],
+                         ['headless', '--sprites'],
+                         ['headless', '--profile=yes']):
+                self.assertEqual(quickParse(argv), None)
+        
+        def testStartup(self):
+            # In a fresh interpreter, nothing imported yet
+            code = ("import sys, time\n"
+                    "t0 = time.time()\n"
+                    "import options\n"
+                    "options.parse(['headless', '--ticks=1'])\n"
+                    "print(time.time() - t0)\n"
+                    "print(' '.join(sys.modules))\n")
+            here = os.path.dirname(os.path.abspath(__file__))
+            output = subprocess.check_output([sys.executable, '-c', code], cwd=here)
+            (seconds, modules) = output.decode('utf-8').splitlines()
+            for name in modules.split():
+                self.assertFalse(name.startswith(('PySide', 'docopt', 'engine', 'gui_')),
+                                 name + " imported by a headless start")
+            self.assertTrue(float(seconds) < STARTUP_BUDGET,
+                            "headless start took %s s" % seconds)
+    
+    ####################################################################
+    unittest.main()
+
+# EOF
+
@@ -13,12 +13,12 @@ class Orientation(Orientation2d):
     def new():
         return Orientation(Vec2d(0, 1), Vec2d(1, 0))
     
-    def __init__(self, forward_or_pair = (Vec2d(0, 1), Vec2d(1, 0)), side = None):
+    def __new__(cls, forward_or_pair = (Vec2d(0, 1), Vec2d(1, 0)), side = None):
         """ Init Orientation """
         if side == None:
-            super(type(self), self).__init__(forward_or_pair[0], forward_or_pair[1])
+            return super(Orientation, cls).__new__(cls, forward_or_pair[0], forward_or_pair[1])
         else:
-            super(type(self), self).__init__(forward_or_pair, side)
+            return super(Orientation, cls).__new__(cls, forward_or_pair, side)
 
 # EOF
 
@@ -0,0 +1,158 @@
+#!/usr/bin/env python
+#-*- coding:utf-8 -*-
+
+""" Initial state of a whole swarm, generated in bulk.
+
+Every function makes all the values of one kind in a single pass over a
+random.Random, instead of a few randint() calls per boid, which is what
+made creating big swarms slower than simulating them. Positions come in
+one of the PLACEMENTS distributions:
+
+  uniform   anywhere in the world, MARGIN away from the edges
+  blobs     in Gaussian blobs around random centers, wrapped over the edges
+  poisson   Poisson-disk, evenly spread with no two boids closer than a radius
+"""
+
+import math
+
+MARGIN = 20         # const, distance of uniform positions from the edges
+BLOBS = 5           # const, default amount of blobs
+MISSES = 1000       # const, candidates in a row that miss before the world is full
+
+
+def uniform(rand, count, width, height):
+    """ Positions anywhere in the world, away from the edges.
+    
+    :param rand: the random stream to draw from
+    :type rand: random.Random
+    :param count: amount of positions
+    :type count: int
+    :returns: the x and the y coordinates
+    :rtype: (list of float, list of float)
+    """
+    random = rand.random
+    margin = min(MARGIN, width / 4.0, height / 4.0)
+    (w, h) = (width - 2 * margin, height - 2 * margin)
+    xs = [margin + random() * w for _ in range(count)]
+    ys = [margin + random() * h for _ in range(count)]
+    return (xs, ys)
+
+
+def blobs(rand, count, width, height, blobs = BLOBS, sigma = None):
+    """ Positions in Gaussian blobs around random centers.
+    
+    :param blobs: amount of blobs
+    :type blobs: int
+    :param sigma: standard deviation of a blob, by default the blobs
+                  together cover about the whole world within 3 sigma
+    :type sigma: float
+    :returns: the x and the y coordinates, see uniform()
+    """
+    random = rand.random
+    gauss = rand.gauss
+    if sigma is None:
+        sigma = math.sqrt(width * height / float(blobs)) / 6.0
+    centers = [(random() * width, random() * height) for _ in range(blobs)]
+    xs = []
+    ys = []
+    for _ in range(count):
+        (cx, cy) = centers[int(random() * blobs)]
+        xs.append(gauss(cx, sigma) % width)
+        ys.append(gauss(cy, sigma) % height)
+    return (xs, ys)
+
+
+def poisson(rand, count, width, height, radius = None):
+    """ Poisson-disk positions, no two closer than radius on the torus.
+    
+    Candidates are thrown uniformly over the world and kept when no point
+    kept so far is within radius. A grid of cells narrower than
+    radius / sqrt(2) holds at most one point per cell, so only the 5 x 5
+    cells around a candidate need a look. After MISSES candidates in a row
+    that do not fit, the world is full and the rest are uniform.
+    
+    :param radius: smallest distance, by default half the spacing of a
+                   square lattice of count points, which fits count points
+                   without many misses
+    :type radius: float
+    :returns: the x and the y coordinates, see uniform()
+    """
+    if count == 0:
+        return ([], [])
+    random = rand.random
+    if radius is None:
+        radius = 0.5 * math.sqrt(width * height / float(count))
+    limit = radius * radius
+    nx = int(math.ceil(width * math.sqrt(2) / radius))
+    ny = int(math.ceil(height * math.sqrt(2) / radius))
+    (cw, ch) = (width / float(nx), height / float(ny))
+    grid = [-1] * (nx * ny) # index of the point in each cell
+    around = [(j, i) for j in range(-2, 3) for i in range(-2, 3)]
+    xs = []
+    ys = []
+    
+    misses = 0
+    while len(xs) < count and misses < MISSES:
+        x = random() * width
+        y = random() * height
+        cx = int(x / cw)
+        cy = int(y / ch)
+        fits = True
+        for (j, i) in around:
+            k = grid[(cy + j) % ny * nx + (cx + i) % nx]
+            if k >= 0:
+                dx = abs(x - xs[k])
+                dy = abs(y - ys[k])
+                dx = min(dx, width - dx)
+                dy = min(dy, height - dy)
+                if dx * dx + dy * dy < limit:
+                    fits = False
+                    break
+        if fits:
+            grid[cy * nx + cx] = len(xs)
+            xs.append(x)
+            ys.append(y)
+            misses = 0
+        else:
+            misses += 1
+    
+    (rest_x, rest_y) = uniform(rand, count - len(xs), width, height)
+    return (xs + rest_x, ys + rest_y)
+
+
+def velocities(rand, count, speed):
+    """ Velocities with both components uniform in [-speed, speed], never zero.
+    
+    :param speed: largest component
+    :type speed: float
+    :returns: the x and the y components
+    :rtype: (list of float, list of float)
+    """
+    random = rand.random
+    vxs = [(2 * random() - 1) * speed for _ in range(count)]
+    vys = [(2 * random() - 1) * speed for _ in range(count)]
+    # For divbyzero in vector calcs
+    for i in [i for i in range(count) if vxs[i] == 0 and vys[i] == 0]:
+        while vxs[i] == 0 and vys[i] == 0:
+            vxs[i] = (2 * random() - 1) * speed
+            vys[i] = (2 * random() - 1) * speed
+    return (vxs, vys)
+
+
+def colors(rand, count):
+    """ Random colors, one draw per color.
+    
+    :rtype: list of tuple of int (r, g, b)
+    """
+    bits = rand.getrandbits
+    return [(c >> 16, (c >> 8) & 255, c & 255) for c in [bits(24) for _ in range(count)]]
+
+# Placement distributions by name, all share the signature of uniform()
+PLACEMENTS = {
+    'uniform': uniform,
+    'blobs': blobs,
+    'poisson': poisson,
+}
+
+# EOF
+
@@ -0,0 +1,160 @@
+#!/usr/bin/env python
+#-*- coding:utf-8 -*-
+
+from __future__ import print_function
+
+from collections import deque
+
+class TickProfiler(object):
+    """ Collects the time spent in each phase of a tick.
+    
+    The simulation and the GUI add the time of their phases while a tick
+    runs. A tick is recorded when the next one begins, so that painting,
+    which Qt does between the ticks, counts towards the tick it shows.
+    The last WINDOW ticks are kept for rolling averages and every tick can
+    be appended to a CSV file. A tick can be tagged, for example with the
+    level of detail it was drawn in, to compare the tick time per tag, and
+    notes, like decisions taken because of the timings, can be logged.
+    """
+    
+    PHASES = ('neighbors', 'calculate', 'consult', 'move', 'step', 'gui', 'paint', 'gc') # const
+    INSIDE = ('gc',) # const, phases that happen during the others, left out of the totals
+    WINDOW = 30 # const, ticks in the rolling averages
+    NOTES = 5 # const, latest notes kept
+    
+    def __init__(self, csv_path = None, window = WINDOW):
+        """
+        :param csv_path: file to append a line per tick to, None for no file
+        :type csv_path: str
+        :param window: amount of ticks in the rolling averages
+        :type window: int
+        """
+        self.index = dict((phase, i) for (i, phase) in enumerate(TickProfiler.PHASES))
+        self.totalled = [i for (i, phase) in enumerate(TickProfiler.PHASES)
+                         if phase not in TickProfiler.INSIDE]
+        self.window = deque(maxlen=window)
+        self.current = None # phase times of the running tick
+        self.label = None # tag of the running tick
+        self.tags = {} # tag -> [total seconds, ticks]
+        self.notes = deque(maxlen=TickProfiler.NOTES) # latest (tick, note)
+        self.note_text = None # note of the running tick, for the CSV file
+        self.tick = 0
+        
+        self.csv = None
+        if csv_path is not None:
+            self.csv = open(csv_path, 'w')
+            self.csv.write(','.join(('tick', 'total') + TickProfiler.PHASES + ('tag', 'note')) + '\n')
+    
+    
+    def begin_tick(self):
+        """ Record the previous tick and start timing a new one. """
+        self.flush()
+        self.tick += 1
+        self.current = [0.0] * len(TickProfiler.PHASES)
+    
+    
+    def add(self, phase, seconds):
+        """ Add time spent in a phase to the running tick.
+        
+        :param phase: one of PHASES
+        :type phase: str
+        :param seconds: time spent
+        :type seconds: float
+        """
+        if self.current is not None:
+            self.current[self.index[phase]] += seconds
+    
+    
+    def tag(self, label):
+        """ Tag the running tick.
+        
+        :param label: the tag, replaces any earlier tag of the tick
+        :type label: str
+        """
+        if self.current is not None:
+            self.label = label
+    
+    
+    def note(self, text):
+        """ Log a note at the running tick.
+        
+        :param text: the note, should not contain newlines
+        :type text: str
+        """
+        self.notes.append((self.tick, text))
+        if self.note_text is None:
+            self.note_text = text
+        else:
+            self.note_text += '; ' + text
+    
+    
+    def flush(self):
+        """ Record the running tick, if any. """
+        if self.current is None:
+            return
+        record = self.current
+        label = self.label
+        self.current = None
+        self.label = None
+        self.window.append(record)
+        if label is not None:
+            totals = self.tags.setdefault(label, [0.0, 0])
+            totals[0] += self.total(record)
+            totals[1] += 1
+        note = self.note_text
+        self.note_text = None
+        if self.csv is not None:
+            values = ['%.3f' % (t * 1000) for t in record]
+            self.csv.write('%d,%.3f,%s,%s,"%s"\n' % (self.tick, self.total(record) * 1000,
+                                                     ','.join(values), label or '',
+                                                     (note or '').replace('"', "'")))
+    
+    
+    def total(self, record):
+        """ Time of a tick in seconds, without the phases INSIDE the others.
+        
+        :param record: phase times of the tick
+        :type record: list of float
+        :rtype: float
+        """
+        return sum(record[i] for i in self.totalled)
+    
+    
+    def average_total(self):
+        """ Rolling average time per tick in milliseconds. """
+        count = len(self.window)
+        if count == 0:
+            return 0.0
+        return sum(self.total(r) for r in self.window) * 1000 / count
+    
+    
+    def averages(self):
+        """ Rolling average time per phase in milliseconds.
+        
+        :rtype: list of (phase, ms) in the order of PHASES
+        """
+        count = len(self.window)
+        if count == 0:
+            return [(phase, 0.0) for phase in TickProfiler.PHASES]
+        sums = [sum(r[i] for r in self.window) for i in range(len(TickProfiler.PHASES))]
+        return [(phase, sums[i] * 1000 / count) for (i, phase) in enumerate(TickProfiler.PHASES)]
+    
+    
+    def tag_averages(self):
+        """ Average tick time per tag in milliseconds, over the whole run.
+        
+        :rtype: list of (tag, ms, ticks) sorted by tag
+        """
+        return [(label, total * 1000 / count, count)
+                for (label, (total, count)) in sorted(self.tags.items())]
+    
+    
+    def close(self):
+        """ Record the running tick and close the CSV file. """
+        self.flush()
+        if self.csv is not None:
+            self.csv.close()
+            self.csv = None
+
+# EOF
+
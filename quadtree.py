@@ -0,0 +1,192 @@
+#!/usr/bin/env python
+#-*- coding:utf-8 -*-
+
+""" A quadtree over the boids of a tick, for the Barnes-Hut backend.
+
+Every node knows how many boids it holds and the sums of their positions
+and velocities, so a node far enough from a boid can stand in for all of
+its boids in the averages of cohesion and alignment. Distances are
+toroidal, like in the simulation.
+"""
+
+LEAF = 8        # const, most boids in a leaf
+MAX_DEPTH = 16  # const, deeper nodes stay leaves, for boids on top of each other
+
+
+def span(p, lo, hi, size):
+    """ Toroidal distance from a coordinate to an interval shorter than size. """
+    if hi - lo >= size:
+        return 0.0
+    q = lo + (p - lo) % size
+    if q <= hi:
+        return 0.0
+    return min(q - hi, lo + size - q)
+
+
+def gather(b1, members, boids, max_distance, near_distance, width, height, near, far):
+    """ Tests boids one by one, the same way as Simulation.neighborhood().
+    
+    :param b1: the boid whose neighborhood to find
+    :type b1: Boid
+    :param members: indices of the boids to test
+    :type members: list of int
+    :param near: gets the indices of the boids within near_distance
+    :type near: list of int
+    :param far: gets the farther ones added, [count, sum x, sum y, sum vx, sum vy]
+    :type far: list
+    """
+    p = b1.position
+    forward = b1.orientation.forward
+    view = b1.view_angle
+    for j in members:
+        b2 = boids[j]
+        if b2 is b1:
+            continue
+        dist_sqrd = p.get_dist_sqrd_toroidal(b2.position, width, height)
+        if dist_sqrd <= max_distance:
+            angle = forward.get_angle_between(- p + b2.position)
+            if angle >= -view and angle <= view:
+                if dist_sqrd <= near_distance:
+                    near.append(j)
+                else:
+                    far[0] += 1
+                    far[1] += b2.position.x
+                    far[2] += b2.position.y
+                    far[3] += b2.velocity.x
+                    far[4] += b2.velocity.y
+
+
+class Node(object):
+    """ A node of the QuadTree, with the sums of the boids under it. """
+    
+    __slots__ = ('x0', 'y0', 'x1', 'y1', 'members', 'children',
+                 'count', 'sx', 'sy', 'svx', 'svy')
+
+
+class QuadTree(object):
+    """ Quadtree of the boids, built again every tick. """
+    
+    def __init__(self, boids, width, height, leaf = LEAF):
+        """
+        :param boids: the boids, the tree refers to them by index
+        :type boids: list of Boid
+        :param leaf: most boids in a leaf
+        :type leaf: int
+        """
+        self.boids = boids
+        self.width = width
+        self.height = height
+        self.leaf = leaf
+        self.xs = [b.position.x for b in boids]
+        self.ys = [b.position.y for b in boids]
+        self.vxs = [b.velocity.x for b in boids]
+        self.vys = [b.velocity.y for b in boids]
+        self.root = None
+        if boids:
+            # Boids step after wrapping, so they can be a bit outside the world
+            self.root = self.build(list(range(len(boids))),
+                                   min(self.xs), min(self.ys),
+                                   max(self.xs), max(self.ys), 0)
+    
+    
+    def build(self, members, x0, y0, x1, y1, depth):
+        """ Builds the node of the boids in members and its children. """
+        node = Node()
+        (node.x0, node.y0, node.x1, node.y1) = (x0, y0, x1, y1)
+        xs = self.xs
+        ys = self.ys
+        node.count = len(members)
+        node.sx = sum(xs[i] for i in members)
+        node.sy = sum(ys[i] for i in members)
+        node.svx = sum(self.vxs[i] for i in members)
+        node.svy = sum(self.vys[i] for i in members)
+        node.members = members
+        node.children = None
+        if len(members) <= self.leaf or depth >= MAX_DEPTH:
+            return node
+        
+        mx = (x0 + x1) / 2.0
+        my = (y0 + y1) / 2.0
+        quarters = ([], [], [], [])
+        for i in members:
+            quarters[(xs[i] > mx) + 2 * (ys[i] > my)].append(i)
+        bounds = ((x0, y0, mx, my), (mx, y0, x1, my), (x0, my, mx, y1), (mx, my, x1, y1))
+        node.children = [self.build(quarter, bx0, by0, bx1, by1, depth + 1)
+                         for (quarter, (bx0, by0, bx1, by1)) in zip(quarters, bounds)
+                         if quarter]
+        return node
+    
+    
+    def query(self, b1, max_distance, near_distance, theta):
+        """ Finds the neighborhood of a boid, the far part as sums.
+        
+        Boids within near_distance are found exactly, the same way as
+        Simulation.neighborhood() does. Nodes entirely between near_distance
+        and max_distance whose size is below theta times their distance
+        count as a whole, if their center of mass is within the view angle;
+        the boids of the other nodes are tested one by one.
+        
+        :param b1: the boid whose neighborhood to find
+        :type b1: Boid
+        :param max_distance: squared radius of the neighborhood
+        :type max_distance: float
+        :param near_distance: squared radius of the exact part
+        :type near_distance: float
+        :param theta: opening angle, 0 tests every boid
+        :type theta: float
+        :returns: the near boids, in the order of the boids list, and the
+                  far ones as [count, sum x, sum y, sum vx, sum vy]
+        :rtype: (list of Boid, list)
+        """
+        near = []
+        far = [0, 0.0, 0.0, 0.0, 0.0]
+        if self.root is None:
+            return (near, far)
+        
+        boids = self.boids
+        w = self.width
+        h = self.height
+        p = b1.position
+        (px, py) = (p.x, p.y)
+        forward = b1.orientation.forward
+        view = b1.view_angle
+        theta2 = theta * theta
+        
+        stack = [self.root]
+        while stack:
+            node = stack.pop()
+            dx = span(px, node.x0, node.x1, w)
+            dy = span(py, node.y0, node.y1, h)
+            closest = dx * dx + dy * dy
+            if closest > max_distance:
+                continue
+            
+            if node.children is None:
+                gather(b1, node.members, boids, max_distance, near_distance, w, h, near, far)
+                continue
+            
+            if closest > near_distance and theta2 > 0:
+                # Farthest point of the node, overestimated
+                ex = min(w / 2.0, dx + node.x1 - node.x0)
+                ey = min(h / 2.0, dy + node.y1 - node.y0)
+                if ex * ex + ey * ey <= max_distance:
+                    cx = node.sx / node.count
+                    cy = node.sy / node.count
+                    size = max(node.x1 - node.x0, node.y1 - node.y0)
+                    if size * size < theta2 * p.get_dist_sqrd_toroidal((cx, cy), w, h):
+                        angle = forward.get_angle_between((cx - px, cy - py))
+                        if angle >= -view and angle <= view:
+                            far[0] += node.count
+                            far[1] += node.sx
+                            far[2] += node.sy
+                            far[3] += node.svx
+                            far[4] += node.svy
+                        continue
+            
+            stack.extend(node.children)
+        
+        near.sort()
+        return ([boids[j] for j in near], far)
+
+# EOF
+
@@ -0,0 +1,102 @@
+#!/usr/bin/env python
+#-*- coding:utf-8 -*-
+
+""" Replaying a recorded trajectory in place of a Simulation.
+
+A Replay has the parts of the Simulation interface the GUI uses (boids,
+width, height, tick, step(), reset()), but step() reads the next tick from
+a trajectory file instead of simulating it. The file is read through a
+memory map and only the current tick is decoded, so memory use does not
+grow with the length of the recording.
+"""
+
+from __future__ import print_function
+
+import math
+
+from vec2d import Vec2d
+from boid import Boid
+from trajectory import TrajectoryReader, TrajectoryError
+
+
+class Replay(object):
+    """ Plays a trajectory file forwards or backwards at any speed. """
+    
+    def __init__(self, path, speed = 1.0):
+        """
+        :param path: the trajectory file
+        :type path: str
+        :param speed: recorded ticks per step, negative plays backwards
+        :type speed: float
+        """
+        self.reader = TrajectoryReader(path)
+        if self.reader.first() is None:
+            raise TrajectoryError("Nothing recorded in " + path)
+        self.speed = speed
+        self.paused = False
+        self.position = float(self.reader.first()) # fractional tick
+        self.tick = None # tick shown
+        self.profiler = None # unused, the Simulation interface
+        self.steer_stride = 1 # unused, the Simulation interface
+        self.rules = [] # nothing to weigh
+        
+        self.boids = [Boid(Vec2d(0, 0), Vec2d(0, 0), color=color)
+                      for color in self.reader.colors]
+        self.boid_count = len(self.boids)
+        self.width = None
+        self.height = None
+        self.seek(self.reader.first())
+        print("Replaying ticks", self.reader.first(), "to", self.reader.last(),
+              "of", self.boid_count, "boids")
+    
+    
+    def first(self):
+        """ The first recorded tick. """
+        return self.reader.first()
+    
+    
+    def last(self):
+        """ The last recorded tick. """
+        return self.reader.last()
+    
+    
+    def seek(self, tick):
+        """ Shows a tick, clamped to the recorded ones.
+        
+        :param tick: the tick
+        :type tick: int
+        """
+        tick = max(self.first(), min(self.last(), int(tick)))
+        self.position = float(tick)
+        if tick == self.tick:
+            return
+        (state, self.width, self.height) = self.reader.frame(tick)
+        for (i, b) in enumerate(self.boids):
+            j = 4 * i
+            b.position = Vec2d(state[j], state[j + 1])
+            b.velocity = Vec2d(state[j + 2], state[j + 3])
+            b.realign()
+        self.tick = tick
+    
+    
+    def step(self):
+        """ Moves speed ticks forward (or backward), unless paused. """
+        if self.paused:
+            return
+        target = max(self.first(), min(self.last(), self.position + self.speed))
+        self.seek(int(math.floor(target)))
+        # Keep the fraction, for speeds slower than a tick per step
+        self.position = target
+    
+    
+    def reset(self):
+        """ Goes back to the first tick. """
+        self.seek(self.first())
+    
+    
+    def close(self):
+        """ Closes the trajectory file. """
+        self.reader.close()
+
+# EOF
+
@@ -0,0 +1,68 @@
+#!/usr/bin/env python
+#-*- coding:utf-8 -*-
+
+""" Seeded random number streams.
+
+Every subsystem draws from a stream of its own, so that for example adding
+a random color does not shift the positions of the boids. The seed of each
+stream is derived from the run seed, the name of the stream and the worker,
+so parallel workers get independent streams from the same run seed.
+"""
+
+import random, hashlib
+
+MAX_SEED = 2**31 - 1 # const
+
+
+def new_seed():
+    """ Returns a fresh seed from the OS entropy source.
+    :rtype: int
+    """
+    return random.SystemRandom().randint(0, MAX_SEED)
+
+
+def derive_seed(seed, name, worker = 0):
+    """ Derives the seed of one stream from the run seed.
+    
+    :param seed: the run seed
+    :type seed: int
+    :param name: name of the stream
+    :type name: str
+    :param worker: index of the parallel worker
+    :type worker: int
+    :rtype: int
+    """
+    key = ('%d:%s:%d' % (seed, name, worker)).encode('utf-8')
+    return int(hashlib.sha1(key).hexdigest()[:16], 16)
+
+
+class RandomStreams(object):
+    """ One random.Random per subsystem, all derived from one seed. """
+    
+    NAMES = ('placement', 'velocity', 'color') # const
+    
+    def __init__(self, seed, worker = 0):
+        """
+        :param seed: the run seed
+        :type seed: int
+        :param worker: index of the parallel worker using the streams
+        :type worker: int
+        """
+        self.seed = seed
+        self.worker = worker
+        for name in RandomStreams.NAMES:
+            setattr(self, name, random.Random(derive_seed(seed, name, worker)))
+    
+    
+    def getstate(self):
+        """ Returns the state of all streams, by name. """
+        return dict((name, getattr(self, name).getstate()) for name in RandomStreams.NAMES)
+    
+    
+    def setstate(self, state):
+        """ Restores the state returned by getstate(). """
+        for name in RandomStreams.NAMES:
+            getattr(self, name).setstate(state[name])
+
+# EOF
+
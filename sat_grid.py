@@ -0,0 +1,253 @@
+#!/usr/bin/env python
+#-*- coding:utf-8 -*-
+
+""" A grid of the boids of a tick with summed-area tables, for the
+summed-grid backend.
+
+The world is cut into cells and every cell keeps its boids and their
+count and sums of positions and velocities. Each sum also goes into a
+summed-area table over the grid tiled twice in both directions, so the
+sum over any rectangle of cells, wrapped over the edges of the world or
+not, takes four lookups.
+
+A cell entirely within the far part of a neighborhood and entirely within
+the view angle of the boid adds its sums without looking at its boids.
+Vertically stacked runs of such cells are added as one rectangle. Cells
+entirely behind the view angle are left out, and the boids of the cells
+only partly covered are tested one by one, the same way
+Simulation.neighborhood() does, view angle included.
+"""
+
+import math
+
+from quadtree import span, gather
+
+CELLS_PER_RADIUS = 4 # const, default cells across the radius of a neighborhood
+
+
+def far_span(p, lo, hi, size):
+    """ Largest toroidal distance from a coordinate to an interval. """
+    d_lo = abs(p - lo) % size
+    d_hi = abs(p - hi) % size
+    d_lo = min(d_lo, size - d_lo)
+    d_hi = min(d_hi, size - d_hi)
+    # The point opposite p is the farthest, when it is in the interval
+    if span((p + size / 2.0) % size, lo, hi, size) == 0:
+        return size / 2.0
+    return max(d_lo, d_hi)
+
+
+class SummedGrid(object):
+    """ Grid of the boids with summed-area tables, built again every tick. """
+    
+    def __init__(self, boids, width, height, cell, tables = True):
+        """
+        :param boids: the boids, the grid refers to them by index
+        :type boids: list of Boid
+        :param cell: smallest width and height of a cell
+        :type cell: float
+        :param tables: build the summed-area tables, not needed when no
+                       neighborhood has a far part
+        :type tables: bool
+        """
+        self.boids = boids
+        self.width = width
+        self.height = height
+        self.nx = max(1, int(width // cell))
+        self.ny = max(1, int(height // cell))
+        self.cw = width / float(self.nx)
+        self.ch = height / float(self.ny)
+        
+        # Boids step after wrapping, the ones outside the world are strays
+        # that every query tests one by one
+        nx = self.nx
+        self.cells = [[] for _ in range(nx * self.ny)]
+        self.strays = []
+        for (i, b) in enumerate(boids):
+            (x, y) = (b.position.x, b.position.y)
+            if 0 <= x < width and 0 <= y < height:
+                cx = min(nx - 1, int(x / self.cw))
+                cy = min(self.ny - 1, int(y / self.ch))
+                self.cells[cy * nx + cx].append(i)
+            else:
+                self.strays.append(i)
+        
+        self.tables = None
+        if tables:
+            self.tables = self.build()
+    
+    
+    def build(self):
+        """ Summed-area tables of count, x, y, vx and vy over the tiled grid.
+        
+        :rtype: list of list of float, indexed [row * (2 nx + 1) + column]
+        """
+        (nx, ny) = (self.nx, self.ny)
+        boids = self.boids
+        sums = []
+        for members in self.cells:
+            sums.append((len(members),
+                         sum(boids[i].position.x for i in members),
+                         sum(boids[i].position.y for i in members),
+                         sum(boids[i].velocity.x for i in members),
+                         sum(boids[i].velocity.y for i in members)))
+        
+        stride = 2 * nx + 1
+        tables = []
+        for k in range(5):
+            table = [0.0] * ((2 * ny + 1) * stride)
+            for r in range(2 * ny):
+                row = (r % ny) * nx
+                above = r * stride
+                here = above + stride
+                acc = 0.0
+                for c in range(2 * nx):
+                    acc += sums[row + c % nx][k]
+                    table[here + c + 1] = table[above + c + 1] + acc
+            tables.append(table)
+        return tables
+    
+    
+    def rect(self, c0, r0, columns, rows, far):
+        """ Adds the sums of a rectangle of cells to far.
+        
+        :param c0: first column, wrapped into the grid
+        :type c0: int
+        :param r0: first row, wrapped into the grid
+        :type r0: int
+        :param columns: width of the rectangle in cells, at most nx
+        :type columns: int
+        :param rows: height of the rectangle in cells, at most ny
+        :type rows: int
+        :param far: the sums to add to, [count, sum x, sum y, sum vx, sum vy]
+        :type far: list
+        """
+        stride = 2 * self.nx + 1
+        c0 %= self.nx
+        r0 %= self.ny
+        top = r0 * stride
+        bottom = (r0 + rows) * stride
+        c1 = c0 + columns
+        for (k, table) in enumerate(self.tables):
+            far[k] += table[bottom + c1] - table[top + c1] - table[bottom + c0] + table[top + c0]
+    
+    
+    def offsets(self, cells, radius, size):
+        """ Cell offsets from the cell of a boid that can be within radius. """
+        reach = int(radius / size) + 1
+        if 2 * reach + 1 >= cells:
+            # Every cell once
+            return range(-(cells // 2), cells - cells // 2)
+        return range(-reach, reach + 1)
+    
+    
+    def query(self, b1, max_distance, near_distance):
+        """ Finds the neighborhood of a boid, the far part as sums.
+        
+        Boids within near_distance are found exactly, the same way as
+        Simulation.neighborhood() does. Cells entirely between near_distance
+        and max_distance and entirely within the view angle count by their
+        sums, the boids of the other cells are tested one by one.
+        
+        :param b1: the boid whose neighborhood to find
+        :type b1: Boid
+        :param max_distance: squared radius of the neighborhood
+        :type max_distance: float
+        :param near_distance: squared radius of the exact part
+        :type near_distance: float
+        :returns: the near boids, in the order of the boids list, and the
+                  far ones as [count, sum x, sum y, sum vx, sum vy]
+        :rtype: (list of Boid, list)
+        """
+        boids = self.boids
+        (w, h) = (self.width, self.height)
+        (nx, ny, cw, ch) = (self.nx, self.ny, self.cw, self.ch)
+        p = b1.position
+        (px, py) = (p.x, p.y)
+        forward = b1.orientation.forward
+        view = b1.view_angle
+        radius = math.sqrt(max_distance)
+        summing = self.tables is not None and max_distance > near_distance
+        
+        cx = int((px % w) / cw) % nx
+        cy = int((py % h) / ch) % ny
+        columns = self.offsets(nx, radius, cw)
+        near = []
+        far = [0, 0.0, 0.0, 0.0, 0.0]
+        tested = list(self.strays)
+        runs = {} # (first, last) column offset -> first row offset, of open rectangles
+        
+        for dj in self.offsets(ny, radius, ch):
+            r = (cy + dj) % ny
+            (y0, y1) = (r * ch, (r + 1) * ch)
+            ry = span(py, y0, y1, h)
+            fy = far_span(py, y0, y1, h)
+            row_runs = []
+            first = None
+            for di in columns:
+                c = (cx + di) % nx
+                (x0, x1) = (c * cw, (c + 1) * cw)
+                rx = span(px, x0, x1, w)
+                closest = rx * rx + ry * ry
+                full = False
+                if closest <= max_distance:
+                    # The cell of the boid is partly seen whatever the angle
+                    seen = 0 if closest == 0 else self.seen(forward, view, px, py, x0, y0, x1, y1)
+                    if seen == 1 and summing and closest > near_distance:
+                        fx = far_span(px, x0, x1, w)
+                        full = fx * fx + fy * fy <= max_distance
+                    if seen >= 0 and not full:
+                        tested.extend(self.cells[r * nx + c])
+                if full and first is None:
+                    first = di
+                elif not full and first is not None:
+                    row_runs.append((first, di - 1))
+                    first = None
+            if first is not None:
+                row_runs.append((first, columns[-1]))
+            
+            # Stack equal runs of consecutive rows into one rectangle
+            for key in list(runs):
+                if key not in row_runs:
+                    self.rect(cx + key[0], cy + runs[key], key[1] - key[0] + 1,
+                              dj - runs.pop(key), far)
+            for key in row_runs:
+                if key not in runs:
+                    runs[key] = dj
+        last = self.offsets(ny, radius, ch)[-1]
+        for (key, dj) in runs.items():
+            self.rect(cx + key[0], cy + dj, key[1] - key[0] + 1, last + 1 - dj, far)
+        
+        gather(b1, tested, boids, max_distance, near_distance, w, h, near, far)
+        
+        near.sort()
+        return ([boids[j] for j in near], far)
+    
+    
+    def seen(self, forward, view, px, py, x0, y0, x1, y1):
+        """ How much of a cell the boid sees, by the view angle only.
+        
+        The angles are measured to the cell as it lies in the world, not to
+        its nearest copy over the edges, the same as for single boids in
+        Simulation.neighborhood(). The cell does not hold the boid, so the
+        directions to its points lie between those to its corners.
+        
+        :returns: 1 if the whole cell is within the view angle, -1 if none
+                  of it is, 0 if part of it is
+        :rtype: int
+        """
+        if view >= 180:
+            return 1
+        angles = [forward.get_angle_between((x - px, y - py))
+                  for (x, y) in ((x0, y0), (x1, y0), (x0, y1), (x1, y1))]
+        low = min(angles)
+        high = max(angles)
+        behind = high - low > 180 # the directions go around the back, not the front
+        if low >= -view and high <= view:
+            return 0 if behind else 1
+        if (low > view or high < -view or behind) and all(abs(a) > view for a in angles):
+            return -1
+        return 0
+
+# EOF
+
@@ -0,0 +1,386 @@
+#!/usr/bin/env python
+#-*- coding:utf-8 -*-
+
+from __future__ import print_function
+
+__docs__ = """Boids sharded over several processes.
+
+The torus is cut into vertical strips, one per node. Every tick the nodes
+hand over the boids that left their strip and exchange the boids near their
+borders (halos) with the neighboring strips over TCP. A coordinator keeps
+the nodes in lockstep with a barrier per tick.
+
+Usage:
+  shard.py bench [--amount=<int>] [(--width=<int> --height=<int>)]
+                 [--ticks=<int>] [--warmup=<int>] [--shards=<list>]
+                 [--seed=<int>]
+  shard.py node --index=<int> --shards=<int> --coordinator=<port>
+                --amount=<int> --width=<int> --height=<int> --seed=<int>
+  shard.py --help
+
+Options:
+  --help                Show this screen.
+  -a --amount=<int>     Amount of boids in the whole world [default: 2000]
+  -w --width=<int>      World width [default: 1400]
+  -h --height=<int>     World height [default: 1000]
+  -t --ticks=<int>      Ticks to measure [default: 50]
+  --warmup=<int>        Ticks to run before measuring [default: 5]
+  --shards=<list>       Comma separated shard counts to bench [default: 1,2,4,8]
+  --index=<int>         Index of this node
+  --coordinator=<port>  Port of the coordinator on localhost
+  --seed=<int>          Seed of the run, each node derives its own streams [default: 0]
+
+"""
+
+import sys, socket, select, struct, subprocess, time, json, errno
+
+from docopt.docopt import docopt
+
+from vec2d import Vec2d
+from orientation import Orientation
+from neighborhood import Neighborhood
+from boid import Boid
+from rng import RandomStreams
+
+from rule_separation import RuleSeparation
+from rule_cohesion import RuleCohesion
+from rule_alignment import RuleAlignment
+
+HOST = '127.0.0.1'
+LENGTH = struct.Struct('<I')
+BOID = struct.Struct('<dddd') # x, y, vx, vy
+
+
+def send_msg(sock, payload):
+    """ Send one length-prefixed message on a blocking socket. """
+    sock.sendall(LENGTH.pack(len(payload)) + payload)
+
+
+def recv_msg(sock):
+    """ Receive one length-prefixed message from a blocking socket. """
+    length = LENGTH.unpack(_recv_exactly(sock, LENGTH.size))[0]
+    return _recv_exactly(sock, length)
+
+
+def _recv_exactly(sock, size):
+    data = bytearray()
+    while len(data) < size:
+        chunk = sock.recv(size - len(data))
+        if not chunk:
+            raise IOError("Connection closed")
+        data += chunk
+    return bytes(data)
+
+
+def send_json(sock, obj):
+    send_msg(sock, json.dumps(obj).encode('utf-8'))
+
+
+def recv_json(sock):
+    return json.loads(recv_msg(sock).decode('utf-8'))
+
+
+def exchange(socks, payloads):
+    """ Send one message on each socket and receive one from each, at once.
+
+    Sending and receiving are interleaved with select() so that two nodes
+    sending large messages to each other cannot deadlock.
+
+    :param socks: non-blocking sockets
+    :type socks: list of socket
+    :param payloads: message to send on each socket
+    :type payloads: list of bytes
+    :returns: message received on each socket
+    :rtype: list of bytes
+    """
+    outgoing = [bytearray(LENGTH.pack(len(p)) + p) for p in payloads]
+    incoming = [bytearray() for _ in socks]
+    received = [None for _ in socks]
+
+    while any(outgoing) or None in received:
+        writing = [s for (s, out) in zip(socks, outgoing) if out]
+        reading = [s for (s, r) in zip(socks, received) if r is None]
+        (readable, writable, _) = select.select(reading, writing, [])
+
+        for (i, s) in enumerate(socks):
+            if s in writable:
+                try:
+                    sent = s.send(outgoing[i])
+                    del outgoing[i][:sent]
+                except socket.error as e:
+                    if e.args[0] not in (errno.EAGAIN, errno.EWOULDBLOCK):
+                        raise
+            if s in readable:
+                # Never read past this message, the next one may follow
+                need = LENGTH.size
+                if len(incoming[i]) >= LENGTH.size:
+                    need += LENGTH.unpack_from(incoming[i])[0]
+                chunk = s.recv(need - len(incoming[i]))
+                if not chunk:
+                    raise IOError("Connection closed")
+                incoming[i] += chunk
+                if len(incoming[i]) >= LENGTH.size:
+                    length = LENGTH.unpack_from(incoming[i])[0]
+                    if len(incoming[i]) == LENGTH.size + length:
+                        received[i] = bytes(incoming[i][LENGTH.size:])
+
+    return received
+
+
+def pack_boids(boids):
+    """ Pack positions and velocities of boids into bytes. """
+    return b''.join(BOID.pack(b.position.x, b.position.y,
+                              b.velocity.x, b.velocity.y) for b in boids)
+
+
+def unpack_boids(data):
+    """ Unpack boids packed by pack_boids(). """
+    boids = []
+    for offset in range(0, len(data), BOID.size):
+        (x, y, vx, vy) = BOID.unpack_from(data, offset)
+        velocity = Vec2d(vx, vy)
+        orientation = Orientation.new()
+        if velocity.length != 0:
+            forward = velocity.normalized()
+            orientation = Orientation(forward, forward.perpendicular())
+        boids.append(Boid(Vec2d(x, y), velocity, orientation))
+    return boids
+
+
+class ShardNode(object):
+    """ One node of the sharded simulation, owns one strip of the torus. """
+
+    def __init__(self, index, shards, amount, width, height, seed):
+        """
+        :param index: index of this node, strips are ordered left to right
+        :type index: int
+        :param shards: amount of nodes
+        :type shards: int
+        :param amount: amount of boids in the whole world
+        :type amount: int
+        :param seed: seed of the run, the node uses its own streams of it
+        :type seed: int
+        """
+        self.index = index
+        self.shards = shards
+        self.width = width
+        self.height = height
+        self.strip = width / float(shards)
+        self.x0 = index * self.strip
+        self.radius = Neighborhood.max_distance ** 0.5
+
+        if self.strip < self.radius:
+            raise ValueError("Strips are narrower than the neighborhood radius")
+
+        self.rules = [RuleSeparation(), RuleAlignment(), RuleCohesion()]
+        self.boids = []
+        self.left = None  # socket to the node on the left
+        self.right = None # socket to the node on the right
+
+        # Every node places its share of the boids inside its own strip
+        rng = RandomStreams(seed, worker=index)
+        for i in range(amount // shards + (index < amount % shards)):
+            position = Vec2d(self.x0 + rng.placement.uniform(0, self.strip),
+                             rng.placement.uniform(0, height))
+            velocity = Vec2d(0, 0)
+            while velocity.length == 0:
+                velocity = Vec2d(rng.velocity.uniform(-Boid.normal_speed, Boid.normal_speed),
+                                 rng.velocity.uniform(-Boid.normal_speed, Boid.normal_speed))
+            self.boids.append(Boid(position, velocity))
+
+
+    def connect(self, listener, right_address):
+        """ Connect to the node on the right and accept the one on the left. """
+        if self.shards == 1:
+            return
+        self.right = socket.create_connection(right_address)
+        (self.left, _) = listener.accept()
+        for s in (self.left, self.right):
+            s.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            s.setblocking(False)
+
+
+    def _side(self, boid):
+        """ Return -1, 0 or 1 if the boid is left of, in or right of the strip. """
+        rel = (boid.position.x - self.x0) % self.width
+        if rel < self.strip:
+            return 0
+        if rel < self.strip + (self.width - self.strip) / 2.0:
+            return 1
+        return -1
+
+
+    def migrate(self):
+        """ Hand boids that left the strip over to the neighboring nodes. """
+        if self.shards == 1:
+            return
+        stay, to_left, to_right = [], [], []
+        for b in self.boids:
+            side = self._side(b)
+            [to_left, stay, to_right][side + 1].append(b)
+        (from_left, from_right) = exchange(
+            [self.left, self.right], [pack_boids(to_left), pack_boids(to_right)])
+        self.boids = stay + unpack_boids(from_left) + unpack_boids(from_right)
+
+
+    def halo(self):
+        """ Exchange the boids near the borders with the neighboring nodes.
+
+        With two nodes the left and right neighbors are the same node, so a
+        boid near both borders goes to one side only, or that node would
+        count it twice.
+
+        :returns: copies of the boids owned by the neighbors near the borders
+        :rtype: list of Boid
+        """
+        if self.shards == 1:
+            return []
+        near_left, near_right = [], []
+        for b in self.boids:
+            rel = (b.position.x - self.x0) % self.width
+            left = rel <= self.radius
+            if left:
+                near_left.append(b)
+            if rel >= self.strip - self.radius and not (left and self.shards == 2):
+                near_right.append(b)
+        (from_left, from_right) = exchange(
+            [self.left, self.right], [pack_boids(near_left), pack_boids(near_right)])
+        return unpack_boids(from_left) + unpack_boids(from_right)
+
+
+    def tick(self):
+        """ Run one tick, the same way as Engine.loop but over own + halo. """
+        self.migrate()
+        ghosts = self.halo()
+        candidates = self.boids + ghosts
+        w = self.width
+        h = self.height
+
+        for b1 in self.boids:
+            hood = Neighborhood(b1, w, h, rules=self.rules)
+            for b2 in candidates:
+                if b2 is b1:
+                    continue
+                dist_sqrd = b1.position.get_dist_sqrd_toroidal(b2.position, w, h)
+                if dist_sqrd <= Neighborhood.max_distance:
+                    vect_ab = (- b1.position + b2.position)
+                    angle = b1.orientation.forward.get_angle_between(vect_ab)
+                    if angle >= -b1.view_angle and angle <= b1.view_angle:
+                        hood.add(b2)
+
+            force = Vec2d(0, 0)
+            for rule in self.rules:
+                force += (type(rule).weight * rule.consult(b1, hood, w, h).normalized())
+            b1.move(force, w, h)
+
+        for b1 in self.boids:
+            b1.step()
+            b1.wrap_around(w, h)
+
+
+def run_node(args):
+    """ Entry point of a node process. """
+    index = int(args['--index'])
+    node = ShardNode(index, int(args['--shards']), int(args['--amount']),
+                     int(args['--width']), int(args['--height']), int(args['--seed']))
+
+    listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    listener.bind((HOST, 0))
+    listener.listen(2)
+
+    control = socket.create_connection((HOST, int(args['--coordinator'])))
+    send_json(control, {'index': index, 'port': listener.getsockname()[1]})
+    node.connect(listener, (HOST, recv_json(control)['right']))
+
+    # Lockstep: every tick starts when the coordinator says so
+    while recv_json(control).get('tick') is not None:
+        started = time.time()
+        node.tick()
+        send_json(control, {'boids': len(node.boids),
+                            'compute': time.time() - started})
+
+
+def run_bench(args):
+    """ Launch nodes on localhost and report throughput and tick latency. """
+    amount = int(args['--amount'])
+    width = int(args['--width'])
+    height = int(args['--height'])
+    ticks = int(args['--ticks'])
+    warmup = int(args['--warmup'])
+    seed = int(args['--seed'])
+
+    print("shards  boids/s     ticks/s   latency ms (mean / max)")
+    for shards in [int(s) for s in args['--shards'].split(',')]:
+        result = bench(shards, amount, width, height, ticks, warmup, seed)
+        print("{0:6d}  {1:10.0f}  {2:7.2f}   {3:7.2f} / {4:7.2f}".format(
+            shards, result['boids_per_sec'], result['ticks_per_sec'],
+            result['latency_mean'] * 1000, result['latency_max'] * 1000))
+
+
+def bench(shards, amount, width, height, ticks, warmup, seed):
+    """ Run one sharded simulation on localhost and measure it.
+
+    :returns: boids_per_sec, ticks_per_sec, latency_mean and latency_max
+    :rtype: dict
+    """
+    listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    listener.bind((HOST, 0))
+    listener.listen(shards)
+    port = listener.getsockname()[1]
+
+    procs = []
+    for i in range(shards):
+        procs.append(subprocess.Popen([
+            sys.executable, __file__, 'node', '--index=%d' % i,
+            '--shards=%d' % shards, '--coordinator=%d' % port,
+            '--amount=%d' % amount, '--width=%d' % width,
+            '--height=%d' % height, '--seed=%d' % seed]))
+
+    try:
+        controls = {}
+        ports = {}
+        for _ in range(shards):
+            (sock, _) = listener.accept()
+            hello = recv_json(sock)
+            controls[hello['index']] = sock
+            ports[hello['index']] = hello['port']
+        for i in range(shards):
+            send_json(controls[i], {'right': ports[(i + 1) % shards]})
+
+        latencies = []
+        for t in range(warmup + ticks):
+            started = time.time()
+            for i in range(shards):
+                send_json(controls[i], {'tick': t})
+            replies = [recv_json(controls[i]) for i in range(shards)]
+            if t >= warmup:
+                latencies.append(time.time() - started)
+            total = sum(r['boids'] for r in replies)
+            if total != amount:
+                raise RuntimeError("Lost boids in migration: %d != %d" % (total, amount))
+
+        for i in range(shards):
+            send_json(controls[i], {'tick': None})
+        for p in procs:
+            p.wait()
+    finally:
+        for p in procs:
+            if p.poll() is None:
+                p.kill()
+        listener.close()
+
+    elapsed = sum(latencies)
+    return {'boids_per_sec': amount * ticks / elapsed,
+            'ticks_per_sec': ticks / elapsed,
+            'latency_mean': elapsed / ticks,
+            'latency_max': max(latencies)}
+
+
+if __name__ == '__main__':
+    args = docopt(__docs__)
+    if args['node']:
+        run_node(args)
+    elif args['bench']:
+        run_bench(args)
+
+# EOF
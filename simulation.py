@@ -0,0 +1,422 @@
+#!/usr/bin/env python
+#-*- coding:utf-8 -*-
+
+from __future__ import print_function
+
+import math
+from timeit import default_timer as clock
+
+from vec2d import Vec2d
+from neighborhood import Neighborhood, FarNeighborhood
+from boid import Boid
+from orientation import Orientation
+from rng import RandomStreams, new_seed
+import placement
+from quadtree import QuadTree
+from sat_grid import SummedGrid, CELLS_PER_RADIUS
+
+from rule_separation import RuleSeparation
+from rule_cohesion import RuleCohesion
+from rule_alignment import RuleAlignment
+
+class Simulation(object):
+    """ The boids simulation, without any graphics.
+    
+    Owns the boids, the rules and the size of the (toroidal) world and moves
+    everything forward one tick at a time with step().
+    """
+    
+    boid_count = 100    # static, default amount of boids
+    world_width = 700   # static, default width of the world
+    world_height = 500  # static, default height of the world
+    seed = None         # static, default seed, None = a new one every reset
+    placement = 'uniform' # static, default distribution of placement.PLACEMENTS
+    backend = 'reference' # static, name in BACKENDS of the runs' simulation, see new_simulation()
+    
+    def __init__(self, boid_count = None, width = None, height = None, seed = None,
+                 placement = None):
+        """ Initializes the simulation with new boids and rules.
+        
+        The same seed gives the same initial state, whatever the backend.
+        
+        :param boid_count: amount of boids (default: Simulation.boid_count)
+        :type boid_count: int
+        :param width: width of the world (default: Simulation.world_width)
+        :type width: int
+        :param height: height of the world (default: Simulation.world_height)
+        :type height: int
+        :param seed: seed for the random streams (default: Simulation.seed)
+        :type seed: int
+        :param placement: where to place the boids, one of placement.PLACEMENTS
+                          (default: Simulation.placement)
+        :type placement: str
+        """
+        if boid_count == None:
+            boid_count = Simulation.boid_count
+        if width == None:
+            width = Simulation.world_width
+        if height == None:
+            height = Simulation.world_height
+        if seed == None:
+            seed = Simulation.seed
+        if placement == None:
+            placement = Simulation.placement
+        
+        self.boid_count = boid_count
+        self.width = width
+        self.height = height
+        self.fixed_seed = seed
+        self.placement = placement
+        self.rng = None # RandomStreams
+        self.tick = 0
+        self.profiler = None # TickProfiler, if profiling
+        self.steer_stride = 1 # steer every n:th boid per tick, the rest keep going
+        self.metrics = None # FlockMetrics, if gathering metrics
+        
+        self.boids = None # list for boids
+        self.rules = None # list for rules
+        
+        self.reset()
+    
+    
+    def reset(self):
+        """ Throws away the old boids and rules and initializes new ones. """
+        seed = self.fixed_seed
+        if seed == None:
+            seed = new_seed()
+        print("Seed is", seed)
+        self.rng = RandomStreams(seed)
+        
+        self.boids = []
+        self.rules = []
+        self.tick = 0
+        self.initBoids(self.boid_count)
+        self.initRules()
+    
+    
+    def initRules(self):
+        """ Initialize the rules. """
+        self.rules.append(RuleSeparation())
+        self.rules.append(RuleAlignment())
+        self.rules.append(RuleCohesion())
+        
+        for rule in self.rules:
+            print("Rule {0} has weight \t{1}".format(rule.name, type(rule).weight))
+    
+    
+    def initBoids(self, amount):
+        """ Initialize boids with random parameters.
+        
+        All positions, velocities and colors are drawn in bulk, each from
+        a stream of its own.
+        
+        :param amount: number of boids to initialize
+        :type amount: int
+        """
+        place = placement.PLACEMENTS[self.placement]
+        (xs, ys) = place(self.rng.placement, amount, self.width, self.height)
+        (vxs, vys) = placement.velocities(self.rng.velocity, amount, Boid.normal_speed)
+        colors = placement.colors(self.rng.color, amount)
+        # Orientations are only ever replaced, never changed, so one will do
+        orientation = Orientation.new()
+        self.boids.extend([Boid(Vec2d(x, y), Vec2d(vx, vy), orientation, color)
+                           for (x, y, vx, vy, color) in zip(xs, ys, vxs, vys, colors)])
+    
+    
+    def step(self):
+        """ Moves the simulation forward by one tick.
+        
+        Calculates the neighborhoods for each boid, then calculates the force to
+        apply given by the rules and applies it.
+        Lastly moves all the boids forward.
+        
+        With a steer_stride of n, only every n:th boid is steered, taking
+        turns, and the rest keep their velocity for the tick.
+        """
+        if self.profiler is not None:
+            return self.stepProfiled()
+        
+        self.prepare()
+        w = self.width
+        h = self.height
+        metrics = self.dueMetrics()
+        
+        for b1 in self.steered():
+            hood = self.neighborhood(b1)
+            force = self.steer(b1, hood)
+            # Apply weighted force
+            b1.move(force, w, h)
+            if metrics is not None:
+                metrics.add(b1, hood, w, h)
+        
+        if self.steer_stride > 1:
+            self.wrapAll()
+        
+        # Step all boids forward
+        for b1 in self.boids:
+            b1.step()
+        
+        self.tick += 1
+        if metrics is not None:
+            metrics.end(self.tick)
+    
+    
+    def stepProfiled(self):
+        """ Same as step(), but adds the time of each phase to the profiler. """
+        w = self.width
+        h = self.height
+        times = [0.0] * 4
+        metrics = self.dueMetrics()
+        
+        t0 = clock()
+        self.prepare()
+        times[0] += clock() - t0
+        
+        for b1 in self.steered():
+            t0 = clock()
+            hood = self.neighborhood(b1)
+            t1 = clock()
+            hood._calculate()
+            t2 = clock()
+            force = self.steer(b1, hood)
+            t3 = clock()
+            b1.move(force, w, h)
+            t4 = clock()
+            if metrics is not None:
+                metrics.add(b1, hood, w, h)
+            times[0] += t1 - t0
+            times[1] += t2 - t1
+            times[2] += t3 - t2
+            times[3] += t4 - t3
+        
+        t0 = clock()
+        if self.steer_stride > 1:
+            self.wrapAll()
+        for b1 in self.boids:
+            b1.step()
+        
+        self.profiler.add('step', clock() - t0)
+        self.profiler.add('neighbors', times[0])
+        self.profiler.add('calculate', times[1])
+        self.profiler.add('consult', times[2])
+        self.profiler.add('move', times[3])
+        
+        self.tick += 1
+        if metrics is not None:
+            metrics.end(self.tick)
+    
+    
+    def dueMetrics(self):
+        """ Returns the metrics to gather in this tick, None if none.
+        :rtype: FlockMetrics
+        """
+        metrics = self.metrics
+        if metrics is None or not metrics.due(self.tick + 1):
+            return None
+        metrics.begin(self.boids)
+        return metrics
+    
+    
+    def steered(self):
+        """ Returns the boids to steer in this tick.
+        :rtype: list of Boid
+        """
+        stride = self.steer_stride
+        if stride == 1:
+            return self.boids
+        return self.boids[self.tick % stride::stride]
+    
+    
+    def wrapAll(self):
+        """ Keeps the boids that were not steered in the world. """
+        for b1 in self.boids:
+            b1.wrap_around(self.width, self.height)
+    
+    
+    def prepare(self):
+        """ Builds what neighborhood() needs in the coming tick.
+        
+        Nothing for the reference, backends with a spatial index build it
+        here, from the state before the tick.
+        """
+        pass
+    
+    
+    def neighborhood(self, b1):
+        """ Finds the neighborhood of a boid.
+        
+        :param b1: the boid whose neighborhood to find
+        :type b1: Boid
+        :rtype: Neighborhood
+        """
+        w = self.width
+        h = self.height
+        
+        # Initialize neighborhood
+        hood = Neighborhood(b1, w, h, rules=self.rules)
+        
+        # n², loop all boids, add to neighborhood if distance is short enough
+        for b2 in self.boids:
+            if b2 == b1:
+                continue # skip adding the boid itself to its neighborhood
+            
+            dist_sqrd = b1.position.get_dist_sqrd_toroidal(b2.position, w, h)
+            
+            # OK to compare squared distances
+            if dist_sqrd <= Neighborhood.max_distance:
+                # Check view angle condition
+                # angle is now between -180 and 180
+                vect_ab = (- b1.position + b2.position)
+                angle = b1.orientation.forward.get_angle_between(vect_ab)
+                if angle >= -b1.view_angle and angle <= b1.view_angle:
+                    hood.add(b2)
+        
+        return hood
+    
+    
+    def steer(self, b1, hood):
+        """ Calculates the weighted force the rules give for a boid.
+        
+        :param b1: the boid
+        :type b1: Boid
+        :param hood: neighborhood of the boid
+        :type hood: Neighborhood
+        :rtype: Vec2d
+        """
+        force = Vec2d(0, 0)
+        for rule in self.rules:
+            # Normalize all vectors returned by rules and add them to total
+            force += (type(rule).weight * rule.consult(b1, hood, self.width, self.height).normalized())
+        return force
+
+class BarnesHutSimulation(Simulation):
+    """ The simulation with the far part of big neighborhoods approximated.
+    
+    Boids within Neighborhood.near_distance, the default radius, are found
+    exactly, like in the reference, and every rule sees them. The farther
+    boids of the neighborhood only matter to cohesion and alignment,
+    through the average position and velocity, so a QuadTree node whose
+    size is below theta times its distance counts as a whole, by the sums
+    of its boids, without visiting them. With the default radius
+    everything is near and the result is the same as the reference's; the
+    approximation pays off when the radius (--radius) is raised for
+    flocking at a larger scale.
+    
+    The sums of a node are taken at the start of the tick, and the view
+    angle is checked to the center of mass of the node, so the farther
+    part of the averages is a bit off. Separation and the neighbor count
+    of the metrics only see the near boids. One tick of 1000 boids in
+    700 x 500 from the same state, in seconds and times faster than the
+    reference, and the mean error of the average position (relative to
+    the radius) and velocity (relative to Boid.max_speed), as
+    bench_far.py measures them:
+    
+                      radius 400                        radius 150
+      theta   tick  speedup  position  velocity  tick  speedup  position  velocity
+      ref     4.29   1.00x                       1.18   1.00x
+        0     2.28   1.88x      0         0      0.61   1.95x      0         0
+      0.25    2.25   1.91x   0.12 %    0.05 %    0.62   1.90x      0         0
+      0.5     1.02   4.21x   0.74 %    0.25 %    0.59   2.02x   0.07 %    0.02 %
+      1.0     0.48   8.90x   2.13 %    0.40 %    0.57   2.10x   0.79 %    0.19 %
+    
+    The larger the radius compared to the near part, the more theta buys;
+    near the default radius the tree only helps in finding the neighbors.
+    """
+    
+    theta = 0.5 # static, opening angle, 0 = every far boid is visited
+    
+    def __init__(self, boid_count = None, width = None, height = None, seed = None,
+                 placement = None):
+        """ See Simulation. """
+        self.tree = None # QuadTree of the running tick
+        Simulation.__init__(self, boid_count, width, height, seed, placement)
+    
+    
+    def prepare(self):
+        """ Builds the quadtree of the tick. """
+        self.tree = QuadTree(self.boids, self.width, self.height)
+    
+    
+    def neighborhood(self, b1):
+        """ Finds the neighborhood of a boid, the far part as sums.
+        
+        :param b1: the boid whose neighborhood to find
+        :type b1: Boid
+        :rtype: FarNeighborhood
+        """
+        (near, far) = self.tree.query(b1, Neighborhood.max_distance,
+                                      Neighborhood.near_distance,
+                                      BarnesHutSimulation.theta)
+        return FarNeighborhood(b1, self.width, self.height, self.rules, near, far)
+
+
+class SummedGridSimulation(Simulation):
+    """ The simulation with exact cell sums for the far part of big neighborhoods.
+    
+    Like BarnesHutSimulation, boids within Neighborhood.near_distance are
+    found one by one and the farther ones only count through their sums.
+    The sums come from a SummedGrid: a cell entirely in the far part and
+    entirely within the view angle adds its count and sums in O(1), whole
+    rectangles of them at once from the summed-area tables, and the boids
+    of the cells only partly covered are tested one by one. Nothing is
+    approximated but the moment: the sums of a cell are those of the start
+    of the tick, not the velocities the boids earlier in the tick were
+    just given. With the default radius everything is near and the result
+    is the same as the reference's. One tick of 1000 boids in 700 x 500
+    from the same state, in seconds and times faster than the reference,
+    from the same run of bench_far.py as the table of BarnesHutSimulation:
+    
+      radius   reference      barnes-hut 0.5   summed-grid
+       400     4.29  1.00x    1.02  4.21x      0.83  5.17x
+       150     1.18  1.00x    0.59  2.02x      0.58  2.03x
+    
+    The cells are radius / cells_per_radius wide: smaller cells leave
+    fewer boids to test at the rim, but take more lookups.
+    """
+    
+    cells_per_radius = CELLS_PER_RADIUS # static
+    
+    def __init__(self, boid_count = None, width = None, height = None, seed = None,
+                 placement = None):
+        """ See Simulation. """
+        self.grid = None # SummedGrid of the running tick
+        Simulation.__init__(self, boid_count, width, height, seed, placement)
+    
+    
+    def prepare(self):
+        """ Builds the grid of the tick. """
+        max_distance = Neighborhood.max_distance
+        near_distance = Neighborhood.near_distance
+        cell = max(math.sqrt(max_distance) / SummedGridSimulation.cells_per_radius,
+                   math.sqrt(near_distance) / 2.0)
+        self.grid = SummedGrid(self.boids, self.width, self.height, cell,
+                               max_distance > near_distance)
+    
+    
+    def neighborhood(self, b1):
+        """ Finds the neighborhood of a boid, the far part as sums.
+        
+        :param b1: the boid whose neighborhood to find
+        :type b1: Boid
+        :rtype: FarNeighborhood
+        """
+        (near, far) = self.grid.query(b1, Neighborhood.max_distance,
+                                      Neighborhood.near_distance)
+        return FarNeighborhood(b1, self.width, self.height, self.rules, near, far)
+
+# Engine backends by name, all share the Simulation interface
+BACKENDS = {
+    'reference': Simulation,
+    'barnes-hut': BarnesHutSimulation,
+    'summed-grid': SummedGridSimulation,
+}
+
+
+def new_simulation():
+    """ Creates a simulation of the backend chosen in Simulation.backend.
+    :rtype: Simulation
+    """
+    return BACKENDS[Simulation.backend]()
+
+# EOF
+
@@ -0,0 +1,296 @@
+#!/usr/bin/env python
+#-*- coding:utf-8 -*-
+
+""" Streams the swarm state of a running simulation to viewers over TCP.
+
+Every tick the engine publishes the boids to the StreamServer, which encodes
+them into one compact binary frame and queues it for each connected client.
+The server never blocks the tick: sockets are non-blocking and are only
+polled with select(), and a client whose backlog is full simply misses
+frames until it catches up.
+
+Frame layout (little-endian), see FrameEncoder:
+
+    header   uint32 length of the rest of the frame
+             uint8  kind (KEYFRAME or DELTA)
+             uint32 tick
+             uint32 amount of boids
+             uint16 world width, uint16 world height
+             float  velocity quantization range
+    KEYFRAME uint16 x, y  (fixed point, POSITION_SCALE units per pixel)
+             int8   vx, vy (scaled to the velocity range)
+             uint8  r, g, b
+    DELTA    int8   dx, dy (toroidal difference to the previous frame)
+             int8   vx, vy
+"""
+
+from __future__ import print_function
+
+import socket, select, struct, errno
+
+KEYFRAME = 0    # const
+DELTA = 1       # const
+
+POSITION_SCALE = 4      # const, fixed point units per pixel
+VELOCITY_RANGE = 127    # const, int8 range for velocities
+MAX_BACKLOG = 64 * 1024 # const, bytes queued per client before dropping
+
+HEADER = struct.Struct('<IBIIHHf')
+
+
+def _rgb(color):
+    """ Return the color of a boid as a (r, g, b) tuple. """
+    if color is None:
+        return (255, 255, 255)
+    if hasattr(color, 'red'):
+        return (color.red(), color.green(), color.blue())
+    return tuple(color[:3])
+
+
+def _clamp_int8(value):
+    return max(-VELOCITY_RANGE, min(VELOCITY_RANGE, int(round(value))))
+
+
+class FrameEncoder(object):
+    """ Encodes the swarm into keyframes and deltas against the last frame. """
+
+    def __init__(self):
+        self.tick = 0
+        self._last = None # quantized positions of the previous frame
+
+
+    def encode(self, boids, width, height, max_speed):
+        """ Encode the current state of the boids.
+
+        :param boids: the boids to encode
+        :type boids: list of Boid
+        :param width: width of the world
+        :type width: int
+        :param height: height of the world
+        :type height: int
+        :param max_speed: largest possible velocity component
+        :type max_speed: float
+        :returns: (keyframe, delta), delta is None if it could not be encoded
+        :rtype: tuple of bytes
+        """
+        wrap_x = int(width) * POSITION_SCALE
+        wrap_y = int(height) * POSITION_SCALE
+        if wrap_x > 0xffff or wrap_y > 0xffff:
+            raise ValueError("World too large to stream: %dx%d" % (width, height))
+
+        count = len(boids)
+        vel_mult = VELOCITY_RANGE / float(max_speed)
+
+        pos = []
+        vel = []
+        for b in boids:
+            pos.append(int(b.position.x * POSITION_SCALE) % wrap_x)
+            pos.append(int(b.position.y * POSITION_SCALE) % wrap_y)
+            vel.append(_clamp_int8(b.velocity.x * vel_mult))
+            vel.append(_clamp_int8(b.velocity.y * vel_mult))
+
+        self.tick += 1
+
+        keyframe = bytearray()
+        for i in range(count):
+            keyframe += struct.pack('<HHbbBBB', pos[2*i], pos[2*i+1],
+                                    vel[2*i], vel[2*i+1],
+                                    *_rgb(getattr(boids[i], 'color', None)))
+        keyframe = self._frame(KEYFRAME, count, width, height, max_speed, keyframe)
+
+        delta = None
+        last = self._last
+        if last is not None and len(last) == len(pos):
+            half_x = wrap_x // 2
+            half_y = wrap_y // 2
+            diffs = []
+            for i in range(0, len(pos), 2):
+                diffs.append((pos[i] - last[i] + half_x) % wrap_x - half_x)
+                diffs.append((pos[i+1] - last[i+1] + half_y) % wrap_y - half_y)
+            if all(-128 <= d <= 127 for d in diffs):
+                body = bytearray()
+                for i in range(count):
+                    body += struct.pack('<bbbb', diffs[2*i], diffs[2*i+1],
+                                        vel[2*i], vel[2*i+1])
+                delta = self._frame(DELTA, count, width, height, max_speed, body)
+
+        self._last = pos
+        return (keyframe, delta)
+
+
+    def _frame(self, kind, count, width, height, max_speed, body):
+        header = HEADER.pack(HEADER.size - 4 + len(body), kind, self.tick,
+                             count, int(width), int(height), max_speed)
+        return bytes(header) + bytes(body)
+
+
+class FrameDecoder(object):
+    """ Decodes a stream of frames, meant for viewers and recording clients. """
+
+    def __init__(self):
+        self.buffer = bytearray()
+        self.positions = None # quantized positions
+        self.colors = None
+
+
+    def feed(self, data):
+        """ Feed received bytes to the decoder.
+
+        :returns: list of decoded frames, each (tick, positions, velocities)
+                  with positions and velocities as lists of (x, y) floats
+        :rtype: list of tuple
+        """
+        self.buffer += data
+        frames = []
+        while len(self.buffer) >= HEADER.size:
+            length = struct.unpack_from('<I', self.buffer)[0]
+            if len(self.buffer) < length + 4:
+                break
+            frame = self._decode(self.buffer[:length + 4])
+            del self.buffer[:length + 4]
+            if frame is not None:
+                frames.append(frame)
+        return frames
+
+
+    def _decode(self, frame):
+        _, kind, tick, count, width, height, max_speed = HEADER.unpack_from(frame)
+        wrap_x = width * POSITION_SCALE
+        wrap_y = height * POSITION_SCALE
+        offset = HEADER.size
+
+        if kind == KEYFRAME:
+            values = struct.unpack_from('<' + 'HHbbBBB' * count, frame, offset)
+            self.positions = []
+            self.colors = []
+            vel = []
+            for i in range(0, len(values), 7):
+                self.positions.append((values[i], values[i+1]))
+                vel.append((values[i+2], values[i+3]))
+                self.colors.append(values[i+4:i+7])
+        elif self.positions is None or len(self.positions) != count:
+            return None # delta without a keyframe to apply it to
+        else:
+            values = struct.unpack_from('<' + 'bbbb' * count, frame, offset)
+            vel = []
+            for i in range(count):
+                (x, y) = self.positions[i]
+                self.positions[i] = ((x + values[4*i]) % wrap_x,
+                                     (y + values[4*i+1]) % wrap_y)
+                vel.append((values[4*i+2], values[4*i+3]))
+
+        vel_mult = max_speed / float(VELOCITY_RANGE)
+        positions = [(x / float(POSITION_SCALE), y / float(POSITION_SCALE))
+                     for (x, y) in self.positions]
+        velocities = [(vx * vel_mult, vy * vel_mult) for (vx, vy) in vel]
+        return (tick, positions, velocities)
+
+
+class _Client(object):
+    """ One connected viewer and the bytes still waiting to be sent to it. """
+
+    def __init__(self, sock, address):
+        self.sock = sock
+        self.address = address
+        self.pending = bytearray()
+        self.needs_keyframe = True
+        self.dropped = 0
+
+
+class StreamServer(object):
+    """ Non-blocking TCP server streaming the swarm state to many viewers. """
+
+    def __init__(self, port, host='127.0.0.1', max_backlog=MAX_BACKLOG):
+        """
+        :param port: TCP port to listen on, 0 picks a free one
+        :type port: int
+        :param host: interface to bind to
+        :type host: str
+        :param max_backlog: bytes queued per client before frames are dropped
+        :type max_backlog: int
+        """
+        self.encoder = FrameEncoder()
+        self.max_backlog = max_backlog
+        self.clients = []
+
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.sock.bind((host, port))
+        self.sock.listen(16)
+        self.sock.setblocking(False)
+        self.address = self.sock.getsockname()
+        print("!!! Streaming swarm state on", "%s:%d" % self.address, "!!!")
+
+
+    def publish(self, boids, width, height, max_speed):
+        """ Encode the boids as a frame and queue it for every client.
+
+        Never blocks; clients with a full backlog miss this frame and get a
+        keyframe once they have caught up.
+        """
+        self.pump()
+        if not self.clients:
+            return
+
+        (keyframe, delta) = self.encoder.encode(boids, width, height, max_speed)
+        for client in self.clients:
+            if len(client.pending) >= self.max_backlog:
+                client.dropped += 1
+                client.needs_keyframe = True
+                continue
+            if client.needs_keyframe or delta is None:
+                client.pending += keyframe
+                client.needs_keyframe = False
+            else:
+                client.pending += delta
+
+        self._flush()
+
+
+    def pump(self):
+        """ Accept new clients and send whatever the sockets can take. """
+        while True:
+            try:
+                (sock, address) = self.sock.accept()
+            except socket.error as e:
+                if e.args[0] in (errno.EAGAIN, errno.EWOULDBLOCK):
+                    break
+                raise
+            sock.setblocking(False)
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            self.clients.append(_Client(sock, address))
+            print("!!! Streaming client connected from", "%s:%d" % address, "!!!")
+
+        self._flush()
+
+
+    def _flush(self):
+        waiting = [c.sock for c in self.clients if c.pending]
+        if not waiting:
+            return
+        (_, writable, _) = select.select([], waiting, [], 0)
+        for client in list(self.clients):
+            if client.sock not in writable:
+                continue
+            try:
+                sent = client.sock.send(client.pending)
+                del client.pending[:sent]
+            except socket.error as e:
+                if e.args[0] not in (errno.EAGAIN, errno.EWOULDBLOCK):
+                    self._disconnect(client)
+
+
+    def _disconnect(self, client):
+        print("!!! Streaming client", "%s:%d" % client.address,
+              "disconnected, dropped", client.dropped, "frames !!!")
+        client.sock.close()
+        self.clients.remove(client)
+
+
+    def close(self):
+        """ Close all client connections and the listening socket. """
+        for client in list(self.clients):
+            self._disconnect(client)
+        self.sock.close()
+
+# EOF
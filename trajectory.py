@@ -0,0 +1,374 @@
+#!/usr/bin/env python
+#-*- coding:utf-8 -*-
+
+""" Recording the position and velocity of every boid on every tick.
+
+A trajectory file is append-only: a file header with the colors of the
+boids, followed by chunks of CHUNK_TICKS consecutive ticks. Ticks are
+counted by the recording from 0, so a reset of the simulation does not
+break the recording. Next to it an
+index file holds one record per chunk (first tick, offset, ticks), so a
+reader finds any tick without scanning the file. If the index is lost or
+behind, for example after a crash, the reader rebuilds it from the chunk
+headers. All of it is little-endian:
+
+    file     HEADER, then uint8 r, g, b per boid
+    chunk    CHUNK header, then the frames of the chunk
+    RAW      float32 x, y, vx, vy per boid, for every tick
+    DELTA    first tick: uint32 x, y (fixed point, POSITION_SCALE units
+             per pixel) and int16 vx, vy (VELOCITY_SCALE units per pixel),
+             other ticks: int16 dx, dy (toroidal difference to the
+             previous tick) and int16 vx, vy
+    index    INDEX record per chunk
+
+DELTA positions are rounded to 1 / POSITION_SCALE pixel, so they are off
+by at most half of that, 1/128 pixel, over the edge of the world for a
+position that close to it.
+
+Every frame of a chunk has the same size, so a RAW tick is found directly;
+a DELTA tick is found by applying the deltas of the chunk up to it. A chunk
+whose deltas do not fit in int16 is written as RAW.
+
+The tick only copies the numbers of the boids, chunks are encoded and
+written by a BackgroundWriter thread.
+"""
+
+import mmap, struct
+
+from writer import BackgroundWriter, BLOCK
+
+RAW = 0     # const
+DELTA = 1   # const
+
+MAGIC = b'BOIDTRAJ'         # const
+CHUNK_MAGIC = b'CHNK'       # const
+VERSION = 1                 # const
+CHUNK_TICKS = 32            # const, ticks per chunk
+POSITION_SCALE = 64         # const, fixed point units per pixel
+VELOCITY_SCALE = 1024       # const, fixed point units per pixel per tick
+
+HEADER = struct.Struct('<8sHHI')    # magic, version, unused, amount of boids
+CHUNK = struct.Struct('<4sQIIIdd')  # magic, first tick, ticks, encoding, bytes, width, height
+INDEX = struct.Struct('<QQI')       # first tick, offset of the chunk, ticks
+
+
+class TrajectoryError(Exception):
+    """ The file is not a trajectory this version can read. """
+
+
+def capture(boids, width, height):
+    """ Copies the state of the boids for recording.
+    
+    Boids step after wrapping, so a position can be a bit outside the
+    world; it is recorded wrapped into it, the same for RAW and DELTA.
+    
+    :returns: x, y, vx, vy of every boid
+    :rtype: list of float
+    """
+    state = []
+    append = state.append
+    for b in boids:
+        x = b.position.x % width
+        y = b.position.y % height
+        # A tiny negative coordinate wraps to the size itself
+        append(x if x < width else 0.0)
+        append(y if y < height else 0.0)
+        append(b.velocity.x)
+        append(b.velocity.y)
+    return state
+
+
+def encode_chunk(frames, width, height, delta):
+    """ Encodes the frames of a chunk.
+    
+    :param frames: states returned by capture(), one per tick
+    :type frames: list of list of float
+    :param delta: whether to try the quantized delta encoding
+    :type delta: bool
+    :returns: (encoding, payload)
+    :rtype: (int, bytes)
+    """
+    values = len(frames[0])
+    if delta:
+        payload = encode_delta(frames, width, height)
+        if payload is not None:
+            return (DELTA, payload)
+    raw = struct.Struct('<%df' % values)
+    return (RAW, b''.join(raw.pack(*frame) for frame in frames))
+
+
+def encode_delta(frames, width, height):
+    """ Quantized delta encoding of a chunk, None if a delta is too large. """
+    wrap_x = int(round(width * POSITION_SCALE))
+    wrap_y = int(round(height * POSITION_SCALE))
+    values = len(frames[0])
+    key = struct.Struct('<%dI%dh' % (values // 2, values // 2))
+    step = struct.Struct('<%dh' % values)
+    
+    parts = []
+    last = None
+    for frame in frames:
+        pos = []
+        vel = []
+        for i in range(0, values, 4):
+            pos.append(int(round(frame[i] * POSITION_SCALE)) % wrap_x)
+            pos.append(int(round(frame[i + 1] * POSITION_SCALE)) % wrap_y)
+            vel.append(int(round(frame[i + 2] * VELOCITY_SCALE)))
+            vel.append(int(round(frame[i + 3] * VELOCITY_SCALE)))
+        if any(v < -32768 or v > 32767 for v in vel):
+            return None
+        
+        if last is None:
+            parts.append(key.pack(*(pos + vel)))
+        else:
+            half_x = wrap_x // 2
+            half_y = wrap_y // 2
+            mixed = []
+            for i in range(0, len(pos), 2):
+                mixed.append((pos[i] - last[i] + half_x) % wrap_x - half_x)
+                mixed.append((pos[i + 1] - last[i + 1] + half_y) % wrap_y - half_y)
+                mixed.append(vel[i])
+                mixed.append(vel[i + 1])
+            if any(d < -32768 or d > 32767 for d in mixed):
+                return None
+            parts.append(step.pack(*mixed))
+        last = pos
+    return b''.join(parts)
+
+
+class TrajectoryRecorder(object):
+    """ Appends the state of a simulation to a trajectory file every tick. """
+    
+    QUEUE_SIZE = 8 # const, chunks allowed to wait for the writer
+    
+    def __init__(self, path, boids, delta = False, chunk_ticks = CHUNK_TICKS,
+                 max_queue = QUEUE_SIZE, policy = BLOCK):
+        """
+        :param path: the trajectory file, the index goes to path + '.idx'
+        :type path: str
+        :param boids: the boids to record, for their amount and colors
+        :type boids: list of Boid
+        :param delta: use the quantized delta encoding
+        :type delta: bool
+        :param chunk_ticks: ticks per chunk
+        :type chunk_ticks: int
+        :param max_queue: chunks allowed to wait for the writer
+        :type max_queue: int
+        :param policy: writer.BLOCK or writer.DROP, when the disk falls behind
+        :type policy: str
+        """
+        self.path = path
+        self.count = len(boids)
+        self.delta = delta
+        self.chunk_ticks = chunk_ticks
+        self.frames = [] # frames of the chunk being filled
+        self.tick = 0 # ticks recorded so far
+        self.size = None # world size of the chunk being filled
+        
+        self.data = open(path, 'wb')
+        self.index = open(path + '.idx', 'wb')
+        colors = bytearray()
+        for b in boids:
+            colors.extend(b.color)
+        self.data.write(HEADER.pack(MAGIC, VERSION, 0, self.count) + bytes(colors))
+        self.offset = self.data.tell() # where the next chunk goes
+        self.writer = BackgroundWriter(self.writeChunk, max_queue, policy)
+    
+    
+    def record(self, sim):
+        """ Records the state of a simulation after its tick.
+        
+        :param sim: the simulation
+        :type sim: Simulation
+        """
+        if len(sim.boids) != self.count:
+            raise ValueError("Recording %d boids, the simulation has %d"
+                             % (self.count, len(sim.boids)))
+        size = (sim.width, sim.height)
+        if self.frames and size != self.size:
+            self.flush()
+        self.size = size
+        self.frames.append(capture(sim.boids, sim.width, sim.height))
+        self.tick += 1
+        if len(self.frames) >= self.chunk_ticks:
+            self.flush()
+    
+    
+    def flush(self):
+        """ Hands the chunk being filled to the writer. """
+        if not self.frames:
+            return
+        self.writer.submit((self.tick - len(self.frames), self.size, self.frames))
+        self.frames = []
+    
+    
+    def writeChunk(self, chunk):
+        """ Encodes and appends a chunk, in the writer thread. """
+        (first, (width, height), frames) = chunk
+        (encoding, payload) = encode_chunk(frames, width, height, self.delta)
+        header = CHUNK.pack(CHUNK_MAGIC, first, len(frames), encoding, len(payload),
+                            width, height)
+        self.data.write(header + payload)
+        self.data.flush()
+        # The index only points at chunks that are completely written
+        self.index.write(INDEX.pack(first, self.offset, len(frames)))
+        self.index.flush()
+        self.offset += len(header) + len(payload)
+    
+    
+    def close(self):
+        """ Writes the chunks still waiting and closes the files. """
+        self.flush()
+        try:
+            self.writer.close()
+        finally:
+            self.data.close()
+            self.index.close()
+
+
+class TrajectoryReader(object):
+    """ Reads ticks of a trajectory file through a memory map.
+    
+    Only the index is kept in memory, so the memory used does not depend
+    on the length of the recording.
+    """
+    
+    def __init__(self, path):
+        """
+        :param path: the trajectory file
+        :type path: str
+        """
+        self.path = path
+        self.file = open(path, 'rb')
+        self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        if len(self.map) < HEADER.size:
+            raise TrajectoryError("Truncated trajectory")
+        (magic, version, _, count) = HEADER.unpack_from(self.map, 0)
+        if magic != MAGIC:
+            raise TrajectoryError("Not a trajectory")
+        if version != VERSION:
+            raise TrajectoryError("Trajectory version %d, can read %d" % (version, VERSION))
+        
+        self.count = count
+        colors = bytearray(self.map[HEADER.size:HEADER.size + 3 * count])
+        self.colors = [tuple(colors[3 * i:3 * i + 3]) for i in range(count)]
+        self.chunks = self.readIndex() # list of (first tick, offset, ticks)
+        self.cache = (None, None, None) # (offset, position in chunk, state) of the last delta
+    
+    
+    def readIndex(self):
+        """ Reads the index, or rebuilds it from the chunks if it is behind. """
+        chunks = []
+        try:
+            with open(self.path + '.idx', 'rb') as f:
+                data = f.read()
+            for i in range(len(data) // INDEX.size):
+                chunks.append(INDEX.unpack_from(data, i * INDEX.size))
+        except (IOError, OSError):
+            pass
+        
+        # Chunks written after the last index record
+        offset = HEADER.size + 3 * self.count
+        if chunks:
+            offset = chunks[-1][1] + CHUNK.size + self.chunkHeader(chunks[-1][1])[3]
+        while offset + CHUNK.size <= len(self.map):
+            (magic, first, ticks, _, size, _, _) = CHUNK.unpack_from(self.map, offset)
+            if magic != CHUNK_MAGIC or offset + CHUNK.size + size > len(self.map):
+                break
+            chunks.append((first, offset, ticks))
+            offset += CHUNK.size + size
+        return chunks
+    
+    
+    def chunkHeader(self, offset):
+        """ Returns (first tick, ticks, encoding, bytes, width, height) of a chunk. """
+        (magic, first, ticks, encoding, size, width, height) = CHUNK.unpack_from(self.map, offset)
+        if magic != CHUNK_MAGIC:
+            raise TrajectoryError("Broken chunk at %d" % offset)
+        return (first, ticks, encoding, size, width, height)
+    
+    
+    def first(self):
+        """ The first recorded tick, None if nothing is recorded. """
+        return self.chunks[0][0] if self.chunks else None
+    
+    
+    def last(self):
+        """ The last recorded tick, None if nothing is recorded. """
+        return self.chunks[-1][0] + self.chunks[-1][2] - 1 if self.chunks else None
+    
+    
+    def find(self, tick):
+        """ Returns the index record of the chunk holding a tick. """
+        (low, high) = (0, len(self.chunks))
+        while low < high:
+            mid = (low + high) // 2
+            if self.chunks[mid][0] <= tick:
+                low = mid + 1
+            else:
+                high = mid
+        if low == 0 or tick >= self.chunks[low - 1][0] + self.chunks[low - 1][2]:
+            raise KeyError("Tick %d is not recorded" % tick)
+        return self.chunks[low - 1]
+    
+    
+    def frame(self, tick):
+        """ Reads the state of the boids at a tick.
+        
+        :returns: (state, width, height), state has x, y, vx, vy of every
+                  boid like capture() returns
+        :rtype: (list of float, float, float)
+        """
+        (first, offset, _) = self.find(tick)
+        (_, ticks, encoding, _, width, height) = self.chunkHeader(offset)
+        at = tick - first
+        body = offset + CHUNK.size
+        values = 4 * self.count
+        
+        if encoding == RAW:
+            raw = struct.Struct('<%df' % values)
+            return (list(raw.unpack_from(self.map, body + at * raw.size)), width, height)
+        if encoding != DELTA:
+            raise TrajectoryError("Unknown encoding %d" % encoding)
+        
+        wrap_x = int(round(width * POSITION_SCALE))
+        wrap_y = int(round(height * POSITION_SCALE))
+        key = struct.Struct('<%dI%dh' % (values // 2, values // 2))
+        step = struct.Struct('<%dh' % values)
+        
+        # Playing forward continues from the last decoded tick of the chunk
+        (cached_offset, cached_at, pos) = self.cache
+        if cached_offset == offset and cached_at <= at:
+            start = cached_at + 1
+        else:
+            start = 1
+            pos = list(key.unpack_from(self.map, body)[:values // 2])
+        for i in range(start, at + 1):
+            mixed = step.unpack_from(self.map, body + key.size + (i - 1) * step.size)
+            for j in range(0, values // 2, 2):
+                pos[j] = (pos[j] + mixed[2 * j]) % wrap_x
+                pos[j + 1] = (pos[j + 1] + mixed[2 * j + 1]) % wrap_y
+        self.cache = (offset, at, pos)
+        
+        if at == 0:
+            vel = key.unpack_from(self.map, body)[values // 2:]
+        else:
+            mixed = step.unpack_from(self.map, body + key.size + (at - 1) * step.size)
+            vel = [v for j in range(0, values, 4) for v in (mixed[j + 2], mixed[j + 3])]
+        
+        state = []
+        for j in range(self.count):
+            state.append(pos[2 * j] / float(POSITION_SCALE))
+            state.append(pos[2 * j + 1] / float(POSITION_SCALE))
+            state.append(vel[2 * j] / float(VELOCITY_SCALE))
+            state.append(vel[2 * j + 1] / float(VELOCITY_SCALE))
+        return (state, width, height)
+    
+    
+    def close(self):
+        """ Closes the memory map and the file. """
+        self.map.close()
+        self.file.close()
+
+# EOF
+
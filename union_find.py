@@ -0,0 +1,56 @@
+#!/usr/bin/env python
+#-*- coding:utf-8 -*-
+
+class UnionFind(object):
+    """ Disjoint sets of the integers 0 .. n-1.
+    
+    Union by size and path halving keep every operation nearly constant
+    time, so labelling the components of a graph is near-linear in the
+    amount of edges.
+    """
+    
+    def __init__(self, n):
+        """
+        :param n: amount of elements
+        :type n: int
+        """
+        self.parent = list(range(n))
+        self.size = [1] * n
+        self.sets = n
+    
+    
+    def find(self, i):
+        """ Returns the representative of the set holding i. """
+        parent = self.parent
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+    
+    
+    def union(self, i, j):
+        """ Joins the sets holding i and j.
+        
+        :returns: the representative of the joined set
+        :rtype: int
+        """
+        a = self.find(i)
+        b = self.find(j)
+        if a == b:
+            return a
+        if self.size[a] < self.size[b]:
+            (a, b) = (b, a)
+        self.parent[b] = a
+        self.size[a] += self.size[b]
+        self.sets -= 1
+        return a
+    
+    
+    def labels(self):
+        """ Returns the representative of every element.
+        :rtype: list of int
+        """
+        return [self.find(i) for i in range(len(self.parent))]
+
+# EOF
+
@@ -0,0 +1,103 @@
+#!/usr/bin/env python
+#-*- coding:utf-8 -*-
+
+""" Background writing through a bounded queue.
+
+The tick hands items to a BackgroundWriter and carries on; a thread of the
+writer takes them from the queue and writes them. When the writer falls
+behind, the queue fills up and, depending on the policy, new items are
+either dropped or the tick waits for room.
+"""
+
+import threading
+
+try:
+    import Queue as queue
+except ImportError: # Python 3
+    import queue
+
+DROP = 'drop'       # const, drop new items when the queue is full
+BLOCK = 'block'     # const, wait for room when the queue is full
+POLICIES = (DROP, BLOCK) # const
+
+
+class BackgroundWriter(object):
+    """ Calls a write function for every submitted item, in a thread. """
+    
+    QUEUE_SIZE = 16 # const, default amount of items waiting
+    
+    def __init__(self, write, max_queue = QUEUE_SIZE, policy = DROP):
+        """
+        :param write: called in the thread with each submitted item
+        :type write: function
+        :param max_queue: amount of items allowed to wait
+        :type max_queue: int
+        :param policy: DROP or BLOCK, what to do when the queue is full
+        :type policy: str
+        """
+        if policy not in POLICIES:
+            raise ValueError("Unknown policy " + str(policy))
+        self.write = write
+        self.policy = policy
+        self.queue = queue.Queue(max_queue)
+        self.written = 0
+        self.dropped = 0
+        self.error = None # exception raised by write, ends the thread
+        
+        self.thread = threading.Thread(target=self.run)
+        self.thread.daemon = True
+        self.thread.start()
+    
+    
+    def full(self):
+        """ Whether a new item would be dropped or have to wait. """
+        return self.queue.full()
+    
+    
+    def submit(self, item):
+        """ Hands an item to the thread.
+        
+        :returns: False if the item was dropped
+        :rtype: bool
+        """
+        if self.error is not None:
+            raise self.error
+        if self.policy == BLOCK:
+            self.queue.put(item)
+            return True
+        try:
+            self.queue.put_nowait(item)
+        except queue.Full:
+            self.dropped += 1
+            return False
+        return True
+    
+    
+    def drop(self):
+        """ Counts an item that was not even submitted, as the queue was full. """
+        self.dropped += 1
+    
+    
+    def run(self):
+        while True:
+            item = self.queue.get()
+            if item is None:
+                return
+            if self.error is not None:
+                continue # drain, so that submit() and close() do not block
+            try:
+                self.write(item)
+                self.written += 1
+            except Exception as e:
+                self.error = e
+    
+    
+    def close(self):
+        """ Writes the items still waiting and stops the thread. """
+        self.queue.put(None)
+        self.thread.join()
+        if self.error is not None:
+            raise self.error
+
+# EOF
+